@@ -1,17 +1,22 @@
-from flask import Flask, jsonify
-import pandas as pd
+from flask import Blueprint, Flask, Response, jsonify, request
 from datetime import datetime
+import logging
+import os
 
-from pymongo import MongoClient
+from dbcCache import file_hash
+from decodeCache import DecodeCache
+from downsampling import MODES as DOWNSAMPLE_MODES, downsample
+from instrumentation import METRICS, configure_logging, peak_rss_bytes, stage
+from seriesEncoding import json_ready, negotiate_encoding, negotiate_format, series_response, value_dtype
 
-# Initialize Flask app
-app = Flask(__name__)
+# Routes; create_app() builds the Flask app around them. pandas and pyarrow
+# load with the first CSV, and nothing here reads MongoDB.
+api = Blueprint("api", __name__)
 
-# MongoDB connection
-client = MongoClient('mongodb://localhost:27017/')
-db = client['ev_data']
-metrics_collection = db['vehicle_metrics']
-metrics_catalog_collection = db['metrics_catalog']
+log = logging.getLogger(__name__)
+
+# Parsed CSVs keyed by content hash, so an unchanged file is only parsed once
+decode_cache = DecodeCache()
 
 VEHICLES = {
     "ioniq5": {
@@ -30,68 +35,113 @@ VEHICLES = {
     }
 }
 
-@app.route('/api/process/<vehicle_id>', methods=['POST'])
+@api.route('/api/process/<vehicle_id>', methods=['POST'])
 def process_vehicle_data(vehicle_id):
     try:
         vehicle_info = {"make": "Hyundai", "model": "Ioniq 5"}  # Hardcoded for now
         csv_path = "C:/Users/Instruktor.P-02462/Desktop/mf42csv/out/hyundai-ioniq5-decoded-101.csv"        
-        print(f"Loading CSV file: {csv_path}")
-        df = pd.read_csv(csv_path)
+        log.info("Loading CSV file: %s", csv_path)
+        with stage("dataframe"):
+            cache_key = decode_cache.key(file_hash(csv_path), "csv") if os.path.isfile(csv_path) else None
+            df = decode_cache.get_table(cache_key) if cache_key else None
+            if df is None:
+                from columnarSignals import load_signals  # pulls in pandas and pyarrow
+                df = load_signals(csv_path)  # CSV file or Parquet dataset
+                if cache_key:
+                    decode_cache.put_table(cache_key, df)
         
         if df.empty:
-            print("DataFrame is empty!")
+            log.warning("DataFrame is empty: %s", csv_path)
             return jsonify({"error": "No data found in CSV file"}), 404
 
-        print("DataFrame columns:", df.columns.tolist())
-        print("First row:", df.iloc[0].to_dict())
+        if log.isEnabledFor(logging.DEBUG):  # building these dumps is costly
+            log.debug("DataFrame columns: %s", df.columns.tolist())
+            log.debug("First row: %s", df.iloc[0].to_dict())
         
         first_row = df.iloc[0]
         timestamp = datetime.now()
         
+        # Optional chart-ready downsampling, e.g. ?downsample=m4&width=1200
+        mode = request.args.get("downsample")
+        points = request.args.get("points", type=int)
+        width = request.args.get("width", type=int)
+        if mode and (mode not in DOWNSAMPLE_MODES or not (points or width)):
+            return jsonify({"error": "downsample must be lttb or m4, with points or width"}), 400
+        # Optional binary response, e.g. ?format=packed&dtype=float32
+        try:
+            fmt = negotiate_format(request)
+            dtype = value_dtype(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         all_metrics = {}
         metrics_catalog = {}
         
-        for column in df.columns:
-            if column.lower() not in ["t", "timestamp"]:  # Keep 't' in df, just don’t metric-ize it
-                print(f"Processing column: {column}")
-                # Process all rows, not just first_row
-                values = df[column].dropna().astype(float).tolist()  # Drop NaNs, convert to float
-                if not values:
-                    print(f"  Skipping {column}: No valid data")
-                    continue
-                unit = ""  # Infer from DBC if needed, e.g., "%" for SOC
-                categories = []
-                if any(kw in column.lower() for kw in ["battery", "soc", "charge", "bms"]):
-                    categories.append("battery")
-                if not categories:
-                    categories.append("other")
+        with stage("categorize"):
+            for column in df.columns:
+                if column.lower() not in ["t", "timestamp"]:  # Keep 't' in df, just don’t metric-ize it
+                    log.debug("Processing column: %s", column)
+                    # Process all rows, not just first_row
+                    valid = df[column].notna()
+                    values = df[column][valid].astype(float).to_numpy()  # Drop NaNs, convert to float
+                    times = df["t"][valid].to_numpy()  # Matching timestamps
+                    if not len(values):
+                        log.debug("Skipping %s: no valid data", column)
+                        continue
+                    if mode:
+                        times, values = downsample(times, values, mode, points=points, width=width)
+                    unit = ""  # Infer from DBC if needed, e.g., "%" for SOC
+                    categories = []
+                    if any(kw in column.lower() for kw in ["battery", "soc", "charge", "bms"]):
+                        categories.append("battery")
+                    if not categories:
+                        categories.append("other")
                 
-                all_metrics[column] = {
-                    "values": values,  # List of values over time
-                    "times": df["t"].iloc[df[column].notna()].tolist(),  # Matching timestamps
-                    "unit": unit,
-                    "categories": categories
-                }
-                metrics_catalog[column] = {
-                    "unit": unit,
-                    "categories": categories,
-                    "last_seen": timestamp
-                }
+                    all_metrics[column] = {
+                        "values": values,  # Values over time
+                        "times": times,
+                        "unit": unit,
+                        "categories": categories
+                    }
+                    metrics_catalog[column] = {
+                        "unit": unit,
+                        "categories": categories,
+                        "last_seen": timestamp
+                    }
+        
         
-        print(f"Metrics processed: {len(all_metrics)}")
-        return jsonify({
+        log.info("Metrics processed: %d", len(all_metrics))
+        meta = {
             "success": True,
             "vehicle_id": vehicle_id,
             "make": vehicle_info["make"],
             "model": vehicle_info["model"],
-            "timestamp": timestamp.isoformat(),
-            "metrics": all_metrics  # Full time series data        
-        })
+            "timestamp": timestamp.isoformat()
+        }
+        if fmt != "json":
+            return series_response(all_metrics, meta, fmt, negotiate_encoding(request), dtype)
+        return jsonify(dict(meta, metrics=json_ready(all_metrics)))  # Full time series data
 
     except Exception as e:
-        print(f"Error processing CSV: {str(e)}")
+        log.exception("Error processing CSV: %s", e)
         return jsonify({"error": f"Failed to process: {str(e)}"}), 500
     
-    # Add this to run the Flask app
+@api.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(decode_cache.stats())
+
+@api.route('/metrics', methods=['GET'])
+def get_prometheus_metrics():
+    METRICS.set_max("ev_process_peak_rss_bytes", peak_rss_bytes(), process="web")
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+def create_app():
+    """The Flask app (e.g. `flask --app app:create_app run`)"""
+    configure_logging()  # LOG_LEVEL=DEBUG to log columns and rows
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    return app
+
+# Add this to run the Flask app (FLASK_DEBUG=1 for the reloader and debugger)
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=os.environ.get("FLASK_DEBUG") == "1")
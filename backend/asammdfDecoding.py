@@ -1,54 +1,73 @@
-from asammdf import MDF
+import logging
 import os
-from flask import Flask, jsonify, request
-from pymongo import MongoClient
+import threading
+from flask import Blueprint, Flask, Response, jsonify, request
 import datetime
+import numpy as np
 
-# Initialize Flask app
-app = Flask(__name__)
-
-# MongoDB connection
-client = MongoClient('mongodb://localhost:27017/')
-db = client['ev_data']
-metrics_collection = db['vehicle_metrics']
-metrics_catalog_collection = db['metrics_catalog']
-
-# Define your DBC files - organized by protocol/manufacturer
-DBC_FILES = {
-    "hyundai-kia-uds": "dbc_files/can1-hyundai-kia-uds-v2.4.dbc",
-    "nissan-leaf-uds": "dbc_files/can1-nissan-leaf-uds-v2.4.dbc",
-    "renault-zoe": "dbc_files/can1-renault-zoe.dbc",
-    "vw-skoda-audi-uds": "dbc_files/can1-vw-skoda-audi-uds-v2.5.dbc",
-    "tesla": "dbc_files/tesla_model_3.dbc",
-}
-
-# Define vehicles with their respective MF4 files and which DBC to use
-VEHICLES = {
-    "ioniq5": {
-        "make": "Hyundai",
-        "model": "Ioniq 5",
-        "year": "",
-        "mf4_file": "mf4_files/hyundai-ioniq5.mf4",
-        "dbc_protocol": "hyundai-kia-uds"  # This links to the DBC file
-    },
-    "renault": {
-        "make": "Renault",
-        "model": "Zoe",
-        "year": "",
-        "mf4_file": "mf4_files/renault.mf4",
-        "dbc_protocol": "renault-zoe"  
-    },
-    # "ev6": {
-    #     "make": "Kia", 
-    #     "model": "EV6",
-    #     "year": "2022",
-    #     "mf4_file": "mf4_files/kia-ev6.mf4",
-    #     "dbc_protocol": "hyundai-kia-uds"  # Same DBC file for Kia
-    #}
-    # Add more vehicles as needed
-}
-
-@app.route("/api/vehicles", methods=["GET"])
+from canIndex import groups_for_ids, load_index
+from dbcCache import file_hash, load_database
+from dbcDecoder import DECODER_VERSION
+from decodeCache import DecodeCache
+from derivedSignals import DerivedSignals
+from downsampling import MODES as DOWNSAMPLE_MODES, downsample
+from fleetIngest import FleetQueue, fleet_job, scan
+from ingestJobs import JobQueue, emit, in_worker
+from instrumentation import (METRICS, PROFILERS, capture_profile, configure_logging,
+                             peak_rss_bytes, stage)
+from liveFeed import LiveFeed, live_samples
+from metricCatalog import catalog_for
+from mf4Stream import iter_decoded_mf4
+from mongoPersistence import (catalog_collection, metrics_collection, series_collection, try_ensure_indexes,
+                              delete_series, upsert_catalog, write_series)
+from rollups import RollupStore
+from responseCache import ResponseCache
+from segmentIndex import KINDS as SEGMENT_KINDS, SegmentIndex
+from seriesEncoding import json_ready, negotiate_encoding, negotiate_format, series_response, value_dtype
+from signalQuery import DEFAULT_TOLERANCE, FILLS, query as query_signals
+from signalStore import SignalStore
+from vehicleRegistry import DBC_FILES, load_registry
+
+# Routes; create_app() builds the Flask app around them. Importing this
+# module stays cheap: MongoDB is connected per process on first use (see
+# mongoPersistence) and asammdf is only imported by the first ingest.
+api = Blueprint("api", __name__)
+
+log = logging.getLogger(__name__)
+
+# Decoded time series, one memory-mapped file per (vehicle, signal)
+signal_store = SignalStore()
+rollup_store = RollupStore(signal_store)
+
+# Trips, charging sessions and idle periods, updated after each ingest
+segment_index = SegmentIndex(signal_store)
+
+# Decoded logs keyed by (MF4 hash, DBC hash, decoder version)
+decode_cache = DecodeCache()
+
+# Expressions over stored signals (power, energy, cell spread, ...), computed
+# when queried and memoized per log in a cache of their own
+derived_cache = DecodeCache(os.path.join(decode_cache.root, "derived"))
+derived_signals = DerivedSignals(signal_store, derived_cache)
+
+# Background ingest jobs; decoding is CPU-bound, so they run in worker processes
+ingest_jobs = JobQueue(workers=int(os.environ.get("INGEST_WORKERS", 2)))
+
+# Newly decoded samples pushed to dashboards; ingest workers emit them per chunk
+live_feed = LiveFeed()
+ingest_jobs.on("samples", lambda payload: live_feed.publish(*payload))
+# Workers send their counters and stage timings when a job ends
+ingest_jobs.on("metrics", METRICS.merge)
+
+# Catalog, latest metrics and history responses, valid until the vehicle's
+# next ingest (by any process: the generation token lives in the signal store)
+response_cache = ResponseCache(signal_store.generation)
+ingest_jobs.on("ingested", response_cache.invalidate)
+
+# Vehicles and their DBC protocols, from vehicles.json (see vehicleRegistry)
+VEHICLES = load_registry()
+
+@api.route("/api/vehicles", methods=["GET"])
 def list_vehicles():
     """List all available vehicles"""
     result = []
@@ -61,11 +80,17 @@ def list_vehicles():
         })
     return jsonify({"vehicles": result})
 
-@app.route("/api/process/<vehicle_id>", methods=["POST"])
+@api.route("/api/process/<vehicle_id>", methods=["POST"])
 def process_vehicle_data(vehicle_id):
+    """Queue processing of a vehicle's MF4 log; returns 202 with a job ID"""
     if vehicle_id not in VEHICLES:
         return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
     
+    # ?profile=cprofile|pyinstrument records a profile of the job
+    profile = request.args.get("profile")
+    if profile and profile not in PROFILERS:
+        return jsonify({"error": f"profile must be one of {', '.join(PROFILERS)}"}), 400
+    
     vehicle_info = VEHICLES[vehicle_id]
     dbc_protocol = vehicle_info["dbc_protocol"]
     
@@ -80,206 +105,343 @@ def process_vehicle_data(vehicle_id):
     if not os.path.exists(mf4_path):
         return jsonify({"error": f"MF4 file not found: {mf4_path}"}), 404
 
+    # The same file unchanged on disk; the job hashes the content itself
+    stat = os.stat(mf4_path)
+    job, created = ingest_jobs.submit(
+        ingest_vehicle, vehicle_id, dbc_path, mf4_path, profile=profile,
+        key=(vehicle_id, mf4_path, stat.st_size, stat.st_mtime_ns),
+        description=f"Process {vehicle_info['mf4_file']}")
+    response = jsonify({
+        "job_id": job["id"],
+        "state": job["state"],
+        "deduplicated": not created,
+        "status_url": f"/api/jobs/{job['id']}"
+    })
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    return response, 202
+
+@api.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Get the state and progress of a background job"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job)
+
+@api.route("/api/fleet/ingest", methods=["POST"])
+def ingest_fleet():
+    """Queue the new logs of every registered vehicle and drain the queue in ingest jobs; returns 202"""
+    fleet_queue = FleetQueue()
+    try:
+        queued = scan(fleet_queue, VEHICLES)
+    finally:
+        fleet_queue.close()
+    jobs = [ingest_jobs.submit(fleet_job, key=("fleet", worker), description="Fleet ingest")[0]
+            for worker in range(ingest_jobs.workers)]
+    return jsonify({"queued": queued, "jobs": [job["id"] for job in jobs]}), 202
+
+@api.route("/api/fleet", methods=["GET"])
+def get_fleet_stats():
+    """Per-vehicle fleet ingest throughput and queue depth"""
+    fleet_queue = FleetQueue()
     try:
-        print(f"Loading MF4 file: {mf4_path}")
+        return jsonify({"vehicles": fleet_queue.stats()})
+    finally:
+        fleet_queue.close()
+
+@api.route("/api/live/<vehicle_id>", methods=["GET"])
+def get_live_feed(vehicle_id):
+    """Server-Sent Events stream of newly ingested samples (?metrics=a,b to filter).
+
+    Each "samples" event holds a coalesced batch: {"vehicle_id", "dropped",
+    "signals": {name: {"times", "values"}}}. "dropped" counts batches a slow
+    client missed; refetch that span from the series endpoint.
+    """
+    if vehicle_id not in VEHICLES:
+        return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
+    metric_names = [name for name in request.args.get("metrics", "").split(",") if name]
+    subscription = live_feed.subscribe(vehicle_id, metric_names)
+    return Response(live_feed.stream(subscription), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def decode_log(report, mf4_path, database, mf4_hash):
+    """Return (log start, iterator of decoded chunks) for an MF4 log.
+
+    Results are cached by (MF4 hash, DBC hash, decoder version); a cached
+    result is replayed without opening the MF4, and a fresh decode is
+    written to the cache as it streams.
+    """
+    log_key = decode_cache.key(mf4_hash, database.content_hash, DECODER_VERSION)
+    cached = decode_cache.get(log_key)
+    if cached is not None:
+        meta, chunks = cached
+        log.info("Decode cache hit for %s", mf4_path)
+        return meta["log_start"], chunks
+    
+    log.info("Loading MF4 file: %s", mf4_path)
+    from asammdf import MDF  # heavy; the query endpoints never need it
+    with stage("mf4_open"):
         mdf = MDF(mf4_path)
+    report(10, "loaded MF4")
+    
+    # Only open the groups that carry IDs of this DBC, found via the CAN
+    # index cached next to the MF4 (built on the first ingest of a file)
+    with stage("filter"):
+        can_index = load_index(mdf, mf4_path)
+        relevant_groups = groups_for_ids(can_index, database.msg_ids)
+    log.debug("Relevant groups with DBC IDs: %s", relevant_groups)
+    if not relevant_groups:
+        mdf.close()
+        log.warning("No groups found with DBC CAN IDs in %s", mf4_path)
+        raise RuntimeError("No matching CAN data found in MF4 file")
+    
+    log_start = mdf.header.start_time.timestamp()
+    cache_writer = decode_cache.writer(log_key, {"log_start": log_start, "mf4_file": mf4_path})
+    return log_start, _decode_groups(report, mdf, relevant_groups, database, cache_writer)
 
+def _decode_groups(report, mdf, relevant_groups, database, cache_writer):
+    """Decode the relevant groups chunk by chunk, caching each chunk on the way"""
+    total_frames = sum(relevant_groups.values())
+    frames_before = 0
+    try:
+        # Bounded-size chunks keep memory independent of the log length. UDS
+        # responses (ISO-TP messages in the DBC) are reassembled across chunks.
+        for can_group, group_frames in relevant_groups.items():
+            log.debug("Streaming %d relevant CAN frames from group %s", group_frames, can_group)
+            chunk_progress = lambda fraction: report(
+                10 + 70 * (frames_before + fraction * group_frames) / total_frames, "decoding")
+            for decoded in iter_decoded_mf4(mdf, can_group, database, progress=chunk_progress):
+                with stage("cache_write"):
+                    cache_writer.add(decoded)
+                yield decoded
+            frames_before += group_frames
+        cache_writer.commit()
+    except BaseException:
+        cache_writer.abort()
+        raise
+    finally:
+        mdf.close()
 
-        print("Relevant groups with DBC IDs: [21]")  # Hardcoding for now since we know it
-        filter_channels = [('Timestamp', 21), ('CAN_DataFrame', 21), ('CAN_DataFrame.BusChannel', 21), ('CAN_DataFrame.ID', 21), ('CAN_DataFrame.IDE', 21), ('CAN_DataFrame.DLC', 21), ('CAN_DataFrame.DataLength', 21), ('CAN_DataFrame.DataBytes', 21), ('CAN_DataFrame.Dir', 21)]
-        print(f"Filtering to channels: {filter_channels}")
-        mdf_filtered = mdf.filter(filter_channels)
-            
-        print("Filtered MDF structure:")
-        for group_idx, group in enumerate(mdf_filtered.groups):
-            print(f"Group {group_idx}:")
-            for channel_idx, channel in enumerate(group.channels):
-                print(f"  Channel {channel_idx}: {channel.name}")
-                if channel.name == "CAN_DataFrame.DataBytes":
-                    data_signal = mdf_filtered.get("CAN_DataFrame.DataBytes", group=group_idx)
-                    if data_signal and len(data_signal.samples) > 0:
-                        print(f"    First few DataBytes: {data_signal.samples[:5]}")
-                    else:
-                        print("    No DataBytes samples found")
-                        
-        # # # print("Raw CAN IDs in MF4:") # just for debugging
-        # # relevant_groups = []
-        # # for group_idx, group in enumerate(mdf.groups):
-        # #     try:
-        # #         id_channel = mdf.get("CAN_DataFrame.ID", group=group_idx)
-        # #         if id_channel and len(id_channel.samples) > 0:
-        # #             unique_ids = set(id_channel.samples)
-        # #             # print(f"Group {group_idx}: {unique_ids}") # just for debugging
-        # #             # Check for DBC IDs: 2028, 1979, 1960
-        # #             if any(id in unique_ids for id in [2028, 1979, 1960]):
-        # #                 relevant_groups.append(group_idx)
-        # #     except Exception as e:
-        # #         # print(f"Group {group_idx}: No CAN_DataFrame.ID ({str(e)})") # just for debugging
-        # #         continue
-        
-        # # if not relevant_groups:
-        # #     print("No groups found with DBC CAN IDs (2028, 1979, 1960)")
-        # #     return jsonify({"error": "No matching CAN data found in MF4 file"}), 404
-            
-        # print(f"Relevant groups with DBC IDs: {relevant_groups}")
-        # # Filter using channel name and group index
-        # filter_channels = []
-        # for group_idx in relevant_groups:
-        #     for channel in mdf.groups[group_idx].channels:
-        #         filter_channels.append((channel.name, group_idx))
-        # print(f"Filtering to channels: {filter_channels}")
-        # mdf_filtered = mdf.filter(filter_channels)
-
-        print(f"Decoding using DBC file: {dbc_path}")
-        database_files = {
-            "CAN": [(dbc_path, 0)]
-        }
-        print(f"Database files: {database_files}") # just checking this is right.
-        mdf_decoded = mdf_filtered.extract_bus_logging(database_files=database_files)
-        
-        if mdf_decoded is None:
-            print("Decoding failed!")
-            return jsonify({"error": "Failed to decode CAN data with the provided DBC file"}), 500
-        
-        print("Decoded MDF structure:")
-        for group_idx, group in enumerate(mdf_decoded.groups):
-            print(f"Group {group_idx}:")
-            for channel_idx, channel in enumerate(group.channels):
-                print(f"  Channel {channel_idx}: {channel.name}")
-        
-        print("Converting to dataframe")
-        df = mdf_decoded.to_dataframe()
-        
-        if df.empty:
-            print("DataFrame is empty!")
-            return jsonify({"error": "No data found in MF4 file after decoding"}), 404
+def ingest_vehicle(report, vehicle_id, dbc_path, mf4_path, profile=None):
+    """Decode one vehicle's MF4 log and store the results (runs in a job worker).
 
-        print("DataFrame columns:", df.columns.tolist())
-        print("First row:", df.iloc[0].to_dict())
-        
-        first_row = df.iloc[0]
-        timestamp = datetime.datetime.now()
-        
-        all_metrics = {}
-        metrics_catalog = {}
-        
-        for column in df.columns:
-            if column.lower() not in ["time", "timestamp"]:
-                base_name = column.split("_")[0]
-                if base_name.lower() == "s":
-                    print(f"Skipping column: {column}")
-                    continue
-                print(f"Processing column: {column}")
-                signal = mdf_decoded.get(base_name)
-                if signal and len(signal.samples) > 0:
-                    try:
-                        value = float(first_row[column])
-                        unit = signal.unit or ""
-                        print(f"  Value: {value}, Unit: {unit}")
-                        
-                        # Categorize the metric based on name
-                        categories = []
-                        
-                        # Battery related
-                        if any(kw in column.lower() for kw in ["battery", "soc", "charge", "bms"]):
-                            categories.append("battery")
-                            
-                        # Drivetrain related
-                        if any(kw in column.lower() for kw in ["motor", "drive", "power", "torque", "rpm"]):
-                            categories.append("drivetrain")
-                            
-                        # Temperature related
-                        if any(kw in column.lower() for kw in ["temp", "temperature", "thermal"]):
-                            categories.append("temperature")
-                            
-                        # Electrical system
-                        if any(kw in column.lower() for kw in ["volt", "current", "amp", "electric"]):
-                            categories.append("electrical")
-                            
-                        # Vehicle status
-                        if any(kw in column.lower() for kw in ["speed", "velocity", "accel", "brake", "steer"]):
-                            categories.append("vehicle_status")
-                            
-                        # HVAC system
-                        if any(kw in column.lower() for kw in ["hvac", "ac", "heat", "cool", "fan"]):
-                            categories.append("hvac")
-                            
-                        # If no category found, use "other"
-                        if not categories:
-                            categories.append("other")
-                            
-                        all_metrics[column] = {
-                            "value": value,
-                            "unit": unit,
-                            "categories": categories
-                        }
-                        
-                        # Store in metrics catalog for future reference
-                        metrics_catalog[column] = {
-                            "unit": unit,
-                            "categories": categories,
-                            "last_seen": timestamp
-                        }
-                    except Exception as e:
-                        print(f"Error processing column {column}: {str(e)}")
-                        # Skip this column and continue
+    `report(percent, message)` publishes progress to the job table. With
+    `profile` ("cprofile" or "pyinstrument") the run is profiled and the
+    result names the profile file. Counters and stage timings go to the web
+    process's /metrics when the job ends.
+    """
+    outcome = "failed"
+    try:
+        # One writer per vehicle, shared with incremental and fleet ingest
+        with signal_store.writer(vehicle_id):
+            try:
+                if profile:
+                    with capture_profile(profile, f"ingest-{vehicle_id}") as profile_path:
+                        result = _ingest_vehicle(report, vehicle_id, dbc_path, mf4_path)
+                    result["profile"] = profile_path
+                else:
+                    result = _ingest_vehicle(report, vehicle_id, dbc_path, mf4_path)
+            finally:
+                signal_store.touch(vehicle_id)  # cached responses of this vehicle are stale now
+        outcome = "done"
+        emit("ingested", vehicle_id)  # frees the web process's cached responses early
+        return result
+    finally:
+        METRICS.inc("ev_ingest_runs_total", outcome=outcome)
+        METRICS.set_max("ev_process_peak_rss_bytes", peak_rss_bytes(), process="ingest_worker")
+        if in_worker():
+            emit("metrics", METRICS.drain())
+
+def _replace_log(vehicle_id, log_id):
+    """Delete a stored log's samples, rollups and series documents before it is stored again"""
+    info = signal_store.logs(vehicle_id)[log_id]
+    changed = signal_store.remove_log(vehicle_id, log_id)
+    if info.get("start") is None:
+        return
+    for signal in changed:
+        rollup_store.update(vehicle_id, signal, info["start"], info["end"])
+    delete_series(series_collection(), vehicle_id, info["start"], info["end"])
+
+def _log_info(mf4_path, log_start, decoder, first_time, last_time, complete):
+    return {"mf4_file": mf4_path, "log_start": log_start, "decoder": decoder, "complete": complete,
+            "start": log_start + float(first_time), "end": log_start + float(last_time)}
+
+def _ingest_vehicle(report, vehicle_id, dbc_path, mf4_path):
+    vehicle_info = VEHICLES[vehicle_id]
+    log.info("Decoding %s using DBC file: %s", mf4_path, dbc_path)
+    with stage("load_dbc"):
+        database = load_database(dbc_path)
+    # Stored logs are keyed by MF4 content: a log already stored by this DBC
+    # and decoder version is not stored twice, and one stored by another (or
+    # by an interrupted run) is replaced rather than appended again
+    log_id = file_hash(mf4_path)
+    decoder = f"{database.content_hash}:{DECODER_VERSION}"
+    stored = signal_store.logs(vehicle_id).get(log_id)
+    store_series = stored is None or stored.get("decoder") != decoder or not stored.get("complete")
+    if store_series and stored is not None:
+        log.info("Replacing the stored samples of %s", mf4_path)
+        with stage("store"):
+            _replace_log(vehicle_id, log_id)
+    log_start, chunks = decode_log(report, mf4_path, database, log_id)
+    first_values = {}  # (time, value) of the first decoded sample of each signal
+    first_time = last_time = None
+    series_documents = 0
+    
+    for decoded in chunks:
+        for name, (times, values) in decoded.items():
+            if len(values) and (name not in first_values or times[0] < first_values[name][0]):
+                first_values[name] = (times[0], values[0])
+            if len(times):
+                first_time = times[0] if first_time is None else min(first_time, times[0])
+                last_time = times[-1] if last_time is None else max(last_time, times[-1])
+        if store_series and first_time is not None:
+            # Record the range before storing it, so an interrupted run can be replaced
+            signal_store.mark_log(vehicle_id, log_id, _log_info(mf4_path, log_start, decoder,
+                                                                first_time, last_time, complete=False))
+            # Keep the full series in the signal store with absolute (epoch) timestamps
+            with stage("store"):
+                signal_store.append_decoded(vehicle_id, decoded, time_offset=log_start)
+                rollup_store.update_decoded(vehicle_id, decoded, time_offset=log_start)
+            # Store the series of metrics with a unit as bucketed documents
+            with stage("mongo_write"):
+                series_documents += write_series(series_collection(), vehicle_id,
+                                                 {name: series for name, series in decoded.items()
+                                                  if name in database.units},
+                                                 time_offset=log_start)
+            emit("samples", (vehicle_id, live_samples(decoded, log_start)))
+    
+    if not first_values:
+        log.warning("Decoding %s failed: no signals", mf4_path)
+        raise RuntimeError("Failed to decode CAN data with the provided DBC file")
+    
+    log.info("Decoded signals: %d", len(first_values))
+    if store_series:
+        with stage("store"):
+            # Chunks of several channel groups or an older log overlap: merge them once
+            signal_store.compact(vehicle_id, first_values)
+        signal_store.mark_log(vehicle_id, log_id, _log_info(mf4_path, log_start, decoder,
+                                                            first_time, last_time, complete=True))
+        log.info("Stored %d series documents", series_documents)
+        with stage("segment"):
+            segment_index.update(vehicle_id, since=log_start + first_time)
+    
+    report(80, "building metrics")
+    timestamp = datetime.datetime.now()
+    
+    all_metrics = {}
+    metrics_catalog = {}
+    
+    # Units, ranges and categories come from the DBC catalog, built once per DBC
+    with stage("categorize"):
+        catalog = catalog_for(database)
+    for column, (_, first_value) in first_values.items():
+        info = catalog.get(column)
+        if info is None:
+            continue
+        try:
+            value = float(first_value)
+        except (TypeError, ValueError) as e:
+            log.warning("Error processing column %s: %s", column, e)
+            continue
         
-        # Store all metrics in MongoDB
-        metrics_record = {
-            "vehicle_id": vehicle_id,
-            "make": vehicle_info["make"],
-            "model": vehicle_info["model"],
-            "year": vehicle_info["year"],
-            "metrics": all_metrics,
-            "timestamp": timestamp,
-            "metrics_count": len(all_metrics)
+        all_metrics[column] = {
+            "value": value,
+            "unit": info["unit"],
+            "categories": info["categories"]
         }
         
-        metrics_collection.insert_one(metrics_record)
-        
-        # Update metrics catalog with info about available metrics
-        for metric_name, metric_info in metrics_catalog.items():
-            metrics_catalog_collection.update_one(
-                {"vehicle_id": vehicle_id, "metric_name": metric_name},
-                {"$set": {
-                    "vehicle_id": vehicle_id,
-                    "make": vehicle_info["make"],
-                    "model": vehicle_info["model"],
-                    "metric_name": metric_name,
-                    "unit": metric_info["unit"],
-                    "categories": metric_info["categories"],
-                    "last_seen": metric_info["last_seen"]
-                }},
-                upsert=True
-            )
-        
-        return jsonify({
-            "success": True,
-            "vehicle_id": vehicle_id,
-            "make": vehicle_info["make"],
-            "model": vehicle_info["model"],
-            "timestamp": timestamp.isoformat(),
-            "metrics_processed": len(all_metrics)
-        })
-        
-    except Exception as e:
-        import traceback
-        print(f"Error processing files: {str(e)}")
-        print(traceback.format_exc())
-        return jsonify({"error": f"Failed to process: {str(e)}"}), 500
+        # Store in metrics catalog for future reference
+        metrics_catalog[column] = {
+            "unit": info["unit"],
+            "categories": info["categories"],
+            "min": info["min"],
+            "max": info["max"],
+            "multiplexer": info["multiplexer"],
+            "mux_values": info["mux_values"],
+            "last_seen": timestamp
+        }
+    
+    report(90, "writing to MongoDB")
+    # Store all metrics in MongoDB
+    metrics_record = {
+        "vehicle_id": vehicle_id,
+        "make": vehicle_info["make"],
+        "model": vehicle_info["model"],
+        "year": vehicle_info["year"],
+        "metrics": all_metrics,
+        "timestamp": timestamp,
+        "metrics_count": len(all_metrics)
+    }
+    
+    with stage("mongo_write"):
+        metrics_collection().insert_one(metrics_record)
+        # Update metrics catalog with info about available metrics (one bulk write)
+        upsert_catalog(catalog_collection(), vehicle_id, vehicle_info, metrics_catalog)
+    
+    report(100, "done")
+    return {
+        "success": True,
+        "vehicle_id": vehicle_id,
+        "make": vehicle_info["make"],
+        "model": vehicle_info["model"],
+        "timestamp": timestamp.isoformat(),
+        "metrics_processed": len(all_metrics)
+    }
+
+@api.route("/metrics", methods=["GET"])
+def get_prometheus_metrics():
+    """Ingest counters and stage timings in the Prometheus text format"""
+    METRICS.set_max("ev_process_peak_rss_bytes", peak_rss_bytes(), process="web")
+    cache = decode_cache.stats()
+    extra = [("ev_ingest_jobs", "gauge", "Ingest jobs by state", {"state": state}, count)
+             for state, count in ingest_jobs.counts().items()]
+    extra += [
+        ("ev_decode_cache_hits_total", "counter", "Decode cache hits", {}, cache["hits"]),
+        ("ev_decode_cache_misses_total", "counter", "Decode cache misses", {}, cache["misses"]),
+        ("ev_decode_cache_bytes", "gauge", "Size of the decode cache", {}, cache["bytes"]),
+    ]
+    derived = derived_cache.stats()
+    extra += [
+        ("ev_derived_cache_hits_total", "counter", "Derived signal memo hits", {}, derived["hits"]),
+        ("ev_derived_cache_misses_total", "counter", "Derived signal memo misses", {}, derived["misses"]),
+        ("ev_derived_cache_bytes", "gauge", "Size of the derived signal memo", {}, derived["bytes"]),
+        ("ev_live_subscribers", "gauge", "Open live feed streams", {}, live_feed.subscriber_count()),
+    ]
+    responses = response_cache.stats()
+    extra += [("ev_response_cache_total", "counter", "Cached endpoint requests by outcome",
+               {"outcome": outcome}, responses[outcome]) for outcome in ("hits", "misses", "not_modified")]
+    extra.append(("ev_response_cache_bytes", "gauge", "Size of the response cache", {}, responses["bytes"]))
+    return Response(METRICS.render(extra), mimetype="text/plain; version=0.0.4")
+
+@api.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Hit/miss counters and size of the decode result cache"""
+    return jsonify(decode_cache.stats())
 
-@app.route("/api/metrics/catalog/<vehicle_id>", methods=["GET"])
+@api.route("/api/metrics/catalog/<vehicle_id>", methods=["GET"])
+@response_cache.cached()
 def get_metrics_catalog(vehicle_id):
     """Get the catalog of all available metrics for a vehicle"""
     if vehicle_id not in VEHICLES:
         return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
         
     try:
-        catalog = list(metrics_catalog_collection.find(
+        catalog = list(catalog_collection().find(
             {"vehicle_id": vehicle_id},
             {"_id": 0}  # Exclude MongoDB _id
         ))
         
+        # Derived metrics whose inputs this vehicle has
+        for metric_name, definition in derived_signals.available(vehicle_id).items():
+            catalog.append({
+                "vehicle_id": vehicle_id,
+                "metric_name": metric_name,
+                "unit": definition["unit"],
+                "categories": definition["categories"],
+                "expression": definition["expression"],
+                "derived": True
+            })
+        
         # Group by category for easier frontend consumption
         categories = {}
         for metric in catalog:
@@ -304,7 +466,8 @@ def get_metrics_catalog(vehicle_id):
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve metrics catalog: {str(e)}"}), 500
 
-@app.route("/api/metrics/<vehicle_id>", methods=["GET"])
+@api.route("/api/metrics/<vehicle_id>", methods=["GET"])
+@response_cache.cached()
 def get_metrics(vehicle_id):
     """Get the latest metrics for a vehicle with optional filtering"""
     if vehicle_id not in VEHICLES:
@@ -316,7 +479,7 @@ def get_metrics(vehicle_id):
     
     try:
         # Get the most recent record for this vehicle
-        latest_record = metrics_collection.find_one(
+        latest_record = metrics_collection().find_one(
             {"vehicle_id": vehicle_id},
             sort=[("timestamp", -1)]
         )
@@ -351,9 +514,22 @@ def get_metrics(vehicle_id):
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve metrics: {str(e)}"}), 500
 
-@app.route("/api/metrics/<vehicle_id>/history", methods=["GET"])
+def history_series(history, metric_names):
+    """Per-metric (times, values) arrays of metric records, oldest first"""
+    series = {}
+    for metric_name in metric_names:
+        points = [(record["timestamp"].timestamp(), record["metrics"][metric_name]["value"])
+                  for record in reversed(history) if metric_name in record["metrics"]]
+        series[metric_name] = {
+            "times": np.array([t for t, _ in points], dtype=np.float64),
+            "values": np.array([v for _, v in points], dtype=np.float64)
+        }
+    return series
+
+@api.route("/api/metrics/<vehicle_id>/history", methods=["GET"])
+@response_cache.cached(headers=("Accept", "Accept-Encoding"))
 def get_metrics_history(vehicle_id):
-    """Get historical data for specific metrics"""
+    """Get historical data for specific metrics (?format=arrow|packed for a binary stream)"""
     if vehicle_id not in VEHICLES:
         return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
         
@@ -362,15 +538,27 @@ def get_metrics_history(vehicle_id):
     
     if not metric_names or metric_names[0] == '':
         return jsonify({"error": "Please specify at least one metric"}), 400
+    try:
+        fmt = negotiate_format(request)
+        dtype = value_dtype(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     try:
         # Get historical records
-        history = list(metrics_collection.find(
+        history = list(metrics_collection().find(
             {"vehicle_id": vehicle_id},
             sort=[("timestamp", -1)],
             limit=limit
         ))
         
+        vehicle_info = VEHICLES[vehicle_id]
+        if fmt != "json":
+            return series_response(history_series(history, metric_names),
+                                   {"vehicle_id": vehicle_id, "make": vehicle_info["make"],
+                                    "model": vehicle_info["model"], "metric_names": metric_names},
+                                   fmt, negotiate_encoding(request), dtype)
+        
         # Extract just the requested metrics
         processed_history = []
         for record in history:
@@ -385,7 +573,6 @@ def get_metrics_history(vehicle_id):
             
             processed_history.append(entry)
         
-        vehicle_info = VEHICLES[vehicle_id]
         return jsonify({
             "vehicle_id": vehicle_id,
             "make": vehicle_info["make"],
@@ -396,9 +583,195 @@ def get_metrics_history(vehicle_id):
     except Exception as e:
         return jsonify({"error": f"Failed to retrieve history: {str(e)}"}), 500
 
-# Add this to run the Flask app
+@api.route("/api/metrics/<vehicle_id>/series", methods=["GET"])
+def get_metrics_series(vehicle_id):
+    """Get the stored time series of specific metrics, optionally within a time window.
+
+    ?downsample=lttb|m4 with ?points=N or ?width=PIXELS returns a chart-ready
+    series that keeps each metric's extremes.
+
+    ?resolution=SECONDS (or points/width without downsample) answers from the
+    coarsest precomputed rollup level that is at least that fine, returning
+    per-bucket min/max/mean/count/last instead of raw samples.
+
+    ?format=arrow|packed (or the matching Accept header) streams the series
+    in a binary format instead of JSON; see seriesEncoding.
+
+    Derived metrics (derivedSignals) are computed on first use.
+
+    ?segment=ID limits the series to a trip or charging session's time range.
+    """
+    if vehicle_id not in VEHICLES:
+        return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
+        
+    metric_names = request.args.get("metrics", "").split(",")
+    if not metric_names or metric_names[0] == '':
+        return jsonify({"error": "Please specify at least one metric"}), 400
+    
+    try:
+        start = float(request.args["start"]) if "start" in request.args else None
+        end = float(request.args["end"]) if "end" in request.args else None
+    except ValueError:
+        return jsonify({"error": "start and end must be epoch seconds"}), 400
+    if "segment" in request.args:
+        segment = segment_index.get(vehicle_id, request.args["segment"])
+        if segment is None:
+            return jsonify({"error": f"Unknown segment: {request.args['segment']}"}), 404
+        start, end = segment["start"], segment["end"]
+    
+    mode = request.args.get("downsample")
+    points = request.args.get("points", type=int)
+    width = request.args.get("width", type=int)
+    if mode and mode not in DOWNSAMPLE_MODES:
+        return jsonify({"error": f"downsample must be one of {', '.join(DOWNSAMPLE_MODES)}"}), 400
+    if mode and not (points or width):
+        return jsonify({"error": "downsample needs points or width"}), 400
+    resolution = request.args.get("resolution", type=float)
+    try:
+        fmt = negotiate_format(request)
+        dtype = value_dtype(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        series = {}
+        for metric_name in metric_names:
+            if derived_signals.is_derived(metric_name):
+                # No rollups for derived metrics; points/width M4-downsample them
+                times, values = derived_signals.read(vehicle_id, metric_name, start, end)
+                raw_count = len(times)
+                if mode or points or width:
+                    times, values = downsample(times, values, mode or "m4", points=points, width=width)
+                series[metric_name] = {"raw_count": raw_count, "times": times, "values": values}
+                continue
+            
+            metric_resolution = resolution
+            if metric_resolution is None and not mode and (points or width):
+                time_range = signal_store.time_range(vehicle_id, metric_name)
+                if time_range:
+                    span_start = time_range[0] if start is None else max(start, time_range[0])
+                    span_end = time_range[1] if end is None else min(end, time_range[1])
+                    metric_resolution = (span_end - span_start) / (points or width)
+            rolled = None
+            if metric_resolution is not None:
+                rolled = rollup_store.series(vehicle_id, metric_name, metric_resolution, start, end)
+            if rolled is not None:
+                series[metric_name] = dict(rolled, values=rolled["mean"])
+                continue
+            
+            times, values = signal_store.read(vehicle_id, metric_name, start, end)
+            raw_count = len(times)
+            if mode:
+                times, values = downsample(times, values, mode, points=points, width=width)
+            series[metric_name] = {
+                "raw_count": raw_count,
+                "times": times,
+                "values": values
+            }
+        
+        meta = {"vehicle_id": vehicle_id, "start": start, "end": end}
+        if fmt != "json":
+            return series_response(series, meta, fmt, negotiate_encoding(request), dtype)
+        return jsonify(dict(meta, series=json_ready(series)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to retrieve series: {str(e)}"}), 500
+
+@api.route("/api/segments/<vehicle_id>", methods=["GET"])
+def get_segments(vehicle_id):
+    """Trips, charging sessions and idle periods with their summaries.
+
+    ?kind=trip|ac_charge|dc_charge|idle, ?start=&end= (epoch seconds) for the
+    segments overlapping a window and ?last=N for the newest N, e.g.
+    ?kind=dc_charge&last=1 for the last DC fast charge. Pass a segment's id
+    as ?segment= to the series endpoint for its raw data.
+    """
+    if vehicle_id not in VEHICLES:
+        return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
+    kind = request.args.get("kind")
+    if kind and kind not in SEGMENT_KINDS:
+        return jsonify({"error": f"kind must be one of {', '.join(SEGMENT_KINDS)}"}), 400
+    try:
+        start = float(request.args["start"]) if "start" in request.args else None
+        end = float(request.args["end"]) if "end" in request.args else None
+        last = int(request.args["last"]) if "last" in request.args else None
+    except ValueError:
+        return jsonify({"error": "start and end must be epoch seconds and last a number"}), 400
+    segments = segment_index.query(vehicle_id, kind, start, end, last)
+    return jsonify({"vehicle_id": vehicle_id, "segments": segments})
+
+@api.route("/api/segments/<vehicle_id>/<segment_id>", methods=["GET"])
+def get_segment(vehicle_id, segment_id):
+    """One segment's summary"""
+    if vehicle_id not in VEHICLES:
+        return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
+    segment = segment_index.get(vehicle_id, segment_id)
+    if segment is None:
+        return jsonify({"error": f"Unknown segment: {segment_id}"}), 404
+    return jsonify(dict(segment, vehicle_id=vehicle_id))
+
+@api.route("/api/metrics/<vehicle_id>/query", methods=["GET"])
+def query_metrics(vehicle_id):
+    """Get several metrics aligned on one time grid.
+
+    ?metrics=a,b with optional ?start=&end= (epoch seconds), ?rate=HZ for a
+    fixed-rate grid or ?on=METRIC to align on one metric's timestamps
+    (default: union of all timestamps), ?fill=previous|nearest|linear|mean
+    and ?tolerance=SECONDS. Values without a sample in reach are null.
+    ?format=arrow|packed returns the frame in a binary format.
+    """
+    if vehicle_id not in VEHICLES:
+        return jsonify({"error": f"Invalid vehicle: {vehicle_id}"}), 400
+    
+    metric_names = [name for name in request.args.get("metrics", "").split(",") if name]
+    if not metric_names:
+        return jsonify({"error": "Please specify at least one metric"}), 400
+    
+    try:
+        start = float(request.args["start"]) if "start" in request.args else None
+        end = float(request.args["end"]) if "end" in request.args else None
+        rate = float(request.args["rate"]) if "rate" in request.args else None
+        tolerance = float(request.args.get("tolerance", DEFAULT_TOLERANCE))
+    except ValueError:
+        return jsonify({"error": "start, end, rate and tolerance must be numbers"}), 400
+    fill = request.args.get("fill", "previous")
+    if fill not in FILLS:
+        return jsonify({"error": f"fill must be one of {', '.join(FILLS)}"}), 400
+    try:
+        fmt = negotiate_format(request)
+        dtype = value_dtype(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        frame = query_signals(derived_signals, vehicle_id, metric_names, start, end, rate,
+                              on=request.args.get("on"), fill=fill, tolerance=tolerance)
+        meta = {"vehicle_id": vehicle_id, "start": start, "end": end, "rate": rate, "fill": fill}
+        times = frame.pop("t")
+        if fmt != "json":
+            return series_response({"frame": dict(frame, times=times)}, meta, fmt,
+                                   negotiate_encoding(request), dtype)
+        return jsonify(dict(meta, t=times.tolist(),
+                            metrics={name: [None if v != v else v for v in values.tolist()]
+                                     for name, values in frame.items()}))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to query metrics: {str(e)}"}), 500
+
+def create_app():
+    """The Flask app (e.g. `flask --app asammdfDecoding:create_app run`)"""
+    configure_logging()  # LOG_LEVEL=DEBUG for per-group and per-file detail
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    # Without MongoDB this waits for the server selection timeout; don't hold up startup
+    threading.Thread(target=try_ensure_indexes, daemon=True).start()
+    return app
+
+# Add this to run the Flask app (FLASK_DEBUG=1 for the reloader and debugger)
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=os.environ.get("FLASK_DEBUG") == "1")
 
 # I couldn't get asammdf to install on my Mac. Wheel build failed. Try again on windows.
 
@@ -0,0 +1,50 @@
+"""CAN index build/load time and decoding with and without ID filtering.
+
+Usage: python benchmarks/bench_can_index.py [frames] [noise_ids]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from synthetic import HYUNDAI_DBC, synthetic_frames, write_mf4
+from asammdf import MDF
+from canIndex import groups_for_ids, load_index
+from dbcCache import load_database
+from mf4Stream import iter_can_chunks, iter_decoded
+
+
+def decode_all(mdf, group, database, can_ids):
+    samples = 0
+    for decoded in iter_decoded(database, iter_can_chunks(mdf, group, can_ids=can_ids)):
+        samples += sum(len(times) for times, _ in decoded.values())
+    return samples
+
+
+def main(frames=3_000_000, noise_ids=200):
+    database = load_database(HYUNDAI_DBC)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "synthetic.mf4")
+        timestamps, can_ids, data = synthetic_frames(frames, noise_ids=noise_ids)[:3]
+        write_mf4(path, timestamps, can_ids, data)
+        del timestamps, can_ids, data
+        print(f"{frames:,} frames, half of them over {noise_ids} unrelated IDs")
+
+        mdf = MDF(path)
+        began = time.perf_counter()
+        index = load_index(mdf, path)
+        print(f"index build (cold):  {(time.perf_counter() - began) * 1e3:8.1f} ms")
+        began = time.perf_counter()
+        index = load_index(mdf, path)
+        groups = groups_for_ids(index, database.msg_ids)
+        print(f"index load (cached): {(time.perf_counter() - began) * 1e3:8.1f} ms, groups {groups}")
+
+        for label, wanted in (("all frames", None), ("DBC IDs only", database.msg_ids)):
+            began = time.perf_counter()
+            samples = decode_all(mdf, 0, database, wanted)
+            print(f"decode {label:<12}  {time.perf_counter() - began:8.2f} s ({samples:,} samples)")
+        mdf.close()
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
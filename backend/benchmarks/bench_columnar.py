@@ -0,0 +1,77 @@
+"""Load the csvTrimmer battery columns from CSV vs. the Parquet dataset.
+
+Usage: python benchmarks/bench_columnar.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from columnarSignals import read_signals, write_decoded
+
+BATTERY_COLUMNS = [
+    "StateOfChargeBMS", "StateOfChargeDisplay", "StateOfHealth", "BatteryCurrent",
+    "BatteryDCVoltage", "BatteryAvailableChargePower", "BatteryAvailableDischargePower",
+    "BatteryMaxTemperature", "BatteryMinTemperature", "BatteryTemperature1",
+    "BatteryTemperature2", "BatteryTemperature3", "BatteryTemperature4",
+    "BatteryTemperature5", "BatteryHeaterTemperature1", "BatteryVoltageAuxillary",
+    "BatteryFanStatus", "BatteryFanFeedback", "BMSIgnition", "BMSMainRelay",
+    "CEC_CumulativeEnergyCharged", "CED_CumulativeEnergyDischarged",
+    "CCC_CumulativeChargeCurrent", "CDC_CumulativeDischargeCurrent", "Charging",
+    "MaxCellVoltage", "MaxCellVoltageCellNo", "MinCellVoltage", "MinCellVoltageCellNo",
+    "MinDeterioration", "MinDeteriorationCellNo", "OperatingTime", "OutdoorTemperature",
+    "Speed", "AccelerationX", "AccelerationY", "AccelerationZ", "Altitude",
+]
+
+
+def synthetic_decoded(rows, seed=0):
+    """A wide decoded log: the battery columns plus 98 cell voltages"""
+    rng = np.random.default_rng(seed)
+    columns = {"TimeStamp": np.cumsum(rng.uniform(0.01, 0.02, rows))}
+    for name in BATTERY_COLUMNS:
+        columns[name] = np.round(rng.normal(50, 10, rows), 1)
+    for cell in range(1, 99):
+        columns[f"CellVoltage{cell:02d}"] = np.round(rng.uniform(3.5, 4.2, rows) / 0.02) * 0.02
+    df = pd.DataFrame(columns)
+    df["signal_group"] = rng.choice(["Battery_S_M62_R_M101", "Battery_S_M62_R_M102"], rows)
+    return df
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(rows=500_000):
+    df = synthetic_decoded(rows)
+    columns = ["TimeStamp"] + BATTERY_COLUMNS
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "decoded.csv")
+        df.to_csv(csv_path, index=False)
+        root = os.path.join(tmp, "dataset")
+        write_decoded(df, root, "ioniq5", "00000001")
+
+        csv_size = os.path.getsize(csv_path)
+        parquet_size = sum(os.path.getsize(os.path.join(d, f))
+                           for d, _, files in os.walk(root) for f in files)
+        print(f"{rows:,} rows x {df.shape[1]} columns; CSV {csv_size / 1e6:.0f} MB, "
+              f"Parquet {parquet_size / 1e6:.0f} MB")
+
+        seconds, _ = timed(lambda: pd.read_csv(csv_path)[columns])
+        print(f"read_csv, all columns:       {seconds * 1e3:9.1f} ms")
+        seconds, _ = timed(lambda: pd.read_csv(csv_path, usecols=columns))
+        print(f"read_csv, usecols:           {seconds * 1e3:9.1f} ms")
+        seconds, _ = timed(lambda: read_signals(root, columns=columns))
+        print(f"Parquet, {len(columns)} columns:         {seconds * 1e3:9.1f} ms")
+        end = df["TimeStamp"].iloc[rows // 100]
+        seconds, part = timed(lambda: read_signals(root, columns=columns, end=end))
+        print(f"Parquet, first 1% by time:   {seconds * 1e3:9.1f} ms ({len(part):,} rows)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,43 @@
+"""Startup cost of a DBC: cold parse vs. warm disk cache vs. memory hit.
+
+Usage: python benchmarks/bench_dbc_cache.py
+"""
+import glob
+import os
+import tempfile
+import time
+
+from synthetic import DBC_DIR
+
+import dbcCache
+from dbcDecoder import compile_dbc
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        print(f"{'DBC':40} {'cold parse':>12} {'disk load':>12} {'memory hit':>12}")
+        for path in sorted(glob.glob(os.path.join(DBC_DIR, "*.dbc"))):
+            cold = timed(lambda: compile_dbc(path))
+            dbcCache.load_database(path, cache_dir)
+
+            def warm():
+                dbcCache.clear_memory_cache()
+                dbcCache.load_database(path, cache_dir)
+
+            disk = timed(warm)
+            memory = timed(lambda: dbcCache.load_database(path, cache_dir), repeat=100)
+            print(f"{os.path.basename(path):40} {cold * 1e3:10.2f}ms {disk * 1e3:10.2f}ms "
+                  f"{memory * 1e6:10.2f}us")
+
+
+if __name__ == "__main__":
+    main()
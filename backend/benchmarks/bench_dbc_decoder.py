@@ -0,0 +1,106 @@
+"""Compare the native DBC decoder with asammdf's extract_bus_logging.
+
+Like for like: a broadcast log of the Tesla Model 3 DBC (plain frames, no
+ISO-TP), read from the same MF4 by both paths; the signal and sample
+counts are checked to match before the timings are compared.
+
+UDS: the Hyundai/Kia log holds ISO-TP framed responses. The native path
+reassembles them before decoding; asammdf cannot, so it only decodes the
+raw frames and finds (almost) none of the signals. Its timing there is
+shown for reference, not as a speed-up.
+
+Usage: python benchmarks/bench_dbc_decoder.py [frames]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic import DBC_DIR, HYUNDAI_DBC, synthetic_frames, write_mf4
+
+from dbcDecoder import compile_dbc, decode_frames
+
+BROADCAST_DBC = os.path.join(DBC_DIR, "can1-tesla-model-3.dbc")
+
+
+def broadcast_frames(db, count, seed=0):
+    """Random 8-byte frames of the DBC's messages: (timestamps, can_ids, data_bytes)"""
+    rng = np.random.default_rng(seed)
+    can_ids = db.msg_ids[rng.integers(0, len(db.msg_ids), count)]
+    data = rng.integers(0, 256, (count, 8), dtype=np.uint8)
+    timestamps = np.cumsum(rng.uniform(0.0005, 0.0015, count))
+    return timestamps, can_ids, data
+
+
+def native_from_mf4(mdf, db):
+    """(seconds, signals, samples) of reading group 0 and decoding it natively"""
+    start = time.perf_counter()
+    frames = mdf.get("CAN_DataFrame.DataBytes", group=0)
+    ids = mdf.get("CAN_DataFrame.ID", group=0).samples
+    decoded = decode_frames(db, frames.timestamps, ids, frames.samples)
+    seconds = time.perf_counter() - start
+    return seconds, len(decoded), sum(len(values) for _, values in decoded.values())
+
+
+def asammdf_from_mf4(mdf, dbc_path):
+    """(seconds, signals, samples) of extract_bus_logging"""
+    start = time.perf_counter()
+    extracted = mdf.extract_bus_logging(database_files={"CAN": [(dbc_path, 0)]})
+    seconds = time.perf_counter() - start
+    names, samples = set(), 0
+    for g, group in enumerate(extracted.groups):
+        for c, channel in enumerate(group.channels):
+            if channel.channel_type == 2:  # the time master
+                continue
+            names.add(channel.name)
+            samples += len(extracted.get(group=g, index=c))
+    extracted.close()
+    return seconds, len(names), samples
+
+
+def report(label, seconds, count, signals, samples):
+    print(f"{label:<24} {seconds:8.3f} s  {count / seconds:12,.0f} frames/s  "
+          f"{signals:5d} signals, {samples:,} samples")
+
+
+def main(count=1_000_000):
+    try:
+        from asammdf import MDF
+    except ImportError:
+        print("asammdf not installed, nothing to compare with")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = compile_dbc(BROADCAST_DBC)
+        timestamps, can_ids, data = broadcast_frames(db, count)
+        mdf = MDF(write_mf4(os.path.join(tmp, "broadcast.mf4"), timestamps, can_ids, data))
+        print(f"Like for like, {os.path.basename(BROADCAST_DBC)}, {count:,} frames")
+        native = native_from_mf4(mdf, db)
+        reference = asammdf_from_mf4(mdf, BROADCAST_DBC)
+        mdf.close()
+        report("  native from MF4", native[0], count, *native[1:])
+        report("  asammdf", reference[0], count, *reference[1:])
+        assert native[1:] == reference[1:], "the decoders disagree"
+        print(f"  speed-up:              {reference[0] / native[0]:8.1f}x")
+
+        db = compile_dbc(HYUNDAI_DBC)
+        timestamps, can_ids, data = synthetic_frames(count)
+        start = time.perf_counter()
+        decoded = decode_frames(db, timestamps, can_ids, data)
+        in_memory = time.perf_counter() - start
+        mdf = MDF(write_mf4(os.path.join(tmp, "uds.mf4"), timestamps, can_ids, data))
+        print(f"UDS (ISO-TP), {os.path.basename(HYUNDAI_DBC)}, {count:,} frames")
+        report("  native, in memory", in_memory, count, len(decoded),
+               sum(len(values) for _, values in decoded.values()))
+        native = native_from_mf4(mdf, db)
+        reference = asammdf_from_mf4(mdf, HYUNDAI_DBC)
+        report("  native from MF4", native[0], count, *native[1:])
+        report("  asammdf, raw frames", reference[0], count, *reference[1:])
+        print("  (asammdf does not reassemble ISO-TP: not the same work)")
+        mdf.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,94 @@
+"""Peak memory of decoding a synthetic MF4 log in chunks versus all at once.
+
+Each measurement runs in a fresh process. asammdf memory-maps the MF4, so
+plain RSS also counts the file's page-cache pages; the figure reported is
+the peak anonymous RSS (heap), sampled from /proc, which is what grows with
+log length and gets workers killed.
+
+Usage: python benchmarks/bench_mf4_stream.py [frames]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from synthetic import HYUNDAI_DBC, synthetic_frames, write_mf4
+
+
+def anon_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class PeakSampler(threading.Thread):
+    """Samples anonymous RSS every few milliseconds and keeps the maximum"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = anon_rss_mb()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, anon_rss_mb())
+            time.sleep(0.002)
+
+
+def run(mode, path):
+    """Child process: decode `path` and print peak RSS"""
+    from asammdf import MDF
+    from dbcCache import load_database
+    from dbcDecoder import decode_frames
+    from mf4Stream import iter_decoded_mf4
+
+    database = load_database(HYUNDAI_DBC)
+    baseline = anon_rss_mb()
+    sampler = PeakSampler()
+    sampler.start()
+    began = time.perf_counter()
+    mdf = MDF(path)
+    samples = 0
+    if mode == "stream":
+        for decoded in iter_decoded_mf4(mdf, 0, database):
+            samples += sum(len(times) for times, _ in decoded.values())
+    else:
+        data_signal = mdf.get("CAN_DataFrame.DataBytes", group=0)
+        can_ids = mdf.get("CAN_DataFrame.ID", group=0).samples
+        data_lengths = mdf.get("CAN_DataFrame.DataLength", group=0).samples
+        decoded = decode_frames(database, data_signal.timestamps, can_ids, data_signal.samples,
+                                data_lengths)
+        samples = sum(len(times) for times, _ in decoded.values())
+    mdf.close()
+    sampler.running = False
+    sampler.join()
+    print(f"{mode:>6}: {time.perf_counter() - began:6.2f} s, {samples:,} samples, "
+          f"peak anonymous RSS {sampler.peak:7.0f} MB ({sampler.peak - baseline:+.0f} MB over imports)")
+
+
+def write(path, frames):
+    """Child process: write the synthetic log in slices so the writer stays small too"""
+    timestamps, can_ids, data = synthetic_frames(frames, noise_ids=3)[:3]
+    write_mf4(path, timestamps, can_ids, data)
+
+
+def main(frames=10_000_000):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "synthetic.mf4")
+        subprocess.run([sys.executable, __file__, "--write", path, str(frames)], check=True)
+        print(f"{frames:,} frames, {os.path.getsize(path) / 1e6:.0f} MB MF4")
+        for mode in ("stream", "full"):
+            subprocess.run([sys.executable, __file__, "--run", mode, path])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--write"]:
+        write(sys.argv[2], int(sys.argv[3]))
+    elif sys.argv[1:2] == ["--run"]:
+        run(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
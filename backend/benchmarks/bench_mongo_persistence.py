@@ -0,0 +1,78 @@
+"""Catalog upserts and series writes: per-metric round trips versus batched writes.
+
+Runs against a local mongod when one answers, otherwise against mongomock
+(which has no network round trips, so the gap there is a lower bound).
+
+Usage: python benchmarks/bench_mongo_persistence.py [metrics] [samples_per_metric]
+"""
+import datetime
+import sys
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from mongoPersistence import ensure_indexes, read_series, upsert_catalog, write_series
+
+
+def connect():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    client = MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+        return client, "mongod"
+    except PyMongoError:
+        import mongomock
+        return mongomock.MongoClient(), "mongomock"
+
+
+def main(metric_count=250, samples=20_000):
+    client, backend = connect()
+    db = client["ev_data_bench"]
+    for name in ("vehicle_metrics", "metrics_catalog", "metric_series"):
+        db.drop_collection(name)
+    ensure_indexes(db["vehicle_metrics"], db["metrics_catalog"], db["metric_series"])
+    vehicle_info = {"make": "Hyundai", "model": "Ioniq 5"}
+    now = datetime.datetime.now()
+    catalog = {f"Signal{i}": {"unit": "V", "categories": ["electrical"], "last_seen": now}
+               for i in range(metric_count)}
+    print(f"{backend}: {metric_count} metrics, {samples:,} samples each")
+
+    began = time.perf_counter()
+    for metric_name, metric_info in catalog.items():
+        db["metrics_catalog"].update_one(
+            {"vehicle_id": "ioniq5", "metric_name": metric_name},
+            {"$set": dict(metric_info, vehicle_id="ioniq5", metric_name=metric_name, **vehicle_info)},
+            upsert=True)
+    print(f"catalog, update_one loop: {(time.perf_counter() - began) * 1e3:8.1f} ms")
+
+    began = time.perf_counter()
+    upsert_catalog(db["metrics_catalog"], "ioniq5", vehicle_info, catalog)
+    print(f"catalog, bulk_write:      {(time.perf_counter() - began) * 1e3:8.1f} ms")
+
+    rng = np.random.default_rng(0)
+    times = 1.7e9 + np.arange(samples) * 0.1
+    decoded = {name: (times, rng.normal(size=samples)) for name in list(catalog)[:10]}
+    sample = {"Signal0": decoded["Signal0"]}
+
+    began = time.perf_counter()
+    db["metric_series"].insert_many(
+        [{"vehicle_id": "ioniq5", "metric_name": "Signal0", "t": float(t), "v": float(v)}
+         for t, v in zip(*sample["Signal0"])], ordered=False)
+    per_sample = time.perf_counter() - began
+    print(f"series, one doc/sample:   {per_sample * 1e3:8.1f} ms for 1 metric")
+    db.drop_collection("metric_series")
+
+    began = time.perf_counter()
+    documents = write_series(db["metric_series"], "ioniq5", decoded)
+    print(f"series, bucketed:         {(time.perf_counter() - began) * 1e3:8.1f} ms for "
+          f"{len(decoded)} metrics ({documents} documents)")
+
+    read_times, read_values = read_series(db["metric_series"], "ioniq5", "Signal3")
+    assert np.array_equal(read_values, decoded["Signal3"][1])
+    client.drop_database("ev_data_bench")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
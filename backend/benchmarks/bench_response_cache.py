@@ -0,0 +1,71 @@
+"""A dashboard polling the catalog, latest metrics and history endpoints.
+
+Each round requests the three endpoints for every registered vehicle:
+with the cache invalidated before every request (the old behaviour), from
+the cache, and revalidated with If-None-Match. Runs against a local mongod
+when one answers, otherwise against mongomock.
+
+Usage: python benchmarks/bench_response_cache.py [rounds] [metrics]
+"""
+import datetime
+import sys
+import time
+
+from bench_mongo_persistence import connect
+
+import asammdfDecoding
+import mongoPersistence
+
+BENCH_DB = "ev_bench_response_cache"
+
+
+def populate(db, vehicles, metric_count):
+    metric_names = [f"Signal{i:03d}" for i in range(metric_count)]
+    for vehicle_id, info in vehicles.items():
+        for hour in range(24):
+            db.vehicle_metrics.insert_one({
+                "vehicle_id": vehicle_id, "make": info["make"], "model": info["model"], "year": info["year"],
+                "timestamp": datetime.datetime(2024, 1, 1, hour),
+                "metrics": {name: {"value": float(hour), "unit": "V", "categories": ["battery"]}
+                            for name in metric_names},
+            })
+        db.metrics_catalog.insert_many([{"vehicle_id": vehicle_id, "metric_name": name, "unit": "V",
+                                         "categories": ["battery"]} for name in metric_names])
+    return metric_names
+
+
+def main(rounds=50, metric_count=300):
+    client, kind = connect()
+    mongoPersistence.set_client(client)
+    mongoPersistence.MONGO_DB = BENCH_DB  # never the real ev_data
+    client.drop_database(BENCH_DB)
+    db = mongoPersistence.get_database()
+    vehicles = asammdfDecoding.VEHICLES
+    metric_names = populate(db, vehicles, metric_count)
+    app = asammdfDecoding.create_app().test_client()
+    cache = asammdfDecoding.response_cache
+    urls = []
+    for vehicle_id in vehicles:
+        urls += [(vehicle_id, url) for url in (
+            f"/api/metrics/catalog/{vehicle_id}", f"/api/metrics/{vehicle_id}?categories=battery",
+            f"/api/metrics/{vehicle_id}/history?metrics={','.join(metric_names[:20])}&limit=24")]
+    print(f"{kind}: {len(vehicles)} vehicles, {metric_count} metrics, {len(urls)} requests per round")
+
+    etags = {}
+    for label in ("uncached", "cached", "If-None-Match"):
+        began = time.perf_counter()
+        for _ in range(rounds):
+            for vehicle_id, url in urls:
+                if label == "uncached":
+                    cache.invalidate(vehicle_id)
+                headers = {"If-None-Match": etags[url]} if label == "If-None-Match" else {}
+                response = app.get(url, headers=headers)
+                assert response.status_code == (304 if label == "If-None-Match" else 200)
+                etags[url] = response.headers["ETag"]
+        elapsed = time.perf_counter() - began
+        print(f"{label:<14} {elapsed / (rounds * len(urls)) * 1e3:8.3f} ms per request")
+    client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,59 @@
+"""Whole-trip StateOfChargeBMS view from rollups versus raw samples, and
+the cost of rolling up one live 30 s chunk that lands in the last stored
+bucket (it should not grow with the stored history).
+
+Usage: python benchmarks/bench_rollups.py [days]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from downsampling import m4
+from rollups import RollupStore
+from signalStore import SignalStore
+
+DAY = 86400.0
+
+
+def main(days=7, rate_hz=10, width=1200):
+    with tempfile.TemporaryDirectory() as root:
+        store = SignalStore(root)
+        rollups = RollupStore(store)
+        rng = np.random.default_rng(0)
+        began = time.perf_counter()
+        for day in range(days):  # one log per day
+            times = day * DAY + np.arange(0, DAY, 1 / rate_hz)
+            values = 80 - np.cumsum(rng.normal(0, 0.001, len(times)))
+            store.append("ioniq5", "StateOfChargeBMS", times, values)
+            rollups.update("ioniq5", "StateOfChargeBMS", times[0], times[-1])
+        total = sum(s["count"] for s in store.index("ioniq5", "StateOfChargeBMS"))
+        print(f"{days} days at {rate_hz} Hz: {total:,} samples, ingest + rollup "
+              f"{time.perf_counter() - began:.2f} s")
+
+        start, end = 0.0, days * DAY
+        resolution = (end - start) / width
+        began = time.perf_counter()
+        times, values = store.read("ioniq5", "StateOfChargeBMS", start, end)
+        times, values = m4(times, values, width)
+        print(f"raw + M4:       {(time.perf_counter() - began) * 1e3:8.2f} ms ({len(times):,} points)")
+
+        began = time.perf_counter()
+        series = rollups.series("ioniq5", "StateOfChargeBMS", resolution, start, end)
+        print(f"rollup {series['level']:>4}s:    {(time.perf_counter() - began) * 1e3:8.2f} ms "
+              f"({len(series['times']):,} buckets)")
+
+        # The vehicle is still logging: 30 s chunks, each inside the last 10 min bucket
+        chunk = np.arange(0, 30, 1 / rate_hz)
+        began = time.perf_counter()
+        for n in range(10):
+            times = end + n * 30 + chunk
+            store.append("ioniq5", "StateOfChargeBMS", times, np.full(len(times), 50.0))
+            rollups.update("ioniq5", "StateOfChargeBMS", times[0], times[-1])
+        print(f"30 s chunk:     {(time.perf_counter() - began) * 1e2:8.2f} ms per append + rollup update")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
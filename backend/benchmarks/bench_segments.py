@@ -0,0 +1,81 @@
+"""Building the segment index over a month of logs, and answering from it.
+
+"Last DC fast charge" from the index against scanning the stored
+Charging and RapidChargePort samples.
+
+Usage: python benchmarks/bench_segments.py [days]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from segmentIndex import SIGNALS, SegmentIndex
+from signalStore import SignalStore
+
+DAY = 86400.0
+
+
+def synthetic_day(day, rng):
+    """A day at 1 Hz: two trips, an AC charge overnight and a DC charge every third day"""
+    times = day * DAY + np.arange(0, DAY, 1.0)
+    hour = (times - day * DAY) / 3600
+    trip = ((hour > 8) & (hour < 9)) | ((hour > 17) & (hour < 18.5))
+    dc = (day % 3 == 0) & (hour > 12) & (hour < 12.75)
+    ac = (hour > 22) | (hour < 5)
+    charging = ac | dc
+    signals = {
+        "charging": charging, "rapid_port": dc, "normal_port": ac, "relay": trip | charging,
+        "speed": np.where(trip, rng.uniform(0, 120, len(times)), 0.0),
+        "soc": 50 + 30 * np.sin(hour / 24 * 2 * np.pi), "charged": np.cumsum(charging) * 0.002,
+        "discharged": np.cumsum(trip) * 0.004, "current": np.where(charging, -120.0, np.where(trip, 90.0, 0.5)),
+        "temperature": 25 + 10 * dc,
+    }
+    return times, {role: np.asarray(values, dtype=np.float64) for role, values in signals.items()}
+
+
+def main(days=30):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as root:
+        store = SignalStore(root)
+        index = SegmentIndex(store)
+        building = 0.0
+        for day in range(days):  # one log per day, indexed after each like ingest does
+            times, signals = synthetic_day(day, rng)
+            for role, values in signals.items():
+                store.append("ioniq5", SIGNALS[role], times, values)
+            began = time.perf_counter()
+            index.update("ioniq5", since=float(times[0]))
+            building += time.perf_counter() - began
+        segments = index.query("ioniq5")
+        print(f"{days} days at 1 Hz: {len(segments)} segments, "
+              f"incremental update {building / days * 1e3:.1f} ms per log")
+
+        os.remove(index._path("ioniq5"))  # rebuild from scratch
+        began = time.perf_counter()
+        SegmentIndex(store).update("ioniq5")
+        print(f"full rebuild:                 {(time.perf_counter() - began) * 1e3:9.1f} ms")
+
+        index = SegmentIndex(store)
+        began = time.perf_counter()
+        last = index.query("ioniq5", kind="dc_charge", last=1)[0]
+        print(f"last DC charge from index:    {(time.perf_counter() - began) * 1e3:9.3f} ms (cold)")
+        began = time.perf_counter()
+        for _ in range(1000):
+            index.query("ioniq5", kind="dc_charge", last=1)
+        print(f"last DC charge from index:    {(time.perf_counter() - began):9.3f} ms (warm)")
+
+        began = time.perf_counter()
+        times, charging = store.read("ioniq5", "Charging")
+        _, rapid = store.read("ioniq5", "RapidChargePort")
+        dc = np.flatnonzero((np.asarray(charging) > 0.5) & (np.asarray(rapid) > 0.5))
+        run_start = dc[np.r_[True, np.diff(dc) > 1]][-1]
+        print(f"last DC charge from a scan:   {(time.perf_counter() - began) * 1e3:9.3f} ms")
+        assert times[run_start] == last["start"]
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
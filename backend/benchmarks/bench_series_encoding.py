@@ -0,0 +1,48 @@
+"""Response size and encode time of a large series as JSON, Arrow IPC and packed arrays.
+
+Usage: python benchmarks/bench_series_encoding.py [samples]
+"""
+import gzip
+import json
+import sys
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from seriesEncoding import iter_arrow, iter_compressed, iter_packed, json_ready
+
+
+def timed(label, produce):
+    began = time.perf_counter()
+    data = produce()
+    print(f"{label:24s} {len(data) / 1e6:8.2f} MB {(time.perf_counter() - began) * 1e3:9.1f} ms")
+    return data
+
+
+def main(samples=1_000_000):
+    rng = np.random.default_rng(0)
+    times = 1.7e9 + np.arange(samples) / 10
+    series = {"StateOfChargeBMS": {"times": times,
+                                   "values": 80 - np.cumsum(rng.normal(0, 0.001, samples))}}
+    meta = {"vehicle_id": "ioniq5"}
+    print(f"{samples:,} samples")
+    timed("json", lambda: json.dumps(dict(meta, series=json_ready(series))).encode())
+    timed("json + gzip", lambda: gzip.compress(
+        json.dumps(dict(meta, series=json_ready(series))).encode(), 6))
+    for name, produce in (("arrow", iter_arrow), ("packed", iter_packed)):
+        for dtype in ("float64", "float32"):
+            for encoding in (None, "gzip", "zstd"):
+                try:
+                    timed(f"{name} {dtype} {encoding or ''}", lambda: b"".join(
+                        iter_compressed(produce(series, meta, np.dtype(dtype)), encoding)))
+                except AttributeError:  # zstandard not installed
+                    continue
+
+    began = time.perf_counter()
+    json.loads(json.dumps(dict(meta, series=json_ready(series))))
+    print(f"json parse (client side) {(time.perf_counter() - began) * 1e3:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
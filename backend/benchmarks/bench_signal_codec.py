@@ -0,0 +1,82 @@
+"""Size and speed of the compressed signal archive against the signal store.
+
+Signals are a week of UDS polling (about 1 Hz with jitter) shaped like the
+Hyundai/Kia DBC: an 8-bit SOC with scale 0.5, cell voltages with scale
+0.02, a 16-bit current with scale 0.1 and one plain float signal.
+
+Usage: python benchmarks/bench_signal_codec.py [days]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from signalArchive import SignalArchive
+from signalCodec import decode_block, encode
+from signalStore import SignalStore
+
+DAY = 86400.0
+
+
+def synthetic_signals(days, seed=0):
+    """{name: (times, values, scale, offset)}"""
+    rng = np.random.default_rng(seed)
+    count = int(days * DAY)
+    times = np.arange(count) + rng.uniform(-0.01, 0.01, count)
+    walk = np.cumsum(rng.integers(-1, 2, count))
+    return {
+        "StateOfChargeBMS": (times, np.clip(160 + walk // 50, 0, 255) * 0.5, 0.5, 0.0),
+        "CellVoltage01": (times, np.clip(190 + walk // 20 + rng.integers(-1, 2, count), 0, 255) * 0.02,
+                          0.02, 0.0),
+        "BatteryCurrent": (times, rng.integers(-2000, 2000, count) * 0.1, 0.1, 0.0),
+        "OutdoorTemperature": (times, 12 + 8 * np.sin(times / DAY * 2 * np.pi) + rng.normal(0, 0.3, count),
+                               None, 0.0),
+    }
+
+
+def main(days=7):
+    signals = synthetic_signals(days)
+    print(f"{days} days, {len(next(iter(signals.values()))[0]):,} samples per signal")
+    print(f"{'signal':<20} {'resolution':>10} {'B/sample':>9} {'ratio':>6} {'encode MS/s':>12} "
+          f"{'decode MS/s':>12}")
+    for name, (times, values, scale, offset) in signals.items():
+        for resolution in (None, 0.001):
+            began = time.perf_counter()
+            blocks = [data for _, _, _, data in encode(times, values, scale, offset, resolution)]
+            encode_seconds = time.perf_counter() - began
+            began = time.perf_counter()
+            for data in blocks:
+                decode_block(data)
+            decode_seconds = time.perf_counter() - began
+            per_sample = sum(len(b) for b in blocks) / len(times)
+            print(f"{name:<20} {str(resolution or 'lossless'):>10} {per_sample:9.2f} {16 / per_sample:6.1f} "
+                  f"{len(times) / encode_seconds / 1e6:12.1f} {len(times) / decode_seconds / 1e6:12.1f}")
+
+    with tempfile.TemporaryDirectory() as root:
+        store, archive = SignalStore(root + "/store"), SignalArchive(root + "/archive")
+        times, values, scale, offset = signals["BatteryCurrent"]
+        for day in range(days):  # one log per day
+            part = slice(int(day * DAY), int((day + 1) * DAY))
+            store.append("ioniq5", "BatteryCurrent", times[part], values[part])
+            archive.append("ioniq5", "BatteryCurrent", times[part], values[part], scale, offset)
+        print(f"\nBatteryCurrent on disk: store {len(times) * 16 / 1e6:.1f} MB, "
+              f"archive {archive.size('ioniq5', 'BatteryCurrent') / 1e6:.1f} MB")
+
+        start = days // 2 * DAY + 12 * 3600
+        for label, source in (("store", SignalStore(root + "/store")), ("archive", SignalArchive(root + "/archive"))):
+            began = time.perf_counter()
+            window_times, window_values = source.read("ioniq5", "BatteryCurrent", start, start + 3600)
+            mean = float(np.asarray(window_values).mean())
+            print(f"1 hour window from {label:<8} cold: {(time.perf_counter() - began) * 1e3:7.2f} ms "
+                  f"({len(window_times):,} samples, mean {mean:.2f})")
+        for label, source in (("store", store), ("archive", archive)):
+            began = time.perf_counter()
+            _, full_values = source.read("ioniq5", "BatteryCurrent")
+            mean = float(np.asarray(full_values).mean())
+            print(f"full scan from {label:<8}: {(time.perf_counter() - began) * 1e3:9.2f} ms (mean {mean:.2f})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
@@ -0,0 +1,65 @@
+"""Aligning 50 signals over 24 hours on a common grid.
+
+Signals are stored at mixed rates with jittered timestamps (as UDS
+responses arrive), then queried at 1 Hz with the vectorized engine,
+compared with pandas merge_asof and a row-wise Python loop (on 1 signal).
+
+Usage: python benchmarks/bench_signal_query.py [signals] [hours]
+"""
+import bisect
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from signalQuery import query, time_grid
+from signalStore import SignalStore
+
+
+def main(signals=50, hours=24):
+    span = hours * 3600.0
+    rng = np.random.default_rng(0)
+    names = [f"Signal{i:02d}" for i in range(signals)]
+    with tempfile.TemporaryDirectory() as root:
+        store = SignalStore(root)
+        total = 0
+        for i, name in enumerate(names):
+            rate = (0.5, 1.0, 10.0)[i % 3]
+            times = np.arange(0, span, 1 / rate) + rng.uniform(0, 0.2 / rate, int(np.ceil(span * rate)))
+            store.append("ioniq5", name, times, rng.normal(size=len(times)).cumsum())
+            total += len(times)
+        print(f"{signals} signals over {hours} h: {total:,} samples")
+
+        for fill in ("previous", "linear", "mean"):
+            began = time.perf_counter()
+            frame = query(store, "ioniq5", names, 0.0, span, rate=1.0, fill=fill)
+            print(f"engine, fill={fill:8s} {(time.perf_counter() - began) * 1e3:8.1f} ms "
+                  f"({len(frame['t']):,} rows x {signals})")
+
+        began = time.perf_counter()
+        merged = pd.DataFrame({"t": time_grid(0.0, span, 1.0)})
+        for name in names:
+            times, values = store.read("ioniq5", name)
+            merged = pd.merge_asof(merged, pd.DataFrame({"t": np.array(times), name: np.array(values)}),
+                                   on="t", tolerance=60.0)
+        print(f"pandas merge_asof          {(time.perf_counter() - began) * 1e3:8.1f} ms")
+        assert np.allclose(merged[names].to_numpy(),
+                           np.column_stack([query(store, "ioniq5", names, 0.0, span, rate=1.0)[n]
+                                            for n in names]), equal_nan=True)
+
+        began = time.perf_counter()
+        times, values = store.read("ioniq5", names[0])
+        times, values = times.tolist(), values.tolist()
+        row_wise = []
+        for t in time_grid(0.0, span, 1.0).tolist():
+            i = bisect.bisect_right(times, t) - 1
+            row_wise.append(values[i] if i >= 0 and t - times[i] <= 60.0 else float("nan"))
+        elapsed = time.perf_counter() - began
+        print(f"row-wise Python, 1 signal  {elapsed * 1e3:8.1f} ms (~{elapsed * signals:.1f} s for {signals})")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
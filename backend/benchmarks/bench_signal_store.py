@@ -0,0 +1,68 @@
+"""One hour of BatteryCurrent out of a month of logs from the signal store,
+and the cost of appending the same month backwards (a backfill), where
+every log starts before the stored data.
+
+Usage: python benchmarks/bench_signal_store.py [days]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import synthetic  # noqa: F401  (puts backend/ on sys.path)
+from signalStore import SignalStore
+
+DAY = 86400.0
+
+
+def main(days=30, rate_hz=10):
+    with tempfile.TemporaryDirectory() as root:
+        store = SignalStore(root)
+        rng = np.random.default_rng(0)
+        for day in range(days):  # one log per day
+            times = day * DAY + np.arange(0, DAY, 1 / rate_hz)
+            store.append("ioniq5", "BatteryCurrent", times, rng.normal(0, 50, len(times)))
+        total = sum(s["count"] for s in store.index("ioniq5", "BatteryCurrent"))
+        print(f"{days} days at {rate_hz} Hz: {total:,} samples, {total * 16 / 1e6:.0f} MB")
+
+        store = SignalStore(root)  # cold: nothing mapped yet
+        start = days // 2 * DAY + 12 * 3600
+        began = time.perf_counter()
+        times, values = store.read("ioniq5", "BatteryCurrent", start, start + 3600)
+        mean = float(values.mean())
+        cold = time.perf_counter() - began
+        print(f"1 hour window, cold: {cold * 1e3:8.2f} ms ({len(times):,} samples, mean {mean:.2f})")
+
+        began = time.perf_counter()
+        for _ in range(100):
+            times, values = store.read("ioniq5", "BatteryCurrent", start, start + 3600)
+        print(f"1 hour window, warm: {(time.perf_counter() - began) * 10:8.3f} ms")
+
+        began = time.perf_counter()
+        times, values = store.read("ioniq5", "BatteryCurrent")
+        full_mean = float(np.asarray(values).mean())
+        print(f"full month scan:     {(time.perf_counter() - began) * 1e3:8.2f} ms (mean {full_mean:.2f})")
+
+    with tempfile.TemporaryDirectory() as root:
+        store = SignalStore(root)
+        rng = np.random.default_rng(0)
+        appending = compacting = 0.0
+        for day in reversed(range(days)):  # newest log first, in 24 chunks each
+            times = day * DAY + np.arange(0, DAY, 1 / rate_hz)
+            values = rng.normal(0, 50, len(times))
+            began = time.perf_counter()
+            for chunk in np.array_split(np.arange(len(times)), 24):
+                store.append("ioniq5", "BatteryCurrent", times[chunk], values[chunk])
+            appending += time.perf_counter() - began
+            began = time.perf_counter()
+            store.compact("ioniq5")  # once per log, as ingest does
+            compacting += time.perf_counter() - began
+        print(f"backfill, per log:   {appending / days * 1e3:8.2f} ms appending, "
+              f"{compacting / days * 1e3:8.2f} ms compacting")
+        times, _ = store.read("ioniq5", "BatteryCurrent")
+        assert len(times) == total and np.all(np.diff(times) > 0)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
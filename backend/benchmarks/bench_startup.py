@@ -0,0 +1,74 @@
+"""Import time and cold start of the web apps, as a regression guard.
+
+Each run is a fresh interpreter that imports the module and calls
+create_app(). Fails (exit status 1) when the median exceeds the budget or
+when a decoding library that should load lazily (asammdf, pandas) was
+imported, and lists the module's slowest imports from -X importtime.
+
+Usage: python benchmarks/bench_startup.py [runs] [budget_ms]
+"""
+import statistics
+import subprocess
+import sys
+
+import synthetic
+
+TARGETS = ("asammdfDecoding", "app")
+LAZY_MODULES = ("asammdf", "pandas", "pyarrow")
+
+COLD_START = """
+import sys, time
+began = time.perf_counter()
+import {module}
+{module}.create_app()
+print(time.perf_counter() - began)
+print(",".join(name for name in {lazy!r} if name in sys.modules))
+"""
+
+
+def cold_start(module):
+    """(seconds, lazy modules that got imported) of one fresh interpreter"""
+    output = subprocess.run([sys.executable, "-c", COLD_START.format(module=module, lazy=LAZY_MODULES)],
+                            cwd=synthetic.BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    seconds, loaded = output.split("\n")[:2]
+    return float(seconds), [name for name in loaded.split(",") if name]
+
+
+def slowest_imports(module, count=5):
+    """[(cumulative ms, name)] of the slowest imports made directly by `module`"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=synthetic.BACKEND_DIR, capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("   ") and not name.startswith("     "):  # nested one level
+            imports.append((int(cumulative) / 1e3, name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main(runs=5, budget_ms=1000):
+    print(f"{runs} cold starts each, budget {budget_ms} ms")
+    failed = False
+    for module in TARGETS:
+        timings, loaded = [], set()
+        for _ in range(runs):
+            seconds, lazy = cold_start(module)
+            timings.append(seconds * 1e3)
+            loaded.update(lazy)
+        median = statistics.median(timings)
+        print(f"{module:<16} import + create_app: median {median:7.1f} ms, min {min(timings):7.1f} ms")
+        for cumulative, name in slowest_imports(module):
+            print(f"    {cumulative:7.1f} ms  {name}")
+        if loaded:
+            print(f"    FAIL: imported {', '.join(sorted(loaded))} at startup")
+            failed = True
+        if median > budget_ms:
+            print(f"    FAIL: over the {budget_ms} ms budget")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:3])))
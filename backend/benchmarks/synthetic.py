@@ -0,0 +1,123 @@
+"""Synthetic CANedge-style logs for the benchmarks"""
+import os
+import sys
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DBC_DIR = os.path.join(BACKEND_DIR, "mf42csv", "dbc_files")
+HYUNDAI_DBC = os.path.join(DBC_DIR, "can1-hyundai-kia-uds-v2.4.dbc")
+
+# (CAN ID, UDS DID, response length) answered by the Hyundai/Kia DBC
+HYUNDAI_RESPONSES = [(2028, 0x0101, 61), (2028, 0x0102, 61), (2028, 0x0105, 61),
+                     (1979, 0x0100, 53), (1960, 0xC00B, 63)]
+
+CAN_FRAME_DTYPE = np.dtype([
+    ("CAN_DataFrame.BusChannel", "<u1"),
+    ("CAN_DataFrame.ID", "<u4"),
+    ("CAN_DataFrame.IDE", "<u1"),
+    ("CAN_DataFrame.DLC", "<u1"),
+    ("CAN_DataFrame.DataLength", "<u1"),
+    ("CAN_DataFrame.DataBytes", "(64,)u1"),
+    ("CAN_DataFrame.Dir", "<u1"),
+])
+
+
+def isotp_frame_count(length):
+    return 1 + -(-(length - 6) // 7)
+
+
+def isotp_frames(payloads):
+    """Split equally long UDS responses into ISO-TP first/consecutive frames.
+
+    Returns an (n, frames_per_response, 8) uint8 array.
+    """
+    count, length = payloads.shape
+    per_response = isotp_frame_count(length)
+    padded = np.full((count, 6 + 7 * (per_response - 1)), 0xAA, dtype=np.uint8)
+    padded[:, :length] = payloads
+    frames = np.empty((count, per_response, 8), dtype=np.uint8)
+    frames[:, 0, 0] = 0x10 | (length >> 8)
+    frames[:, 0, 1] = length & 0xFF
+    frames[:, 0, 2:] = padded[:, :6]
+    for k in range(1, per_response):
+        frames[:, k, 0] = 0x20 | (k & 0x0F)
+        frames[:, k, 1:] = padded[:, 6 + 7 * (k - 1):6 + 7 * k]
+    return frames
+
+
+def synthetic_responses(count, seed=0):
+    """Random reassembled UDS responses: (which response, payloads per type)"""
+    rng = np.random.default_rng(seed)
+    which = rng.integers(0, len(HYUNDAI_RESPONSES), count)
+    payloads = []
+    for r, (_, did, length) in enumerate(HYUNDAI_RESPONSES):
+        data = rng.integers(0, 256, (int((which == r).sum()), length), dtype=np.uint8)
+        data[:, 0] = 0x62
+        data[:, 1] = did >> 8
+        data[:, 2] = did & 0xFF
+        payloads.append(data)
+    return which, payloads
+
+
+def synthetic_frames(count, noise_ids=0, seed=0):
+    """A Hyundai/Kia UDS log of `count` 8-byte CAN frames.
+
+    Responses are ISO-TP framed. With `noise_ids`, about half of the frames
+    are unrelated bus traffic spread over that many other CAN IDs.
+    Returns (timestamps, can_ids, data_bytes).
+    """
+    rng = np.random.default_rng(seed + 1)
+    noise = rng.random(count) < 0.5 if noise_ids else np.zeros(count, dtype=bool)
+    uds_rows = np.flatnonzero(~noise)
+    mean_frames = np.mean([isotp_frame_count(r[2]) for r in HYUNDAI_RESPONSES])
+    # A small surplus of responses so random draws always cover every UDS row
+    which, payloads = synthetic_responses(int(len(uds_rows) / mean_frames * 1.01) + 16, seed)
+
+    per_response = np.array([isotp_frame_count(r[2]) for r in HYUNDAI_RESPONSES])[which]
+    first_row = np.cumsum(per_response) - per_response
+    frames = np.zeros((int(per_response.sum()), 8), dtype=np.uint8)
+    ids = np.zeros(len(frames), dtype=np.uint32)
+    for r, (can_id, _, _) in enumerate(HYUNDAI_RESPONSES):
+        block = isotp_frames(payloads[r])
+        rows = first_row[which == r][:, None] + np.arange(block.shape[1])
+        frames[rows] = block
+        ids[rows] = can_id
+
+    data = rng.integers(0, 256, (count, 8), dtype=np.uint8)
+    can_ids = rng.integers(0x100, 0x100 + max(noise_ids, 1), count).astype(np.uint32)
+    data[uds_rows] = frames[:len(uds_rows)]
+    can_ids[uds_rows] = ids[:len(uds_rows)]
+    timestamps = np.cumsum(rng.uniform(0.0005, 0.0015, count))
+    return timestamps, can_ids, data
+
+
+def write_mf4(path, timestamps, can_ids, data, lengths=None, chunk=1_000_000, start_time=None):
+    """Write frames as a CAN bus logging MF4 file using asammdf"""
+    from asammdf import MDF, Signal
+    from asammdf.blocks.v4_blocks import SourceInformation
+    from asammdf.blocks.v4_constants import BUS_TYPE_CAN, SOURCE_BUS
+
+    mdf = MDF(version="4.10")
+    if start_time is not None:
+        mdf.header.start_time = start_time
+    source = SourceInformation(source_type=SOURCE_BUS, bus_type=BUS_TYPE_CAN)
+    for start in range(0, len(timestamps), chunk):
+        stop = min(start + chunk, len(timestamps))
+        records = np.zeros(stop - start, dtype=CAN_FRAME_DTYPE)
+        records["CAN_DataFrame.ID"] = can_ids[start:stop]
+        records["CAN_DataFrame.DataBytes"][:, :data.shape[1]] = data[start:stop]
+        records["CAN_DataFrame.DataLength"] = (
+            data.shape[1] if lengths is None else lengths[start:stop]
+        )
+        records["CAN_DataFrame.DLC"] = records["CAN_DataFrame.DataLength"]
+        if start == 0:
+            mdf.append(Signal(name="CAN_DataFrame", samples=records,
+                              timestamps=timestamps[start:stop], source=source))
+        else:
+            mdf.extend(0, [(timestamps[start:stop], None), (records, None)])
+    mdf.save(path, overwrite=True)
+    mdf.close()
+    return path
@@ -0,0 +1,133 @@
+"""Per-file index of the CAN IDs held by each MF4 data group.
+
+The index maps every group that has a CAN_DataFrame.ID channel to its frame
+count, time range and per-ID frame counts and time ranges. It is built once
+by streaming the ID channels and cached next to the MF4 as
+<file>.canidx.json, keyed by the file's size and mtime. When a logger has
+appended to the same log since, only the new records are scanned and added
+to the index. Ingest uses it to open only the groups that carry IDs of the
+chosen DBC.
+"""
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from dbcDecoder import CAN_ID_MASK
+from mf4Stream import iter_fragments
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".canidx.json"
+FRAGMENT_SIZE = 32 << 20  # bytes of records read at a time while indexing
+
+
+def index_path(mf4_path):
+    return mf4_path + INDEX_SUFFIX
+
+
+def _file_key(mf4_path):
+    stat = os.stat(mf4_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _scan_group(mdf, group, info=None):
+    """Summarise a group's ID channel, continuing `info` from its frame count on"""
+    info = info or {"frames": 0, "start": None, "end": None, "ids": {}}
+    counts = {int(can_id): entry["count"] for can_id, entry in info["ids"].items()}
+    starts = {int(can_id): entry["start"] for can_id, entry in info["ids"].items()}
+    ends = {int(can_id): entry["end"] for can_id, entry in info["ids"].items()}
+    frames = info["frames"]
+    first, last = info["start"], info["end"]
+    channel_group = mdf.groups[group].channel_group
+    record_size = channel_group.samples_byte_nr + channel_group.invalidation_bytes_nr
+    fragment_records = max(FRAGMENT_SIZE // max(record_size, 1), 1)
+    # Data blocks before the records already indexed are skipped, not read
+    for signal, in iter_fragments(mdf, group, ["CAN_DataFrame.ID"], frames, fragment_records):
+        if not len(signal):
+            continue
+        ids = signal.samples.astype(np.uint32) & np.uint32(CAN_ID_MASK)
+        times = signal.timestamps
+        frames += len(ids)
+        first = times[0] if first is None else min(first, times[0])
+        last = times[-1] if last is None else max(last, times[-1])
+        unique, inverse, chunk_counts = np.unique(ids, return_inverse=True, return_counts=True)
+        chunk_starts = np.full(len(unique), np.inf)
+        chunk_ends = np.full(len(unique), -np.inf)
+        np.minimum.at(chunk_starts, inverse, times)
+        np.maximum.at(chunk_ends, inverse, times)
+        for can_id, count, start, end in zip(unique.tolist(), chunk_counts.tolist(),
+                                             chunk_starts.tolist(), chunk_ends.tolist()):
+            counts[can_id] = counts.get(can_id, 0) + count
+            starts[can_id] = min(starts.get(can_id, start), start)
+            ends[can_id] = max(ends.get(can_id, end), end)
+    return {
+        "frames": frames,
+        "start": None if first is None else float(first),
+        "end": None if last is None else float(last),
+        "ids": {str(can_id): {"count": counts[can_id], "start": starts[can_id], "end": ends[can_id]}
+                for can_id in sorted(counts)},
+    }
+
+
+def build_index(mdf, previous=None):
+    """Scan the ID channel of every CAN group and summarise it.
+
+    With the `previous` index of the same log, only records after the ones
+    it counted are scanned.
+    """
+    mdf.configure(read_fragment_size=FRAGMENT_SIZE)
+    previous_groups = (previous or {}).get("groups", {})
+    groups = {}
+    for group, _ in mdf.channels_db.get("CAN_DataFrame.ID", []):
+        groups[str(group)] = _scan_group(mdf, group, previous_groups.get(str(group)))
+    return {"version": INDEX_VERSION, "log_start": mdf.header.start_time.timestamp(), "groups": groups}
+
+
+def load_index(mdf, mf4_path):
+    """Return the CAN index of an MF4 file, building and caching it when stale.
+
+    A stale index of the same log (same start time, no group shorter than
+    indexed) is extended with the appended records rather than rebuilt.
+    """
+    key = _file_key(mf4_path)
+    path = index_path(mf4_path)
+    previous = None
+    try:
+        with open(path) as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION:
+            if index.get("file") == key:
+                return index
+            if index.get("log_start") == mdf.header.start_time.timestamp() and all(
+                    int(group) < len(mdf.groups)
+                    and info["frames"] <= mdf.groups[int(group)].channel_group.cycles_nr
+                    for group, info in index["groups"].items()):
+                previous = index
+    except (OSError, ValueError):
+        pass
+
+    index = build_index(mdf, previous)
+    index["file"] = key
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log.warning("Could not write CAN index %s: %s", path, e)
+    return index
+
+
+def groups_for_ids(index, can_ids):
+    """{group: frames of the wanted IDs} for groups holding any of `can_ids`, in group order"""
+    wanted = {str(int(can_id) & CAN_ID_MASK) for can_id in can_ids}
+    selected = {}
+    for group, info in sorted(index["groups"].items(), key=lambda item: int(item[0])):
+        frames = sum(info["ids"][can_id]["count"] for can_id in wanted & info["ids"].keys())
+        if frames:
+            selected[int(group)] = frames
+    return selected
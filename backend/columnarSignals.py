@@ -0,0 +1,148 @@
+"""Columnar (Parquet) storage for decoded signals.
+
+Decoded logs are written as a hive-partitioned Parquet dataset laid out as
+<root>/vehicle=<vehicle>/log=<log>/part-0.parquet, one float32 column per
+signal and `signal_group` dictionary-encoded. Every log stores a signal with
+the same type, so the logs of a dataset share one schema; a signal missing
+from some logs reads as nulls there. Readers only touch the columns they ask
+for and skip row groups outside the requested time range.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+TIME_COLUMNS = ["TimeStamp", "timestamps", "timestamp", "t", "time"]
+ROW_GROUP_SIZE = 64 * 1024
+# Explicit string types, so log names such as 00000001 are not read as integers
+PARTITIONING = ds.partitioning(pa.schema([("vehicle", pa.string()), ("log", pa.string())]),
+                               flavor="hive")
+SIGNAL_TYPE = np.float32
+# Fixed index width, so a column's dictionary type does not depend on how
+# many categories one log happens to hold
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+
+def find_time_column(columns):
+    for name in TIME_COLUMNS:
+        if name in columns:
+            return name
+    return None
+
+
+def partition_path(root, vehicle, log):
+    return os.path.join(root, f"vehicle={vehicle}", f"log={log}", "part-0.parquet")
+
+
+def narrow_types(df):
+    """Store signal columns as float32 and text columns as categories.
+
+    The type does not depend on a log's values: a signal that happens to be
+    integral in one log must still match the float32 column of the next.
+    """
+    time_column = find_time_column(df.columns)
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if name == time_column:
+            if column.dtype == object:
+                column = pd.to_datetime(column, utc=True)
+        elif name == "signal_group" or column.dtype == object:
+            column = column.astype("category")
+        elif column.dtype.kind in "iubf":
+            column = column.astype(SIGNAL_TYPE)
+        columns[name] = column
+    return pd.DataFrame(columns)
+
+
+def write_decoded(df, root, vehicle, log):
+    """Write one decoded log as a partition of the dataset at `root`"""
+    return write_parquet(df, partition_path(root, vehicle, log))
+
+
+def write_parquet(df, path):
+    """Write a decoded DataFrame to a Parquet file with narrowed column types"""
+    df = narrow_types(df)
+    time_column = find_time_column(df.columns)
+    if time_column:
+        # Sorted row groups give tight min/max statistics for time pushdown
+        df = df.sort_values(time_column, kind="stable")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.cast(pa.schema([
+        field.with_type(DICTIONARY_TYPE) if pa.types.is_dictionary(field.type) else field
+        for field in table.schema]))
+    # Dot-prefixed so dataset readers ignore a half-written file
+    partial_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".partial")
+    pq.write_table(table, partial_path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(partial_path, path)
+    return path
+
+
+def read_signals(root, columns=None, vehicle=None, log=None, start=None, end=None):
+    """Read decoded signals from a Parquet dataset or a single Parquet file.
+
+    Only `columns` (plus the time column) are read. `start`/`end` bound the
+    time column and are pushed down to row-group statistics. Raises
+    ValueError when a requested column is in none of the logs.
+    """
+    dataset = _open_dataset(root)
+    names = dataset.schema.names
+    time_column = find_time_column(names)
+
+    filters = []
+    if vehicle is not None and "vehicle" in names:
+        filters.append(ds.field("vehicle") == vehicle)
+    if log is not None and "log" in names:
+        filters.append(ds.field("log") == log)
+    if time_column and (start is not None or end is not None):
+        time_type = dataset.schema.field(time_column).type
+        if start is not None:
+            filters.append(ds.field(time_column) >= _time_scalar(start, time_type))
+        if end is not None:
+            filters.append(ds.field(time_column) <= _time_scalar(end, time_type))
+    expression = None
+    for condition in filters:
+        expression = condition if expression is None else expression & condition
+
+    if columns is not None:
+        missing = [c for c in columns if c not in names]
+        if missing:
+            raise ValueError(f"Columns not found in {root}: {missing}")
+        columns = list(columns)
+        if time_column and time_column not in columns:
+            columns.insert(0, time_column)
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas()
+
+
+def _open_dataset(root):
+    """The dataset at `root` with one schema unified over all of its files.
+
+    Discovery takes the schema of the first file only; columns that first
+    appear in a later log, or files written before signals were stored as
+    float32 (int8 in one log, float32 in the next), need the union.
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    schemas = [dataset.schema] + [fragment.physical_schema for fragment in dataset.get_fragments()]
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    return ds.dataset(root, schema=schema, format="parquet", partitioning=PARTITIONING)
+
+
+def _time_scalar(value, time_type):
+    if pa.types.is_timestamp(time_type):
+        value = pd.Timestamp(value)
+        if value.tzinfo is None and time_type.tz is not None:
+            value = value.tz_localize("UTC")
+        return pa.scalar(value, type=time_type)
+    return pa.scalar(float(value), type=time_type)
+
+
+def load_signals(path, columns=None, **kwargs):
+    """Load decoded signals from a CSV file or a Parquet dataset"""
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        return read_signals(path, columns=columns, **kwargs)
+    return pd.read_csv(path, usecols=columns)
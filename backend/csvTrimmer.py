@@ -1,7 +1,11 @@
-import pandas as pd
+from columnarSignals import load_signals
+from downsampling import downsample_rows
 
-# Load the CSV (replace with your file path)
-df = pd.read_csv("data/decoded_ev6_data_full.csv")
+# Decoded data: a CSV file or a Parquet dataset written by convert-mf4.py --format parquet
+DATA_PATH = "data/decoded_ev6_data_full.csv"
+# "stride" keeps every 40th row; "m4" or "lttb" keep each signal's peaks and
+# dips within the same number of rows
+MODE = "stride"
 
 # Select battery-related columns
 battery_columns = [
@@ -46,8 +50,15 @@ battery_columns = [
     "Altitude",
 ]
 
+# Load only the selected columns (replace DATA_PATH with your file path)
+df = load_signals(DATA_PATH, columns=battery_columns)
+
 # Extract a subset (e.g., first 1000 rows, or sample every 10th row for the full dataset)
-subset = df[battery_columns].iloc[::40]  # Sample every 10th row to reduce size
+if MODE == "stride":
+    subset = df[battery_columns].iloc[::40]  # Sample every 10th row to reduce size
+else:
+    rows = downsample_rows(df, battery_columns, "TimeStamp", MODE, points=max(len(df) // 40, 3))
+    subset = df[battery_columns].iloc[rows]
 
 # Save to JSON
 subset.to_json("battery_data.json", orient="records")
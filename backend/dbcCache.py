@@ -0,0 +1,143 @@
+"""Persistent cache of compiled DBC databases.
+
+Compiled databases are stored on disk in a compact binary form (message
+table, signal layout arrays and multiplexer maps) keyed by the SHA-256 of
+the DBC contents, so a worker restart loads arrays instead of re-parsing
+text. Loaded databases are also kept in a small in-process LRU.
+"""
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from dbcDecoder import CompiledDatabase, compile_dbc
+
+log = logging.getLogger(__name__)
+
+# Bump when the compiled layout in dbcDecoder changes
+FORMAT_VERSION = 1
+MAGIC = b"DBCC"
+
+CACHE_DIR = os.environ.get(
+    "DBC_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dbc_cache")
+)
+MEMORY_CACHE_SIZE = 8
+
+_memory_cache = OrderedDict()  # content hash -> CompiledDatabase
+_hash_cache = {}  # path -> (mtime, size, content hash)
+
+
+def file_hash(path):
+    """SHA-256 of a file, remembered until its mtime or size changes"""
+    stat = os.stat(path)
+    cached = _hash_cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    content_hash = digest.hexdigest()
+    _hash_cache[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+    return content_hash
+
+
+def cache_path(content_hash, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, f"{content_hash}-v{FORMAT_VERSION}.dbcc")
+
+
+def dump_compiled(db):
+    """Serialize a compiled database to bytes.
+
+    Layout: magic, 4-byte header length, JSON header holding the names and
+    the dtype/shape/offset of every array, then the raw array buffers.
+    """
+    header = {"arrays": {}, "names": {}}
+    buffers = []
+    offset = 0
+    for field in CompiledDatabase.ARRAY_FIELDS:
+        array = np.ascontiguousarray(getattr(db, field))
+        header["arrays"][field] = [array.dtype.str, list(array.shape), offset]
+        buffers.append(array.tobytes())
+        offset += array.nbytes
+    for field in CompiledDatabase.NAME_FIELDS:
+        header["names"][field] = list(getattr(db, field))
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    return b"".join([MAGIC, struct.pack("<I", len(header_bytes)), header_bytes] + buffers)
+
+
+def load_compiled_bytes(blob):
+    """Rebuild a compiled database from dump_compiled output without copying arrays"""
+    if blob[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a compiled DBC file")
+    (header_size,) = struct.unpack_from("<I", blob, len(MAGIC))
+    body = len(MAGIC) + 4 + header_size
+    header = json.loads(blob[len(MAGIC) + 4:body])
+    fields = dict(header["names"])
+    for field, (dtype, shape, offset) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) if shape else 1
+        fields[field] = np.frombuffer(blob, dtype=dtype, count=count,
+                                      offset=body + offset).reshape(shape)
+    return CompiledDatabase(**fields)
+
+
+def save_compiled(db, path):
+    """Write a compiled database to disk atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dump_compiled(db))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_compiled(path):
+    with open(path, "rb") as f:
+        return load_compiled_bytes(f.read())
+
+
+def load_database(dbc_path, cache_dir=None):
+    """Return the compiled database for a DBC file.
+
+    Looks in the in-process LRU first, then the on-disk cache, and only
+    parses the DBC text when neither has it.
+    """
+    content_hash = file_hash(dbc_path)
+    db = _memory_cache.get(content_hash)
+    if db is not None:
+        _memory_cache.move_to_end(content_hash)
+        return db
+
+    path = cache_path(content_hash, cache_dir)
+    db = None
+    if os.path.exists(path):
+        try:
+            db = load_compiled(path)
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            log.warning("Ignoring unreadable DBC cache %s: %s", path, e)
+    if db is None:
+        db = compile_dbc(dbc_path)
+        try:
+            save_compiled(db, path)
+        except OSError as e:
+            log.warning("Could not write DBC cache %s: %s", path, e)
+
+    db.content_hash = content_hash
+    _memory_cache[content_hash] = db
+    while len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    return db
+
+
+def clear_memory_cache():
+    _memory_cache.clear()
+    _hash_cache.clear()
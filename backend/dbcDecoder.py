@@ -0,0 +1,488 @@
+"""Vectorized DBC decoding engine.
+
+A DBC file is parsed once and every SG_ definition is compiled into a byte
+window, a shift and a mask. Decoding then works on whole NumPy arrays of
+CAN payloads grouped by CAN ID instead of one frame at a time.
+"""
+import re
+
+import numpy as np
+
+from isotpReassembly import IsoTpReassembler
+
+BO_RE = re.compile(r"^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\w+)")
+SG_RE = re.compile(
+    r"^\s*SG_\s+(\w+)\s*(M|m\d+M?)?\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*"
+    r"\(([^,]+),([^)]+)\)\s*\[([^|]*)\|([^\]]*)\]\s*\"([^\"]*)\""
+)
+MUL_VAL_RE = re.compile(r"^SG_MUL_VAL_\s+(\d+)\s+(\w+)\s+(\w+)\s+([\d\s,-]+);")
+SIGNAL_IGNORE_RE = re.compile(r'^BA_\s+"SignalIgnore"\s+SG_\s+(\d+)\s+(\w+)\s+(\d+)\s*;')
+MESSAGE_IGNORE_RE = re.compile(r'^BA_\s+"MessageIgnore"\s+BO_\s+(\d+)\s+(\d+)\s*;')
+TRANSPORT_RE = re.compile(r'^BA_\s+"TransportProtocolType"\s+BO_\s+(\d+)\s+"(\w*)"\s*;')
+VALTYPE_RE = re.compile(r"^SIG_VALTYPE_\s+(\d+)\s+(\w+)\s*:?\s*([12])\s*;")
+
+CAN_ID_MASK = 0x1FFFFFFF
+# Bump when decoded output changes, so cached decode results are not reused
+DECODER_VERSION = 1
+
+# Signal value types, as in SIG_VALTYPE_
+VALUE_INT = 0
+VALUE_FLOAT32 = 1
+VALUE_FLOAT64 = 2
+
+
+def parse_dbc(dbc_path):
+    """Parse a DBC file into a list of message dicts with their signals"""
+    messages = []
+    by_id = {}
+    mux_values = {}
+    ignored_signals = set()
+    value_types = {}
+
+    with open(dbc_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("BO_ "):
+                match = BO_RE.match(line)
+                if match:
+                    message = {
+                        "id": int(match.group(1)),
+                        "name": match.group(2),
+                        "dlc": int(match.group(3)),
+                        "isotp": False,
+                        "ignored": False,
+                        "signals": [],
+                    }
+                    messages.append(message)
+                    by_id[message["id"]] = message
+            elif line.startswith("SG_ ") and messages:
+                match = SG_RE.match(line)
+                if match:
+                    (name, mux, start, length, order, sign,
+                     scale, offset, minimum, maximum, unit) = match.groups()
+                    messages[-1]["signals"].append({
+                        "name": name,
+                        "mux": mux,
+                        "start": int(start),
+                        "length": int(length),
+                        "little_endian": order == "1",
+                        "signed": sign == "-",
+                        "scale": float(scale),
+                        "offset": float(offset),
+                        "minimum": float(minimum or 0),
+                        "maximum": float(maximum or 0),
+                        "unit": unit,
+                    })
+            elif line.startswith("SG_MUL_VAL_ "):
+                match = MUL_VAL_RE.match(line)
+                if match:
+                    ranges = []
+                    for part in match.group(4).split(","):
+                        low, _, high = part.strip().partition("-")
+                        ranges.append((int(low), int(high or low)))
+                    key = (int(match.group(1)), match.group(2))
+                    mux_values[key] = (match.group(3), ranges)
+            elif line.startswith("BA_ "):
+                match = SIGNAL_IGNORE_RE.match(line)
+                if match and match.group(3) == "1":
+                    ignored_signals.add((int(match.group(1)), match.group(2)))
+                    continue
+                match = MESSAGE_IGNORE_RE.match(line)
+                if match and match.group(2) == "1" and int(match.group(1)) in by_id:
+                    by_id[int(match.group(1))]["ignored"] = True
+                    continue
+                match = TRANSPORT_RE.match(line)
+                if match and int(match.group(1)) in by_id:
+                    by_id[int(match.group(1))]["isotp"] = match.group(2).upper() == "ISOTP"
+            elif line.startswith("SIG_VALTYPE_ "):
+                match = VALTYPE_RE.match(line)
+                if match:
+                    value_types[(int(match.group(1)), match.group(2))] = int(match.group(3))
+
+    for message in messages:
+        for signal in message["signals"]:
+            key = (message["id"], signal["name"])
+            signal["ignored"] = key in ignored_signals
+            signal["value_type"] = value_types.get(key, VALUE_INT)
+            signal["multiplexer"], signal["mux_ranges"] = _resolve_multiplexer(
+                message, signal, mux_values.get(key)
+            )
+    return messages
+
+
+def _resolve_multiplexer(message, signal, mux_value):
+    """Return the multiplexer signal name and raw value ranges for a signal"""
+    mux = signal["mux"]
+    if not mux or mux == "M":
+        return None, []
+    if mux_value is not None:
+        return mux_value
+    # Simple multiplexing: mNNN refers to the message's plain 'M' signal
+    value = int(mux.strip("mM"))
+    candidates = [s["name"] for s in message["signals"] if s["mux"] == "M"]
+    if not candidates:
+        candidates = [s["name"] for s in message["signals"]
+                      if s["mux"] and s["mux"].endswith("M") and s is not signal]
+    if not candidates:
+        return None, []
+    return candidates[0], [(value, value)]
+
+
+def _signal_layout(signal):
+    """Compute the 8-byte window, shift, mask and last byte for a signal"""
+    start, length = signal["start"], signal["length"]
+    if signal["little_endian"]:
+        first_byte = start // 8
+        shift = start % 8
+        last_byte = (start + length - 1) // 8
+        if shift + length > 64:
+            raise ValueError(f"Signal {signal['name']} spans more than 8 bytes")
+    else:
+        # Motorola start bit is the MSB in sawtooth numbering; convert to a
+        # linear big-endian bit position first
+        msb = (start // 8) * 8 + (7 - start % 8)
+        lsb = msb + length - 1
+        first_byte = msb // 8
+        last_byte = lsb // 8
+        if lsb - first_byte * 8 > 63:
+            raise ValueError(f"Signal {signal['name']} spans more than 8 bytes")
+        shift = 63 - (lsb - first_byte * 8)
+    mask = (1 << length) - 1 if length < 64 else 0xFFFFFFFFFFFFFFFF
+    return first_byte, shift, mask, last_byte
+
+
+class CompiledDatabase:
+    """A DBC compiled to flat NumPy arrays.
+
+    Messages are stored as a table with a CSR-style `msg_sig_start` pointer
+    into the signal arrays. Signals of a message are ordered so that a
+    multiplexer always comes before the signals it selects.
+    """
+
+    ARRAY_FIELDS = (
+        "msg_ids", "msg_dlc", "msg_isotp", "msg_extended", "msg_sig_start",
+        "sig_byte", "sig_last_byte", "sig_shift", "sig_mask", "sig_length",
+        "sig_big_endian", "sig_signed", "sig_value_type", "sig_scale",
+        "sig_offset", "sig_min", "sig_max", "sig_parent", "sig_is_mux",
+        "sig_ignored", "sig_mux_start", "mux_low", "mux_high",
+    )
+    NAME_FIELDS = ("msg_names", "sig_names", "sig_units", "sig_mux_labels")
+
+    def __init__(self, **fields):
+        for field in self.ARRAY_FIELDS + self.NAME_FIELDS:
+            setattr(self, field, fields[field])
+        self.content_hash = None
+        self.message_index = {int(frame_id): i for i, frame_id in enumerate(self.msg_ids)}
+        self.units = {}
+        for name, unit, ignored in zip(self.sig_names, self.sig_units, self.sig_ignored):
+            if not ignored:
+                self.units.setdefault(name, unit)
+
+    @classmethod
+    def from_messages(cls, messages):
+        messages = [m for m in messages if not m["ignored"]]
+        msg_fields = {"msg_ids": [], "msg_dlc": [], "msg_isotp": [],
+                      "msg_extended": [], "msg_sig_start": [0], "msg_names": []}
+        sig_fields = {name: [] for name in cls.ARRAY_FIELDS if name.startswith("sig_")
+                      and name != "sig_mux_start"}
+        sig_fields.update(sig_names=[], sig_units=[], sig_mux_labels=[])
+        mux_start, mux_low, mux_high = [0], [], []
+
+        for message in messages:
+            msg_fields["msg_ids"].append(message["id"] & CAN_ID_MASK)
+            msg_fields["msg_extended"].append(bool(message["id"] & 0x80000000))
+            msg_fields["msg_dlc"].append(message["dlc"])
+            msg_fields["msg_isotp"].append(message["isotp"])
+            msg_fields["msg_names"].append(message["name"])
+
+            signals = _mux_order(message["signals"])
+            base = len(sig_fields["sig_names"])
+            local_index = {s["name"]: base + i for i, s in enumerate(signals)}
+            multiplexers = {s["multiplexer"] for s in signals}
+            for signal in signals:
+                first_byte, shift, mask, last_byte = _signal_layout(signal)
+                sig_fields["sig_byte"].append(first_byte)
+                sig_fields["sig_last_byte"].append(last_byte)
+                sig_fields["sig_shift"].append(shift)
+                sig_fields["sig_mask"].append(mask)
+                sig_fields["sig_length"].append(signal["length"])
+                sig_fields["sig_big_endian"].append(not signal["little_endian"])
+                sig_fields["sig_signed"].append(signal["signed"])
+                sig_fields["sig_value_type"].append(signal["value_type"])
+                sig_fields["sig_scale"].append(signal["scale"])
+                sig_fields["sig_offset"].append(signal["offset"])
+                sig_fields["sig_min"].append(signal["minimum"])
+                sig_fields["sig_max"].append(signal["maximum"])
+                sig_fields["sig_parent"].append(local_index.get(signal["multiplexer"], -1))
+                sig_fields["sig_is_mux"].append(signal["name"] in multiplexers)
+                sig_fields["sig_ignored"].append(signal["ignored"])
+                sig_fields["sig_names"].append(signal["name"])
+                sig_fields["sig_units"].append(signal["unit"])
+                sig_fields["sig_mux_labels"].append(signal["mux"] or "")
+                for low, high in signal["mux_ranges"]:
+                    mux_low.append(low)
+                    mux_high.append(high)
+                mux_start.append(len(mux_low))
+            msg_fields["msg_sig_start"].append(len(sig_fields["sig_names"]))
+
+        return cls(
+            msg_ids=np.array(msg_fields["msg_ids"], dtype=np.uint32),
+            msg_dlc=np.array(msg_fields["msg_dlc"], dtype=np.uint16),
+            msg_isotp=np.array(msg_fields["msg_isotp"], dtype=bool),
+            msg_extended=np.array(msg_fields["msg_extended"], dtype=bool),
+            msg_sig_start=np.array(msg_fields["msg_sig_start"], dtype=np.int32),
+            msg_names=msg_fields["msg_names"],
+            sig_byte=np.array(sig_fields["sig_byte"], dtype=np.int16),
+            sig_last_byte=np.array(sig_fields["sig_last_byte"], dtype=np.int16),
+            sig_shift=np.array(sig_fields["sig_shift"], dtype=np.uint64),
+            sig_mask=np.array(sig_fields["sig_mask"], dtype=np.uint64),
+            sig_length=np.array(sig_fields["sig_length"], dtype=np.uint8),
+            sig_big_endian=np.array(sig_fields["sig_big_endian"], dtype=bool),
+            sig_signed=np.array(sig_fields["sig_signed"], dtype=bool),
+            sig_value_type=np.array(sig_fields["sig_value_type"], dtype=np.uint8),
+            sig_scale=np.array(sig_fields["sig_scale"], dtype=np.float64),
+            sig_offset=np.array(sig_fields["sig_offset"], dtype=np.float64),
+            sig_min=np.array(sig_fields["sig_min"], dtype=np.float64),
+            sig_max=np.array(sig_fields["sig_max"], dtype=np.float64),
+            sig_parent=np.array(sig_fields["sig_parent"], dtype=np.int32),
+            sig_is_mux=np.array(sig_fields["sig_is_mux"], dtype=bool),
+            sig_ignored=np.array(sig_fields["sig_ignored"], dtype=bool),
+            sig_mux_start=np.array(mux_start, dtype=np.int32),
+            mux_low=np.array(mux_low, dtype=np.int64),
+            mux_high=np.array(mux_high, dtype=np.int64),
+            sig_names=sig_fields["sig_names"],
+            sig_units=sig_fields["sig_units"],
+            sig_mux_labels=sig_fields["sig_mux_labels"],
+        )
+
+    def message_signals(self, msg_idx):
+        return range(self.msg_sig_start[msg_idx], self.msg_sig_start[msg_idx + 1])
+
+
+def _mux_order(signals):
+    """Order signals so every multiplexer precedes the signals it selects"""
+    by_name = {s["name"]: s for s in signals}
+
+    def depth(signal):
+        level = 0
+        seen = set()
+        while signal["multiplexer"] in by_name and signal["name"] not in seen:
+            seen.add(signal["name"])
+            signal = by_name[signal["multiplexer"]]
+            level += 1
+        return level
+
+    return sorted(signals, key=depth)
+
+
+def compile_dbc(dbc_path):
+    """Parse and compile a DBC file"""
+    return CompiledDatabase.from_messages(parse_dbc(dbc_path))
+
+
+def decode_frames(db, timestamps, can_ids, data_bytes, data_lengths=None, bus=None,
+                  reassembler=None):
+    """Decode arrays of CAN frames in one batched pass.
+
+    `data_bytes` is an (n, width) uint8 array as found in
+    CAN_DataFrame.DataBytes. Frames of messages the DBC marks as ISO-TP are
+    reassembled first; pass a persistent `reassembler` when decoding a log
+    in chunks. Returns {signal_name: (timestamps, values)}.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    can_ids = np.asarray(can_ids).astype(np.uint32, copy=False) & np.uint32(CAN_ID_MASK)
+    data_bytes = np.asarray(data_bytes, dtype=np.uint8)
+    if data_bytes.ndim == 1:
+        data_bytes = data_bytes.reshape(len(can_ids), -1)
+    if data_lengths is not None:
+        data_lengths = np.asarray(data_lengths)
+
+    decoded = {}
+    isotp_ids = db.msg_ids[db.msg_isotp]
+    if len(isotp_ids):
+        isotp = np.isin(can_ids, isotp_ids)
+        if isotp.any():
+            if reassembler is None:
+                reassembler = IsoTpReassembler()
+            times, ids, _, payloads, lengths = reassembler.feed(
+                timestamps[isotp],
+                can_ids[isotp],
+                data_bytes[isotp],
+                None if data_lengths is None else data_lengths[isotp],
+                None if bus is None else np.asarray(bus)[isotp],
+            )
+            _decode_grouped(db, times, ids, payloads, lengths, decoded)
+            plain = np.flatnonzero(~isotp)
+            timestamps, can_ids, data_bytes = timestamps[plain], can_ids[plain], data_bytes[plain]
+            if data_lengths is not None:
+                data_lengths = data_lengths[plain]
+
+    _decode_grouped(db, timestamps, can_ids, data_bytes, data_lengths, decoded)
+    return decoded
+
+
+def _decode_grouped(db, timestamps, can_ids, data_bytes, data_lengths, decoded):
+    """Group frames by CAN ID and decode each message's payloads at once"""
+    rows = np.flatnonzero(np.isin(can_ids, db.msg_ids))
+    if not len(rows):
+        return
+    rows = rows[np.argsort(can_ids[rows], kind="stable")]
+    frame_ids, first = np.unique(can_ids[rows], return_index=True)
+    bounds = np.append(first, len(rows))
+
+    for k, frame_id in enumerate(frame_ids):
+        group = rows[bounds[k]:bounds[k + 1]]
+        decode_message(
+            db,
+            db.message_index[int(frame_id)],
+            timestamps[group],
+            data_bytes[group],
+            None if data_lengths is None else data_lengths[group],
+            decoded,
+        )
+
+
+def decode_message(db, msg_idx, timestamps, payloads, lengths=None, decoded=None):
+    """Decode all payloads of a single message into `decoded`"""
+    if decoded is None:
+        decoded = {}
+    count, width = payloads.shape
+    signals = db.message_signals(msg_idx)
+    if not count or not len(signals):
+        return decoded
+
+    # Every signal reads a full 8-byte window, so pad short payloads
+    needed = int(db.sig_byte[signals.start:signals.stop].max()) + 8
+    if width >= needed:
+        padded = np.ascontiguousarray(payloads)
+    else:
+        padded = np.zeros((count, needed), dtype=np.uint8)
+        padded[:, :width] = payloads
+
+    # A selection is the subset of rows a multiplexer value picks out; all
+    # signals that share a selection reuse its rows, windows and timestamps
+    root = _Selection(padded, timestamps, lengths)
+    selections = {}
+    mux_raw = {}
+    for s in signals:
+        parent = db.sig_parent[s]
+        if parent < 0:
+            selection = root
+        else:
+            low = db.mux_low[db.sig_mux_start[s]:db.sig_mux_start[s + 1]]
+            high = db.mux_high[db.sig_mux_start[s]:db.sig_mux_start[s + 1]]
+            key = (int(parent), tuple(low), tuple(high))
+            selection = selections.get(key)
+            if selection is None:
+                if parent not in mux_raw:
+                    continue
+                parent_selection, parent_raw = mux_raw[parent]
+                selected = np.zeros(len(parent_raw), dtype=bool)
+                for lo, hi in zip(low, high):
+                    selected |= (parent_raw >= lo) & (parent_raw <= hi)
+                selection = parent_selection.subset(np.flatnonzero(selected))
+                selections[key] = selection
+        if not selection.count:
+            continue
+
+        raw = (selection.window(int(db.sig_byte[s]), bool(db.sig_big_endian[s]))
+               >> db.sig_shift[s]) & db.sig_mask[s]
+        if db.sig_is_mux[s]:
+            mux_raw[s] = (selection, raw.astype(np.int64))
+        if db.sig_ignored[s]:
+            continue
+
+        times = selection.timestamps
+        if selection.lengths is not None:
+            valid = selection.lengths > db.sig_last_byte[s]
+            if not valid.all():
+                raw, times = raw[valid], times[valid]
+        if len(raw):
+            _emit(decoded, db.sig_names[s], times, _physical(db, s, raw))
+    return decoded
+
+
+class _Selection:
+    """Rows of a message picked out by a multiplexer value"""
+
+    def __init__(self, padded, timestamps, lengths):
+        self.padded = padded
+        self.timestamps = timestamps
+        self.lengths = lengths
+        self.count = len(timestamps)
+        self.windows = {}
+
+    def subset(self, index):
+        return _Selection(
+            self.padded[index],
+            self.timestamps[index],
+            None if self.lengths is None else self.lengths[index],
+        )
+
+    def window(self, first_byte, big_endian):
+        """An unaligned uint64 view of 8 bytes per row, without copying"""
+        key = (first_byte, big_endian)
+        window = self.windows.get(key)
+        if window is None:
+            window = np.ndarray(
+                (self.count,),
+                dtype=">u8" if big_endian else "<u8",
+                buffer=self.padded,
+                offset=first_byte,
+                strides=(self.padded.strides[0],),
+            )
+            self.windows[key] = window
+        return window
+
+
+def _physical(db, s, raw):
+    """Convert raw unsigned integers to physical values"""
+    value_type = db.sig_value_type[s]
+    if value_type == VALUE_FLOAT32:
+        values = raw.astype(np.uint32).view(np.float32).astype(np.float64)
+    elif value_type == VALUE_FLOAT64:
+        values = raw.view(np.float64)
+    elif db.sig_signed[s]:
+        length = int(db.sig_length[s])
+        if length == 64:
+            values = raw.view(np.int64)
+        else:
+            sign = np.int64(1 << (length - 1))
+            values = (raw.astype(np.int64) ^ sign) - sign
+    else:
+        values = raw
+
+    scale, offset = db.sig_scale[s], db.sig_offset[s]
+    if scale == 1.0 and offset == 0.0:
+        return values.astype(np.float64)
+    return values * scale + offset
+
+
+def _emit(decoded, name, times, values):
+    """Store a decoded signal, merging in time order if the name repeats"""
+    if name in decoded:
+        prev_times, prev_values = decoded[name]
+        times = np.concatenate([prev_times, times])
+        values = np.concatenate([prev_values, values])
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+    decoded[name] = (times, values)
+
+
+def to_dataframe(decoded):
+    """Build a wide DataFrame on the union of all timestamps.
+
+    Each signal repeats its previous value, like asammdf's to_dataframe.
+    """
+    import pandas as pd
+
+    if not decoded:
+        return pd.DataFrame()
+    index = np.unique(np.concatenate([times for times, _ in decoded.values()]))
+    columns = {}
+    for name, (times, values) in decoded.items():
+        position = np.searchsorted(times, index, side="right") - 1
+        columns[name] = values[np.clip(position, 0, len(values) - 1)]
+    df = pd.DataFrame(columns, index=index)
+    df.index.name = "timestamps"
+    return df
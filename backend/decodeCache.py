@@ -0,0 +1,210 @@
+"""Content-addressed cache of decode results.
+
+Entries are keyed by a hash of their inputs, e.g. (MF4 content hash, DBC
+content hash, decoder version), so an unchanged log is never decoded twice
+and a new DBC or decoder release misses naturally. Each entry is a
+directory under CACHE_DIR holding the decoded chunks as .npy arrays (or one
+Parquet table) plus meta.json, which is written last and marks the entry
+complete. The cache is capped at MAX_BYTES; entries are evicted least
+recently used first, using the mtime of meta.json as the last access time.
+
+Hit/miss counters are kept per process in stats-<pid>.json, so job workers
+and the web process add up to one set of totals in stats().
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get(
+    "DECODE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".decode_cache")
+)
+MAX_BYTES = int(os.environ.get("DECODE_CACHE_MAX_BYTES", 2 << 30))
+META_FILE = "meta.json"
+TABLE_FILE = "table.parquet"
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class EntryWriter:
+    """Collects the chunks of one entry in a scratch directory until commit()"""
+
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = dict(meta)
+        os.makedirs(cache.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(dir=cache.root, prefix=f".{key[:16]}-")
+        self.chunks = []
+
+    def add(self, decoded):
+        """Add one {signal_name: (times, values)} chunk"""
+        index = len(self.chunks)
+        names = sorted(decoded)
+        for position, name in enumerate(names):
+            times, values = decoded[name]
+            np.save(os.path.join(self.path, f"{index}-{position}-t.npy"), np.asarray(times))
+            np.save(os.path.join(self.path, f"{index}-{position}-v.npy"), np.asarray(values))
+        self.chunks.append(names)
+
+    def commit(self):
+        self.meta["chunks"] = self.chunks
+        _write_json(os.path.join(self.path, META_FILE), self.meta)
+        final_path = self.cache.entry_path(self.key)
+        shutil.rmtree(final_path, ignore_errors=True)
+        os.replace(self.path, final_path)
+        self.cache._evict()
+
+    def abort(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class DecodeCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            counts = {"hits": self.hits, "misses": self.misses}
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            _write_json(os.path.join(self.root, f"stats-{os.getpid()}.json"), counts)
+        except OSError as e:
+            log.warning("Could not write decode cache stats: %s", e)
+
+    def _meta(self, key):
+        """meta.json of a complete entry, marking it as just used; None on a miss"""
+        meta_path = os.path.join(self.entry_path(key), META_FILE)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+        self._count(True)
+        return meta
+
+    def get(self, key):
+        """(meta, iterator of decoded chunks) for a cached entry, or None"""
+        meta = self._meta(key)
+        if meta is None:
+            return None
+        path = self.entry_path(key)
+
+        def chunks():
+            for index, names in enumerate(meta["chunks"]):
+                yield {name: (np.load(os.path.join(path, f"{index}-{position}-t.npy"), mmap_mode="r"),
+                              np.load(os.path.join(path, f"{index}-{position}-v.npy"), mmap_mode="r"))
+                       for position, name in enumerate(names)}
+
+        return meta, chunks()
+
+    def writer(self, key, meta=None):
+        return EntryWriter(self, key, meta or {})
+
+    def get_table(self, key):
+        """A cached DataFrame, or None"""
+        meta = self._meta(key)
+        if meta is None:
+            return None
+        import pyarrow.parquet as pq
+        return pq.read_table(os.path.join(self.entry_path(key), TABLE_FILE)).to_pandas()
+
+    def put_table(self, key, df, meta=None):
+        """Cache a DataFrame as-is (no type narrowing) in one Parquet file"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = self.writer(key, meta)
+        try:
+            pq.write_table(pa.Table.from_pandas(df), os.path.join(writer.path, TABLE_FILE))
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def entries(self):
+        """[(last used, size in bytes, key)] of complete entries, oldest first"""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for key in os.listdir(self.root):
+            meta_path = os.path.join(self.root, key, META_FILE)
+            if key.startswith(".") or not os.path.exists(meta_path):
+                continue
+            try:
+                found.append((os.path.getmtime(meta_path), _directory_size(self.entry_path(key)), key))
+            except OSError:
+                continue
+        return sorted(found)
+
+    def _evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= size
+            log.info("Evicted decode cache entry %s (%d bytes)", key, size)
+
+    def stats(self):
+        """Hit/miss totals across processes plus entry count and size"""
+        hits = misses = 0
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if name.startswith("stats-") and name.endswith(".json"):
+                    try:
+                        with open(os.path.join(self.root, name)) as f:
+                            counts = json.load(f)
+                    except (OSError, ValueError):
+                        continue
+                    hits += counts.get("hits", 0)
+                    misses += counts.get("misses", 0)
+        entries = self.entries()
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
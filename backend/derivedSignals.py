@@ -0,0 +1,362 @@
+"""Derived signals computed from decoded ones on demand.
+
+A derived signal is an expression over stored signals (or other derived
+signals), e.g. "BatteryCurrent * BatteryDCVoltage / 1000". Nothing is
+computed at ingest. A read aligns the inputs on the union of their
+timestamps (sample and hold, see signalQuery) and evaluates the expression
+vectorized with numexpr (plain arithmetic) or NumPy (anything with
+functions).
+
+Nothing carries across a gap in the inputs longer than the tolerance, so
+the history splits into pieces, in practice one per log, that evaluate
+independently. A read only touches the pieces overlapping its window; a
+whole piece is memoized in its own cache, keyed by the expressions and the
+stored input segments it spans, so a new log leaves the other pieces'
+memos valid. Part of a piece not memoized yet is evaluated over the window
+plus the lookback its samples depend on.
+
+Expressions use + - * / ** % comparisons, numbers, signal names and:
+abs, sqrt, exp, log, where(cond, a, b), min/max/mean/spread(...) across
+signals (a quoted glob such as 'CellVoltage*' expands to all matching
+signals), integrate(x) (running integral over seconds, restarting after
+gaps longer than the tolerance) and derivative(x) (per second).
+"""
+import ast
+import bisect
+import fnmatch
+import warnings
+
+import numpy as np
+
+from signalQuery import DEFAULT_TOLERANCE, resample
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+DERIVED_VERSION = 2  # bump when evaluation changes results
+
+DEFINITIONS = {
+    "BatteryPower": {
+        "expression": "BatteryCurrent * BatteryDCVoltage / 1000",
+        "unit": "kW",
+        "categories": ["battery", "electrical"],
+    },
+    "BatteryEnergy": {
+        "expression": "integrate(BatteryPower) / 3600",
+        "unit": "kWh",
+        "categories": ["battery"],
+    },
+    "CellVoltageSpread": {
+        "expression": "spread('CellVoltage*')",
+        "unit": "V",
+        "categories": ["battery", "electrical"],
+    },
+    "BatteryTemperatureDelta": {
+        "expression": "BatteryMaxTemperature - BatteryMinTemperature",
+        "unit": "degC",
+        "categories": ["battery", "temperature"],
+    },
+}
+
+ELEMENTWISE = {"abs": np.abs, "sqrt": np.sqrt, "exp": np.exp, "log": np.log}
+ACROSS = {"min", "max", "mean", "spread"}
+FUNCTIONS = set(ELEMENTWISE) | ACROSS | {"where", "integrate", "derivative"}
+OPERATORS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.Pow: np.power, ast.Mod: np.mod,
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+
+
+def parse(expression):
+    """Parse and validate an expression; returns the AST"""
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression {expression!r}: {e.msg}")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ValueError(f"Unknown function in {expression!r}; use {', '.join(sorted(FUNCTIONS))}")
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float, str)) or isinstance(node.value, bool):
+                raise ValueError(f"Unsupported constant {node.value!r} in {expression!r}")
+        elif isinstance(node, (ast.BinOp, ast.Compare)):
+            ops = node.ops if isinstance(node, ast.Compare) else [node.op]
+            if any(type(op) not in OPERATORS for op in ops):
+                raise ValueError(f"Unsupported operator in {expression!r}")
+        elif not isinstance(node, (ast.Expression, ast.UnaryOp, ast.USub, ast.UAdd, ast.Name,
+                                   ast.Load, ast.operator, ast.cmpop)):
+            raise ValueError(f"Unsupported syntax {type(node).__name__} in {expression!r}")
+    return tree
+
+
+def _names(tree):
+    """(signal names, glob patterns) an expression refers to"""
+    names, patterns = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            patterns.update(arg.value for arg in node.args
+                            if isinstance(arg, ast.Constant) and isinstance(arg.value, str))
+        elif isinstance(node, ast.Name) and node.id not in FUNCTIONS:
+            names.add(node.id)
+    return names, patterns
+
+
+def _functions(tree):
+    """Names of the functions an expression calls"""
+    return {node.func.id for node in ast.walk(tree) if isinstance(node, ast.Call)}
+
+
+class DerivedSignals:
+    """Reads stored and derived signals alike (read / time_range, as SignalStore)"""
+
+    def __init__(self, signal_store, cache, definitions=None, tolerance=DEFAULT_TOLERANCE):
+        self.signal_store = signal_store
+        self.cache = cache
+        self.definitions = dict(DEFINITIONS if definitions is None else definitions)
+        self.tolerance = tolerance
+
+    def define(self, name, expression, unit="", categories=None):
+        parse(expression)
+        self.definitions[name] = {"expression": expression, "unit": unit,
+                                  "categories": categories or ["other"]}
+
+    def is_derived(self, name):
+        return name in self.definitions
+
+    def _inputs(self, vehicle, name, stored):
+        """Signal names a derived signal reads directly, globs expanded over stored signals"""
+        names, patterns = _names(parse(self.definitions[name]["expression"]))
+        for pattern in patterns:
+            names.update(fnmatch.filter(stored, pattern))
+        return sorted(names)
+
+    def available(self, vehicle):
+        """{derived name: definition} of the derived signals a vehicle has all inputs for"""
+        stored = self.signal_store.signals(vehicle)
+        result = {}
+        for name in self.definitions:
+            try:
+                self._dependencies(vehicle, name, stored)
+            except KeyError:
+                continue
+            result[name] = self.definitions[name]
+        return result
+
+    def _dependencies(self, vehicle, name, stored, seen=()):
+        """(stored signals, expressions) a derived signal depends on, transitively"""
+        if name in seen:
+            raise ValueError(f"Derived signal {name} depends on itself")
+        inputs = self._inputs(vehicle, name, stored)
+        if not inputs:
+            raise KeyError(name)
+        leaves, expressions = set(), [self.definitions[name]["expression"]]
+        for source in inputs:
+            if source in self.definitions:
+                source_leaves, source_expressions = self._dependencies(vehicle, source, stored, seen + (name,))
+                leaves |= source_leaves
+                expressions += source_expressions
+            elif source in stored:
+                leaves.add(source)
+            else:
+                raise KeyError(source)
+        return leaves, expressions
+
+    def _pieces(self, vehicle, name):
+        """[(start, end, memo key parts)] of the stretches of input data, in time order.
+
+        Stretches are separated by gaps longer than the tolerance; the key
+        parts list every stored input segment within the stretch.
+        """
+        stored = self.signal_store.signals(vehicle)
+        leaves, expressions = self._dependencies(vehicle, name, stored)
+        layouts = {leaf: self.signal_store.layout(vehicle, leaf) for leaf in sorted(leaves)}
+        gap = np.inf if self.tolerance is None else self.tolerance
+        spans = []
+        for start, end in sorted((s["start"], s["end"]) for _, segments in layouts.values() for s in segments):
+            if spans and start - spans[-1][1] <= gap:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([start, end])
+        starts = [start for start, _ in spans]
+        parts = [[DERIVED_VERSION, vehicle, name, self.tolerance, start, end, *expressions]
+                 for start, end in spans]
+        for leaf, (data_file, segments) in layouts.items():
+            for s in segments:
+                parts[bisect.bisect_right(starts, s["start"]) - 1].append(
+                    (leaf, data_file, s["offset"], s["count"], s["start"], s["end"]))
+        return [(start, end, piece_parts) for (start, end), piece_parts in zip(spans, parts)]
+
+    def _lookback(self, name):
+        """Seconds before a window that its first values can depend on"""
+        tree = parse(self.definitions[name]["expression"])
+        derivatives = sum(isinstance(node, ast.Call) and node.func.id == "derivative" for node in ast.walk(tree))
+        return np.inf if self.tolerance is None else self.tolerance * (1 + derivatives)
+
+    def _evaluate(self, vehicle, name, start, end, keep_from=None):
+        """(times, values) computed from the inputs in [start, end], from `keep_from` on"""
+        stored = self.signal_store.signals(vehicle)
+        tree = parse(self.definitions[name]["expression"])
+        data = {source: self.read(vehicle, source, start, end) for source in self._inputs(vehicle, name, stored)}
+        grid = np.unique(np.concatenate([np.asarray(t) for t, _ in data.values()]))
+        if not len(grid):
+            return grid, grid
+        aligned = {source: resample(t, v, grid, "previous", self.tolerance) for source, (t, v) in data.items()}
+        names, patterns = _names(tree)
+        if numexpr is not None and not patterns and not any(isinstance(n, ast.Call) for n in ast.walk(tree)):
+            values = numexpr.evaluate(self.definitions[name]["expression"],
+                                      local_dict={n: aligned[n] for n in names})
+        else:
+            values = _Evaluator(grid, aligned, self.tolerance).visit(tree.body)
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), grid.shape)
+        keep = np.isfinite(values)
+        if keep_from is not None:
+            keep &= grid >= keep_from
+        return grid[keep], values[keep]
+
+    def _piece(self, vehicle, name, piece, compute=True):
+        """(times, values) of a whole piece from its memo, computed and memoized if `compute`, else None"""
+        start, end, parts = piece
+        key = self.cache.key("derived", *parts)
+        cached = self.cache.get(key)
+        if cached is not None:
+            _, chunks = cached
+            return next(chunks)[name]
+        if not compute:
+            return None
+        times, values = self._evaluate(vehicle, name, start, end)
+        writer = self.cache.writer(key, {"vehicle": vehicle, "derived": name, "start": start, "end": end})
+        try:
+            writer.add({name: (times, values)})
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        return times, values
+
+    def read(self, vehicle, signal, start=None, end=None):
+        """(times, values) of a stored or derived signal with start <= t <= end"""
+        if signal not in self.definitions:
+            return self.signal_store.read(vehicle, signal, start, end)
+        try:
+            pieces = self._pieces(vehicle, signal)
+        except KeyError:
+            empty = np.zeros(0)
+            return empty, empty
+        # A running integral depends on everything since its piece began
+        whole_pieces = "integrate" in _functions(parse(self.definitions[signal]["expression"]))
+        found = []
+        for piece in pieces:
+            piece_start, piece_end, _ = piece
+            if (start is not None and piece_end < start) or (end is not None and piece_start > end):
+                continue
+            whole = (start is None or start <= piece_start) and (end is None or end >= piece_end)
+            result = self._piece(vehicle, signal, piece, compute=whole or whole_pieces)
+            if result is None:
+                lo = piece_start if start is None else max(start, piece_start)
+                hi = piece_end if end is None else min(end, piece_end)
+                result = self._evaluate(vehicle, signal, lo - self._lookback(signal), hi, keep_from=lo)
+            times, values = result
+            lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+            hi = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+            found.append((times[lo:hi], values[lo:hi]))
+        if not found:
+            empty = np.zeros(0)
+            return empty, empty
+        if len(found) == 1:
+            return found[0]
+        return np.concatenate([t for t, _ in found]), np.concatenate([v for _, v in found])
+
+    def time_range(self, vehicle, signal):
+        if signal not in self.definitions:
+            return self.signal_store.time_range(vehicle, signal)
+        try:
+            pieces = self._pieces(vehicle, signal)
+        except KeyError:
+            return None
+        first = next((times[0] for times, _ in (self._piece(vehicle, signal, piece) for piece in pieces)
+                      if len(times)), None)
+        if first is None:
+            return None
+        last = next(times[-1] for times, _ in (self._piece(vehicle, signal, piece) for piece in reversed(pieces))
+                    if len(times))
+        return float(first), float(last)
+
+
+class _Evaluator(ast.NodeVisitor):
+    """Evaluates a validated expression over aligned arrays"""
+
+    def __init__(self, grid, aligned, tolerance):
+        self.grid = grid
+        self.aligned = aligned
+        self.tolerance = tolerance
+
+    def visit_Name(self, node):
+        return self.aligned[node.id]
+
+    def visit_Constant(self, node):
+        return node.value
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        return -operand if isinstance(node.op, ast.USub) else operand
+
+    def visit_BinOp(self, node):
+        return OPERATORS[type(node.op)](self.visit(node.left), self.visit(node.right))
+
+    def visit_Compare(self, node):
+        left = self.visit(node.left)
+        result = True
+        for op, comparator in zip(node.ops, node.comparators):
+            right = self.visit(comparator)
+            result = np.logical_and(result, OPERATORS[type(op)](left, right))
+            left = right
+        return result
+
+    def _arrays(self, args):
+        arrays = []
+        for arg in args:
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                arrays.extend(self.aligned[n] for n in sorted(fnmatch.filter(self.aligned, arg.value)))
+            else:
+                arrays.append(np.broadcast_to(self.visit(arg), self.grid.shape))
+        if not arrays:
+            raise ValueError("No signals match")
+        return np.vstack(arrays)
+
+    def visit_Call(self, node):
+        function = node.func.id
+        if function in ELEMENTWISE:
+            return ELEMENTWISE[function](self.visit(node.args[0]))
+        if function == "where":
+            condition, a, b = (self.visit(arg) for arg in node.args)
+            return np.where(condition, a, b)
+        if function in ACROSS:
+            stacked = self._arrays(node.args)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns
+                if function == "min":
+                    return np.nanmin(stacked, axis=0)
+                if function == "max":
+                    return np.nanmax(stacked, axis=0)
+                if function == "mean":
+                    return np.nanmean(stacked, axis=0)
+                return np.nanmax(stacked, axis=0) - np.nanmin(stacked, axis=0)
+        values = np.broadcast_to(np.asarray(self.visit(node.args[0]), dtype=np.float64), self.grid.shape)
+        steps = np.diff(self.grid)
+        if function == "derivative":
+            rates = np.diff(values) / steps
+            rates[steps > self.tolerance] = np.nan
+            return np.r_[np.nan, rates]
+        # integrate: trapezoids skipping NaN samples, restarting after gaps (between logs)
+        areas = (values[1:] + values[:-1]) / 2 * steps
+        gaps = steps > self.tolerance
+        areas[gaps | ~np.isfinite(areas)] = 0.0
+        totals = np.r_[0.0, np.cumsum(areas)]
+        restart = np.maximum.accumulate(np.where(np.r_[True, gaps], np.arange(len(totals)), 0))
+        return totals - totals[restart]
+
@@ -0,0 +1,129 @@
+"""Chart-ready downsampling that keeps the visual extremes of a series.
+
+- M4 keeps the first, last, minimum and maximum sample of every pixel
+  column, so spikes survive whatever the zoom level.
+- LTTB (Largest-Triangle-Three-Buckets) keeps the sample of each bucket
+  that forms the largest triangle with its neighbours.
+
+Both take time-sorted NumPy arrays and return (times, values).
+"""
+import numpy as np
+
+MODES = ("lttb", "m4")
+
+
+def _finite(times, values):
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.isfinite(values)
+    if not keep.all():
+        times, values = times[keep], values[keep]
+    return times, values
+
+
+def m4_indices(times, values, width, start=None, end=None):
+    """Indices of the first/last/min/max sample of each of `width` pixel columns"""
+    count = len(times)
+    if count <= 4 * width:
+        return np.arange(count)
+    start = times[0] if start is None else start
+    end = times[-1] if end is None else end
+    span = end - start
+    if span <= 0:
+        return np.array([0, count - 1])
+
+    pixel = ((times - start) * (width / span)).astype(np.int64)
+    np.clip(pixel, 0, width - 1, out=pixel)
+    first = np.flatnonzero(np.r_[True, pixel[1:] != pixel[:-1]])
+    last = np.r_[first[1:] - 1, count - 1]
+    bucket = np.repeat(np.arange(len(first)), np.diff(np.r_[first, count]))
+
+    # First index in each bucket that reaches the bucket's min / max
+    minima = np.minimum.reduceat(values, first)
+    maxima = np.maximum.reduceat(values, first)
+    at_min = np.flatnonzero(values == minima[bucket])
+    at_max = np.flatnonzero(values == maxima[bucket])
+    min_index = at_min[np.r_[True, bucket[at_min][1:] != bucket[at_min][:-1]]]
+    max_index = at_max[np.r_[True, bucket[at_max][1:] != bucket[at_max][:-1]]]
+    return np.unique(np.concatenate([first, last, min_index, max_index]))
+
+
+def m4(times, values, width, start=None, end=None):
+    times, values = _finite(times, values)
+    index = m4_indices(times, values, width, start, end)
+    return times[index], values[index]
+
+
+def lttb_indices(times, values, points):
+    """Indices chosen by Largest-Triangle-Three-Buckets"""
+    count = len(times)
+    if points >= count or points < 3:
+        return np.arange(count)
+
+    # Buckets between the fixed first and last points
+    edges = np.linspace(1, count - 1, points - 1).astype(np.int64)
+    starts, stops = edges[:-1], edges[1:]
+    sizes = stops - starts
+    mean_t = np.add.reduceat(times[:-1], starts) / sizes
+    mean_v = np.add.reduceat(values[:-1], starts) / sizes
+    # The third triangle vertex is the mean of the next bucket (the last point for the final one)
+    next_t = np.r_[mean_t[1:], times[-1]]
+    next_v = np.r_[mean_v[1:], values[-1]]
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for k in range(len(starts)):
+        lo, hi = starts[k], stops[k]
+        pt, pv = times[previous], values[previous]
+        area = np.abs((pt - next_t[k]) * (values[lo:hi] - pv) - (pt - times[lo:hi]) * (next_v[k] - pv))
+        previous = lo + int(np.argmax(area))
+        selected[k + 1] = previous
+    return selected
+
+
+def lttb(times, values, points):
+    times, values = _finite(times, values)
+    index = lttb_indices(times, values, points)
+    return times[index], values[index]
+
+
+def downsample(times, values, mode="m4", points=None, width=None):
+    """Downsample to `points` samples (LTTB) or `width` pixel columns (M4).
+
+    Either size may be given for either mode: M4 uses points // 4 columns
+    and LTTB picks 4 * width points when only the other one is known.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown downsampling mode: {mode}")
+    if mode == "m4":
+        width = width or max((points or 0) // 4, 1)
+        return m4(times, values, width)
+    points = points or 4 * (width or 0)
+    return lttb(times, values, points)
+
+
+def downsample_rows(df, columns, time_column, mode="m4", points=None, width=None):
+    """Row indices of a wide DataFrame that keep every column's extremes.
+
+    Each column is downsampled on its own and the selected rows are merged,
+    so a single table can still be written out. The `points` (or 4 * `width`)
+    budget is split across the columns, so the merged rows stay within it
+    (at least 4 rows per column are kept).
+    """
+    times = df[time_column].to_numpy(dtype=np.float64)
+    columns = [column for column in columns if column != time_column]
+    budget = points or 4 * (width or 0)
+    per_column = max(budget // max(len(columns), 1), 4)
+    selected = []
+    for column in columns:
+        values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        rows = np.flatnonzero(np.isfinite(values))
+        if mode == "m4":
+            index = m4_indices(times[rows], values[rows], per_column // 4)
+        else:
+            index = lttb_indices(times[rows], values[rows], per_column)
+        selected.append(rows[index])
+    if not selected:
+        return np.arange(len(df))
+    return np.unique(np.concatenate(selected))
@@ -0,0 +1,317 @@
+"""Fleet-wide ingest: a shared task queue drained by worker processes.
+
+`scan` lists every registered vehicle's log folders and queues one task per
+new or grown MF4 file. Workers claim tasks from the queue, ingest the file
+incrementally (see incrementalIngest) and record per-vehicle throughput.
+A task's path is the file's path as the registry names it (log folder /
+file name, relative to the backend directory unless the folder is
+absolute). It is also the file's key in the vehicle's manifest, so loggers
+that number the files of every folder from 1 do not overwrite each other.
+Scheduling is fair and sharded by vehicle:
+
+- a vehicle has at most one running task, so fleet workers never wait on
+  each other for a vehicle's writer lock (see signalStore), which ingest
+  jobs of the web app take as well;
+- a worker always takes the next file of the vehicle that was served least
+  recently, so a vehicle with a backlog of thousands of files gets one
+  worker's turn per round and never starves the others.
+
+FleetQueue keeps the queue in SQLite. Workers on several nodes can share
+it (and the signal store) on a network filesystem; another backend only
+has to provide the same put / claim / renew / complete / fail / stats
+methods. Claims are leases: if a worker dies, its task is claimed again
+once the lease runs out, and a worker that lost its lease can no longer
+complete or fail the task.
+
+Usage:
+    python fleetIngest.py scan                 # queue new files of every vehicle
+    python fleetIngest.py run [--workers N]    # scan, then drain with a local pool
+    python fleetIngest.py worker               # drain (one per node or core)
+    python fleetIngest.py stats
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dbcCache import load_database
+from incrementalIngest import adopt_entry, ingest_pending, manifest_path, pending_files
+from ingestManifest import UNCHANGED, Manifest
+from instrumentation import configure_logging
+from rollups import RollupStore
+from signalStore import SignalStore
+from vehicleRegistry import dbc_path, load_registry, resolve
+
+log = logging.getLogger(__name__)
+
+QUEUE_PATH = os.environ.get(
+    "FLEET_QUEUE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fleet_queue.sqlite")
+)
+LEASE_SECONDS = 600  # renewed every third of this while a task runs
+MAX_ATTEMPTS = 3
+IDLE_SECONDS = 1.0  # wait before polling again when every queued vehicle is busy
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    vehicle TEXT NOT NULL,
+    path TEXT NOT NULL,
+    dbc_path TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    queued REAL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tasks_active ON tasks (vehicle, path)
+    WHERE state IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, vehicle, id);
+CREATE TABLE IF NOT EXISTS vehicles (
+    vehicle TEXT PRIMARY KEY,
+    last_claimed REAL NOT NULL DEFAULT 0,
+    files INTEGER NOT NULL DEFAULT 0,
+    samples INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    seconds REAL NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class FleetQueue:
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()  # the lease renewal thread shares the connection
+        if not path.startswith(":"):
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def _transaction(self, statements):
+        """Run `statements(db)` in a write transaction; returns its result"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def put(self, vehicle, path, dbc_path, size=0):
+        """Queue a file; returns False if it is already queued or running"""
+        def insert(db):
+            db.execute("INSERT OR IGNORE INTO vehicles (vehicle) VALUES (?)", (vehicle,))
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO tasks (vehicle, path, dbc_path, size, state, queued) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (vehicle, path, dbc_path, size, QUEUED, time.time()))
+            return cursor.rowcount == 1
+        return self._transaction(insert)
+
+    def claim(self, worker):
+        """Lease the next file of the least recently served idle vehicle; None if there is none"""
+        def claim_next(db):
+            now = time.time()
+            # Leases of dead workers: retry, unless the task has been tried often enough
+            db.execute("UPDATE tasks SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, worker = NULL, "
+                       "error = 'lease expired' WHERE state = ? AND lease_until < ?",
+                       (MAX_ATTEMPTS, QUEUED, FAILED, RUNNING, now))
+            row = db.execute(
+                "SELECT t.* FROM tasks t JOIN vehicles v ON v.vehicle = t.vehicle "
+                "WHERE t.state = ? AND NOT EXISTS "
+                "(SELECT 1 FROM tasks r WHERE r.vehicle = t.vehicle AND r.state = ?) "
+                "ORDER BY v.last_claimed, t.id LIMIT 1", (QUEUED, RUNNING)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE tasks SET state = ?, worker = ?, attempts = attempts + 1, "
+                       "lease_until = ?, started = ? WHERE id = ?",
+                       (RUNNING, worker, now + LEASE_SECONDS, now, row["id"]))
+            db.execute("UPDATE vehicles SET last_claimed = ? WHERE vehicle = ?", (now, row["vehicle"]))
+            return dict(row, state=RUNNING, worker=worker)
+        return self._transaction(claim_next)
+
+    def renew(self, task_id, worker):
+        self._transaction(lambda db: db.execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND state = ?",
+            (time.time() + LEASE_SECONDS, task_id, worker, RUNNING)))
+
+    def complete(self, task, samples, seconds):
+        """Record a finished task; returns False if the worker no longer holds its lease"""
+        def finish(db):
+            cursor = db.execute("UPDATE tasks SET state = ?, finished = ?, error = NULL "
+                                "WHERE id = ? AND worker = ? AND state = ?",
+                                (DONE, time.time(), task["id"], task["worker"], RUNNING))
+            if cursor.rowcount == 0:
+                return False
+            db.execute("UPDATE vehicles SET files = files + 1, samples = samples + ?, "
+                       "bytes = bytes + ?, seconds = seconds + ? WHERE vehicle = ?",
+                       (samples, task["size"], seconds, task["vehicle"]))
+            return True
+        return self._transaction(finish)
+
+    def fail(self, task, error, seconds=0.0):
+        """Record a failed attempt; the task is queued again until MAX_ATTEMPTS.
+
+        Returns False if the worker no longer holds the task's lease.
+        """
+        def record(db):
+            row = db.execute("SELECT attempts FROM tasks WHERE id = ? AND worker = ? AND state = ?",
+                             (task["id"], task["worker"], RUNNING)).fetchone()
+            if row is None:
+                return False
+            state = FAILED if row[0] >= MAX_ATTEMPTS else QUEUED
+            db.execute("UPDATE tasks SET state = ?, worker = NULL, finished = ?, error = ? WHERE id = ?",
+                       (state, time.time(), str(error), task["id"]))
+            db.execute("UPDATE vehicles SET failures = failures + 1, seconds = seconds + ? WHERE vehicle = ?",
+                       (seconds, task["vehicle"]))
+            return True
+        return self._transaction(record)
+
+    def pending(self):
+        """Number of queued or running tasks"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)",
+                                    (QUEUED, RUNNING)).fetchone()[0]
+
+    def stats(self):
+        """{vehicle: files, samples, bytes, seconds, failures, queued, running, samples/s, MB/s}"""
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM vehicles ORDER BY vehicle").fetchall()
+            counts = self._db.execute("SELECT vehicle, state, COUNT(*) FROM tasks "
+                                      "WHERE state IN (?, ?) GROUP BY vehicle, state",
+                                      (QUEUED, RUNNING)).fetchall()
+        result = {}
+        for row in rows:
+            stats = {key: row[key] for key in ("files", "samples", "bytes", "seconds", "failures")}
+            stats.update(queued=0, running=0,
+                         samples_per_second=row["samples"] / row["seconds"] if row["seconds"] else 0.0,
+                         megabytes_per_second=row["bytes"] / 1e6 / row["seconds"] if row["seconds"] else 0.0)
+            result[row["vehicle"]] = stats
+        for vehicle, state, count in counts:
+            result[vehicle][state] = count
+        return result
+
+    def close(self):
+        self._db.close()
+
+
+def scan(queue, vehicles):
+    """Queue every new or grown MF4 file of the registered vehicles; returns the number queued"""
+    signal_store = SignalStore()
+    queued = 0
+    for vehicle_id, info in vehicles.items():
+        manifest = Manifest(manifest_path(signal_store, vehicle_id))
+        for folder in info["log_folders"]:
+            if not os.path.isdir(resolve(folder)):
+                log.warning("%s: log folder %s does not exist", vehicle_id, resolve(folder))
+                continue
+            for name, path, _ in pending_files(resolve(folder), manifest, prefix=folder):
+                queued += queue.put(vehicle_id, name, dbc_path(info), os.path.getsize(path))
+    log.info("Queued %d files", queued)
+    return queued
+
+
+def _renew_lease(queue, task, worker, stop):
+    while not stop.wait(LEASE_SECONDS / 3):
+        queue.renew(task["id"], worker)
+
+
+def ingest_task(task, signal_store, rollup_store):
+    """Ingest a claimed file; returns the number of new samples (0 when it is unchanged by now)"""
+    manifest = Manifest(manifest_path(signal_store, task["vehicle"]))
+    name, path = task["path"], resolve(task["path"])
+    adopt_entry(manifest, name, path)
+    status = manifest.status(name, path)
+    if status == UNCHANGED:
+        return 0
+    summary = ingest_pending(name, path, status, task["vehicle"], load_database(task["dbc_path"]),
+                             signal_store, rollup_store, manifest)
+    if summary is None:
+        raise RuntimeError(f"{name} could not be read")
+    return summary["samples"]
+
+
+def work(queue_path=QUEUE_PATH, worker=None, until_empty=True):
+    """Claim and ingest tasks until the queue is empty (or forever); returns the files ingested"""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    queue = FleetQueue(queue_path)
+    signal_store = SignalStore()
+    rollup_store = RollupStore(signal_store)
+    files = 0
+    try:
+        while True:
+            task = queue.claim(worker)
+            if task is None:
+                if until_empty and not queue.pending():
+                    return files
+                time.sleep(IDLE_SECONDS)
+                continue
+            stop = threading.Event()
+            threading.Thread(target=_renew_lease, args=(queue, task, worker, stop), daemon=True).start()
+            began = time.perf_counter()
+            try:
+                samples = ingest_task(task, signal_store, rollup_store)
+            except Exception as e:
+                log.warning("%s: %s failed: %s", task["vehicle"], task["path"], e)
+                if not queue.fail(task, e, time.perf_counter() - began):
+                    log.warning("%s: lost the lease on %s", task["vehicle"], task["path"])
+            else:
+                if queue.complete(task, samples, time.perf_counter() - began):
+                    files += 1
+                else:
+                    log.warning("%s: lost the lease on %s; not counted", task["vehicle"], task["path"])
+            finally:
+                stop.set()
+    finally:
+        queue.close()
+
+
+def fleet_job(report, queue_path=QUEUE_PATH):
+    """JobQueue target: drain the fleet queue in an ingest job worker"""
+    return {"files": work(queue_path)}
+
+
+def run_local(queue_path=QUEUE_PATH, workers=None):
+    """Drain the queue with a pool of local worker processes; returns the files ingested"""
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(work, [queue_path] * workers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the MF4 logs of every registered vehicle")
+    parser.add_argument("command", choices=["scan", "run", "worker", "stats"])
+    parser.add_argument("--queue", default=QUEUE_PATH, help="SQLite queue shared by all workers")
+    parser.add_argument("--workers", type=int, default=None, help="Local worker processes (default: CPUs)")
+    parser.add_argument("--forever", action="store_true", help="Workers keep polling when the queue is empty")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.command in ("scan", "run"):
+        fleet_queue = FleetQueue(args.queue)
+        scan(fleet_queue, load_registry())
+        fleet_queue.close()
+    if args.command == "run":
+        began = time.perf_counter()
+        files = run_local(args.queue, args.workers)
+        log.info("Ingested %d files in %.1f s", files, time.perf_counter() - began)
+    elif args.command == "worker":
+        work(args.queue, until_empty=not args.forever)
+    if args.command in ("run", "stats"):
+        print(json.dumps(FleetQueue(args.queue).stats(), indent=1))
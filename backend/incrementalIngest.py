@@ -0,0 +1,217 @@
+"""Incremental ingest of a folder of MF4 logs into the signal store.
+
+Each run compares the folder with a per-vehicle manifest and decodes only
+new files, or only the records appended to files that have grown since the
+last run, appending the results to the signal store and its rollups. With
+--watch it polls the folder and does this continuously, so the work per
+run is proportional to the new data rather than to the whole backlog.
+
+Usage: python incrementalIngest.py --input mf42csv/input --vehicle ioniq5 \
+           --dbc mf42csv/dbc_files/can1-hyundai-kia-uds-v2.4.dbc [--watch]
+"""
+import argparse
+import logging
+import os
+import time
+
+from canIndex import groups_for_ids, load_index
+from dbcCache import load_database
+from ingestManifest import CHANGED, GROWN, UNCHANGED, Manifest
+from instrumentation import configure_logging, stage
+from mf4Stream import iter_can_chunks, iter_decoded
+from rollups import RollupStore
+from segmentIndex import SegmentIndex
+from signalStore import SignalStore, _check_name
+
+log = logging.getLogger(__name__)
+
+POLL_SECONDS = 30
+
+
+def manifest_path(signal_store, vehicle):
+    return os.path.join(signal_store.root, _check_name(vehicle), "manifest.json")
+
+
+def remove_file_range(vehicle, entry, signal_store, rollup_store):
+    """Delete the samples a manifest entry's file stored, and their rollups; returns the range or None"""
+    start = entry.get("start", entry.get("first_timestamp"))
+    end = entry.get("end", entry.get("last_timestamp"))
+    if start is None or end is None:
+        return None
+    with stage("store"):
+        for signal in signal_store.remove(vehicle, start, end):
+            rollup_store.update(vehicle, signal, start, end)
+    return start, end
+
+
+def ingest_file(mf4_path, vehicle, database, signal_store, rollup_store, previous=None,
+                resume=False, checkpoint=None):
+    """Decode an MF4 file, or only its records after those of a `previous` run, and store them.
+
+    `previous` is the file's manifest entry. With `resume` decoding carries
+    on after its records, as long as the log start time still matches;
+    otherwise the samples it stored are deleted first and the file is
+    decoded from the start. `checkpoint(details)` is called before each
+    chunk is stored (with its time range included) and after it (with the
+    records to resume from), so an interrupted run is resumed or replaced
+    rather than stored twice. Returns the manifest details: log start,
+    records per group, first and last timestamp touched by this run, the
+    time range of everything stored from the file and the number of new
+    samples.
+    ISO-TP responses split across the previous run's last record are not recovered.
+    """
+    from asammdf import MDF  # heavy; fleetIngest and the web app import this module
+    checkpoint = checkpoint or (lambda details: None)
+    with stage("mf4_open"):
+        mdf = MDF(mf4_path)
+    try:
+        log_start = mdf.header.start_time.timestamp()
+        details = {"log_start": log_start, "records": {}, "first_timestamp": None,
+                   "last_timestamp": None, "start": None, "end": None, "samples": 0}
+        if previous and resume and previous.get("log_start") == log_start:
+            details.update(records=dict(previous.get("records", {})),
+                           start=previous.get("start"), end=previous.get("end"))
+        elif previous:
+            log.info("%s is a different log now; replacing its samples", os.path.basename(mf4_path))
+            removed = remove_file_range(vehicle, previous, signal_store, rollup_store)
+            if removed is not None:
+                details["first_timestamp"], details["last_timestamp"] = removed
+            checkpoint(details)
+
+        def touch(start, end):
+            for first, last in (("first_timestamp", "last_timestamp"), ("start", "end")):
+                details[first] = start if details[first] is None else min(details[first], start)
+                details[last] = end if details[last] is None else max(details[last], end)
+
+        relevant_groups = groups_for_ids(load_index(mdf, mf4_path), database.msg_ids)
+        for group in relevant_groups:
+            def position(record, group=str(group)):
+                details["records"][group] = record
+                checkpoint(details)
+
+            start = details["records"].get(str(group), 0)
+            chunks = iter_can_chunks(mdf, group, can_ids=database.msg_ids, start_record=start,
+                                     position=position)
+            for decoded in iter_decoded(database, chunks):
+                for times, _ in decoded.values():
+                    if len(times):
+                        details["samples"] += len(times)
+                        touch(float(times[0]) + log_start, float(times[-1]) + log_start)
+                checkpoint(details)
+                with stage("store"):
+                    signal_store.append_decoded(vehicle, decoded, time_offset=log_start)
+                    rollup_store.update_decoded(vehicle, decoded, time_offset=log_start)
+            details["records"][str(group)] = mdf.groups[group].channel_group.cycles_nr
+    finally:
+        mdf.close()
+    with stage("store"):
+        signal_store.compact(vehicle)  # merge chunks of several groups or an older log once
+    return details
+
+
+def pending_files(input_folder, manifest, prefix=None):
+    """(name, path, status) of the MF4 files in a folder that are new or changed since the last run.
+
+    Names are the manifest keys: the file name, or `prefix`/<file name>
+    when one manifest covers several folders whose loggers may reuse file
+    names (a CANedge numbers the files of every session from 00000001).
+    """
+    pending = []
+    for file_name in sorted(f for f in os.listdir(input_folder) if f.lower().endswith(".mf4")):
+        path = os.path.join(input_folder, file_name)
+        name = os.path.normpath(os.path.join(prefix, file_name)) if prefix else file_name
+        adopt_entry(manifest, name, path)
+        status = manifest.status(name, path)
+        if status != UNCHANGED:
+            pending.append((name, path, status))
+    return pending
+
+
+def adopt_entry(manifest, name, path):
+    """Move the entry of a file recorded under its bare file name before to `name`.
+
+    Only when that entry matches the file exactly: a file of the same name
+    in another folder, or one that changed since, is ingested as new.
+    """
+    file_name = os.path.basename(name)
+    if name == file_name or name in manifest.entries or file_name not in manifest.entries:
+        return
+    if manifest.status(file_name, path) == UNCHANGED:
+        manifest.entries[name] = manifest.entries.pop(file_name)
+
+
+def ingest_pending(name, path, status, vehicle, database, signal_store, rollup_store, manifest):
+    """Ingest one file found by pending_files and record it; returns a summary, or None if skipped"""
+    # One writer per vehicle, shared with ingest jobs of the web app
+    with signal_store.writer(vehicle):
+        try:
+            return _ingest_pending(name, path, status, vehicle, database, signal_store, rollup_store, manifest)
+        finally:
+            signal_store.touch(vehicle)  # the web app's cached responses are stale now
+
+
+def _ingest_pending(name, path, status, vehicle, database, signal_store, rollup_store, manifest):
+    entry = manifest.entries.get(name, {})
+    if status == CHANGED:
+        # Rewritten rather than appended to: the samples it stored are
+        # replaced by decoding it again from the start
+        log.info("%s was rewritten; decoding it again", name)
+    began = time.perf_counter()
+    try:
+        details = ingest_file(path, vehicle, database, signal_store, rollup_store, entry,
+                              resume=status == GROWN,
+                              checkpoint=lambda details: manifest.checkpoint(name, **details))
+    except Exception as e:  # e.g. a file still being written by the logger
+        log.warning("Skipping %s for now: %s", name, e)
+        return None
+    if details["last_timestamp"] is None:
+        details["last_timestamp"] = entry.get("last_timestamp")
+    manifest.update(name, path, **details)
+    if details["first_timestamp"] is not None:
+        with stage("segment"):
+            SegmentIndex(signal_store).update(vehicle, since=details["first_timestamp"])
+    summary = {"file": name, "status": status, "samples": details["samples"],
+               "seconds": time.perf_counter() - began}
+    log.info("%s: %s, %d new samples in %.1f s", name, status, summary["samples"], summary["seconds"])
+    return summary
+
+
+def ingest_folder(input_folder, vehicle, dbc_path, signal_store=None):
+    """Ingest whatever is new in `input_folder`; returns one summary dict per processed file"""
+    signal_store = signal_store or SignalStore()
+    rollup_store = RollupStore(signal_store)
+    manifest = Manifest(manifest_path(signal_store, vehicle))
+    database = load_database(dbc_path)
+    summaries = []
+    for name, path, status in pending_files(input_folder, manifest):
+        summary = ingest_pending(name, path, status, vehicle, database, signal_store, rollup_store, manifest)
+        if summary is not None:
+            summaries.append(summary)
+    return summaries
+
+
+def watch(input_folder, vehicle, dbc_path, interval=POLL_SECONDS, signal_store=None):
+    """Run ingest_folder every `interval` seconds until interrupted"""
+    log.info("Watching %s every %s s", input_folder, interval)
+    try:
+        while True:
+            ingest_folder(input_folder, vehicle, dbc_path, signal_store)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        log.info("Stopped watching")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingest MF4 logs into the signal store")
+    parser.add_argument("--input", required=True, help="Folder with MF4 files")
+    parser.add_argument("--vehicle", required=True, help="Vehicle ID to store the signals under")
+    parser.add_argument("--dbc", required=True, help="DBC file for CAN1")
+    parser.add_argument("--watch", action="store_true", help="Keep polling the folder for new data")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="Seconds between polls")
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.watch:
+        watch(args.input, args.vehicle, args.dbc, args.interval)
+    else:
+        ingest_folder(args.input, args.vehicle, args.dbc)
@@ -0,0 +1,167 @@
+"""Background ingest jobs.
+
+Jobs run in a bounded process pool so CPU-bound decoding never blocks a
+Flask worker. The job table lives in the web process; workers report
+progress through a multiprocessing queue that a daemon thread drains.
+Submitting a job whose key (e.g. vehicle, MF4 path, size and mtime) matches a
+queued or running job returns that job instead of starting another one.
+Jobs can also emit(topic, payload) events over the same queue; the drain
+thread hands them to the callbacks registered with JobQueue.on(topic).
+"""
+import datetime
+import logging
+import multiprocessing
+import threading
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+log = logging.getLogger(__name__)
+
+_progress_queue = None  # set in each worker process
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def in_worker():
+    return _progress_queue is not None
+
+
+def emit(topic, payload):
+    """Worker side: send an event to the web process (ignored outside a job worker)"""
+    if _progress_queue is not None:
+        _progress_queue.put((None, topic, payload, None))
+
+
+def _run_job(job_id, target, args, kwargs):
+    """Worker side: run `target(report, *args, **kwargs)` and report its progress"""
+    def report(progress, message=None):
+        _progress_queue.put((job_id, RUNNING, float(progress), message))
+
+    report(0.0)
+    return target(report, *args, **kwargs)
+
+
+class JobQueue:
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.jobs = {}  # job id -> job dict
+        self._active = {}  # dedupe key -> job id of a queued or running job
+        self._lock = threading.RLock()  # done callbacks may run inside submit
+        self._pool = None
+        self._progress_queue = None
+        self._listeners = {}  # event topic -> [callback(payload)]
+
+    def on(self, topic, callback):
+        """Call `callback(payload)` in the web process for every emit(topic, payload)"""
+        self._listeners.setdefault(topic, []).append(callback)
+
+    def _start(self):
+        if self._pool is not None:
+            return
+        context = multiprocessing.get_context()
+        self._progress_queue = context.Queue()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                         initializer=_init_worker,
+                                         initargs=(self._progress_queue,))
+        threading.Thread(target=self._drain_progress, daemon=True).start()
+
+    def _drain_progress(self):
+        while True:
+            job_id, state, progress, message = self._progress_queue.get()
+            if job_id is None:  # an emitted event: state is the topic, progress the payload
+                for callback in self._listeners.get(state, ()):
+                    try:
+                        callback(progress)
+                    except Exception as e:
+                        log.warning("Event listener for %s failed: %s", state, e)
+                continue
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None or job["state"] not in ACTIVE_STATES:
+                    continue
+                if job["state"] == QUEUED:
+                    job["started"] = _now()
+                job["state"] = state
+                job["progress"] = max(job["progress"], round(progress, 1))
+                if message:
+                    job["message"] = message
+
+    def submit(self, target, *args, key=None, description=None, **kwargs):
+        """Queue `target(report, *args, **kwargs)` in the pool.
+
+        `target` must be a picklable module-level function; `report(percent,
+        message=None)` updates the job's progress. Returns (job, created),
+        where created is False when an active job with the same key exists.
+        """
+        with self._lock:
+            if key is not None and key in self._active:
+                return dict(self.jobs[self._active[key]]), False
+            self._start()
+            job_id = uuid.uuid4().hex
+            job = {
+                "id": job_id,
+                "description": description,
+                "state": QUEUED,
+                "progress": 0.0,
+                "message": None,
+                "submitted": _now(),
+                "started": None,
+                "finished": None,
+                "result": None,
+                "error": None,
+            }
+            self.jobs[job_id] = job
+            if key is not None:
+                self._active[key] = job_id
+            future = self._pool.submit(_run_job, job_id, target, args, kwargs)
+            future.add_done_callback(lambda f: self._finish(job_id, key, f))
+            return dict(job), True
+
+    def _finish(self, job_id, key, future):
+        with self._lock:
+            job = self.jobs[job_id]
+            job["finished"] = _now()
+            job["started"] = job["started"] or job["finished"]
+            error = future.exception()
+            if error is None:
+                job["state"] = DONE
+                job["progress"] = 100.0
+                job["result"] = future.result()
+            else:
+                job["state"] = FAILED
+                job["error"] = str(error)
+                log.error("Job %s failed: %s", job_id,
+                          "".join(traceback.format_exception(type(error), error, error.__traceback__)))
+            if key is not None and self._active.get(key) == job_id:
+                del self._active[key]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def counts(self):
+        """{state: number of jobs}"""
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["state"]] = counts.get(job["state"], 0) + 1
+            return counts
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+
+def _now():
+    return datetime.datetime.now().isoformat()
@@ -0,0 +1,89 @@
+"""Manifest of processed log files for incremental ingest.
+
+For every input file the manifest records its size, mtime and SHA-256,
+plus whatever the ingest step stores (records decoded per group, last
+decoded timestamp, output name). Comparing a file against its entry tells
+whether it is new, unchanged, grown (larger than before) or rewritten.
+A logger appending to an MF4 also updates its header blocks, so growth is
+judged by size and the caller checks that the log itself is the same one.
+While a file is being ingested its entry is checkpointed without the file
+state; such a partial entry reads as grown, so the next run resumes it.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+NEW = "new"
+UNCHANGED = "unchanged"
+GROWN = "grown"
+CHANGED = "changed"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_state(path):
+    """Size, mtime and hash of a file as stored in a manifest entry"""
+    stat = os.stat(path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": _sha256(path),
+    }
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)["files"]
+        except FileNotFoundError:
+            self.entries = {}
+
+    def status(self, name, path):
+        """NEW, UNCHANGED, GROWN or CHANGED for a file compared with its entry"""
+        entry = self.entries.get(name)
+        if entry is None:
+            return NEW
+        if entry.get("partial"):
+            return GROWN  # interrupted: carry on after the checkpointed records
+        stat = os.stat(path)
+        if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+            return UNCHANGED
+        if stat.st_size == entry["size"] and _sha256(path) == entry["hash"]:
+            return UNCHANGED  # touched but identical
+        if stat.st_size > entry["size"]:
+            return GROWN
+        return CHANGED
+
+    def update(self, name, path, **info):
+        """Record the current state of a file plus ingest details, and save"""
+        entry = self.entries.get(name, {})
+        entry.update(file_state(path))
+        entry.update(info)
+        entry.pop("partial", None)
+        self.entries[name] = entry
+        self.save()
+        return entry
+
+    def checkpoint(self, name, **info):
+        """Record ingest details of a file still being ingested, and save"""
+        entry = self.entries.get(name, {})
+        entry.update(info, partial=True)
+        self.entries[name] = entry
+        self.save()
+        return entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"files": self.entries}, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,167 @@
+"""Counters, stage timers and profiling for the ingest pipeline.
+
+METRICS is a per-process registry of counters and gauges. Pipeline code
+wraps each stage in `with stage("decode"):` (adding to
+ev_ingest_stage_seconds_total{stage="decode"}) and counts frames, samples
+and bytes with METRICS.inc. Job workers ship their registry to the web
+process with the job's events (METRICS.drain / METRICS.merge), where
+/metrics renders everything in the Prometheus text format; frames/s and
+samples/s are rate() over the counters.
+
+Logging goes through the standard logging module; LOG_LEVEL (default
+INFO) sets the level, and debug calls with %-style arguments cost nothing
+when debug is off. capture_profile() records a cProfile (or, with
+kind="pyinstrument" and pyinstrument installed, an HTML) profile of a job.
+"""
+import contextlib
+import cProfile
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+)
+PROFILERS = ("cprofile", "pyinstrument")
+
+# name -> (type, help)
+METRIC_HELP = {
+    "ev_ingest_stage_seconds_total": ("counter", "Time spent per ingest stage"),
+    "ev_ingest_stage_runs_total": ("counter", "Executions of each ingest stage"),
+    "ev_ingest_records_read_total": ("counter", "MF4 CAN records read"),
+    "ev_ingest_bytes_read_total": ("counter", "Bytes of MF4 CAN records read"),
+    "ev_ingest_frames_total": ("counter", "CAN frames passed to the decoder"),
+    "ev_ingest_samples_total": ("counter", "Decoded signal samples"),
+    "ev_ingest_runs_total": ("counter", "Finished ingest runs"),
+    "ev_process_peak_rss_bytes": ("gauge", "Peak resident set size of a process"),
+}
+
+
+def configure_logging(level=None):
+    """Set up root logging once, from LOG_LEVEL unless `level` is given"""
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # kB on Linux
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_max(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = max(self.gauges.get(key, value), value)
+
+    def drain(self):
+        """Counters and gauges gathered since the last drain (resetting them)"""
+        with self._lock:
+            snapshot = {"counters": self.counters, "gauges": self.gauges}
+            self.counters, self.gauges = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, value in snapshot["gauges"].items():
+                self.gauges[key] = max(self.gauges.get(key, value), value)
+
+    def render(self, extra=()):
+        """Prometheus text format; `extra` adds (name, type, help, labels, value) samples"""
+        with self._lock:
+            samples = [(name, labels, value) for (name, labels), value in self.counters.items()]
+            samples += [(name, labels, value) for (name, labels), value in self.gauges.items()]
+        helps = dict(METRIC_HELP)
+        for name, kind, text, labels, value in extra:
+            helps.setdefault(name, (kind, text))
+            samples.append((name, tuple(sorted(labels.items())), value))
+        lines = []
+        for name in sorted({name for name, _, _ in samples}):
+            kind, text = helps.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for _, labels, value in sorted(s for s in samples if s[0] == name):
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a pipeline stage into ev_ingest_stage_seconds_total"""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.inc("ev_ingest_stage_seconds_total", time.perf_counter() - began, stage=name)
+        METRICS.inc("ev_ingest_stage_runs_total", stage=name)
+
+
+def timed_iter(iterable, name):
+    """Yield from `iterable`, timing the production of each item as stage `name`"""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+@contextlib.contextmanager
+def capture_profile(kind, label):
+    """Profile the body; yields the path the profile will be written to"""
+    if kind not in PROFILERS:
+        raise ValueError(f"profile must be one of {', '.join(PROFILERS)}")
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if kind == "pyinstrument":
+        from pyinstrument import Profiler
+        path = os.path.join(PROFILE_DIR, f"{label}-{stamp}-{os.getpid()}.html")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield path
+        finally:
+            profiler.stop()
+            with open(path, "w") as f:
+                f.write(profiler.output_html())
+        return
+    path = os.path.join(PROFILE_DIR, f"{label}-{stamp}-{os.getpid()}.prof")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,197 @@
+"""ISO-TP (ISO 15765-2) reassembly of multi-frame UDS responses.
+
+Frames are processed in batches. Within a batch every (bus, CAN ID) stream
+is split into segments that start at a single or first frame; consecutive
+frames are checked for their sequence number and scattered straight into a
+preallocated payload matrix, so no Python object is created per frame.
+Segments still incomplete at the end of a batch are carried over to the
+next one, which makes the reassembler a streaming state machine.
+"""
+import numpy as np
+
+SINGLE_FRAME = 0
+FIRST_FRAME = 1
+CONSECUTIVE_FRAME = 2
+FLOW_CONTROL = 3
+
+# ISO-TP allows 4095 bytes with a 12-bit length; longer escape lengths are dropped
+MAX_PAYLOAD = 4095
+
+
+class IsoTpReassembler:
+    """Streaming reassembler for all (bus, CAN ID) pairs of a log"""
+
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        self.max_payload = max_payload
+        self.pending = None  # frames of incomplete segments, carried to the next batch
+        self.stats = {"frames": 0, "messages": 0, "flow_control": 0, "dropped_segments": 0}
+
+    def feed(self, timestamps, can_ids, data_bytes, data_lengths=None, bus=None):
+        """Reassemble a time-ordered batch of frames.
+
+        Returns (timestamps, can_ids, bus, payloads, lengths) of the
+        complete messages, with payloads as an (n, width) uint8 matrix.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        can_ids = np.asarray(can_ids).astype(np.int64)
+        data_bytes = np.asarray(data_bytes, dtype=np.uint8)
+        count = len(timestamps)
+        if data_lengths is None:
+            data_lengths = np.full(count, data_bytes.shape[1], dtype=np.int64)
+        else:
+            data_lengths = np.minimum(np.asarray(data_lengths).astype(np.int64), data_bytes.shape[1])
+        bus = np.zeros(count, dtype=np.int64) if bus is None else np.asarray(bus).astype(np.int64)
+        self.stats["frames"] += count
+
+        pci = data_bytes[:, 0] >> 4 if count else np.zeros(0, dtype=np.uint8)
+        flow_control = pci == FLOW_CONTROL
+        self.stats["flow_control"] += int(flow_control.sum())
+        keep = ~flow_control & (data_lengths > 0)
+        frames = _Frames(timestamps[keep], can_ids[keep], bus[keep],
+                         data_bytes[keep], data_lengths[keep])
+        if self.pending is not None:
+            frames = self.pending.concat(frames)
+            self.pending = None
+        if not frames.count:
+            return _empty_result()
+        return self._reassemble(frames)
+
+    def _reassemble(self, frames):
+        # Group by stream, keeping time order within each stream
+        key = (frames.bus << 32) | frames.can_ids
+        order = np.argsort(key, kind="stable")
+        frames = frames.take(order)
+        key = key[order]
+        count = frames.count
+        data = frames.data
+        pci = data[:, 0] >> 4
+
+        is_single = pci == SINGLE_FRAME
+        is_first = pci == FIRST_FRAME
+        is_consecutive = pci == CONSECUTIVE_FRAME
+        new_stream = np.ones(count, dtype=bool)
+        new_stream[1:] = key[1:] != key[:-1]
+        starts = is_single | is_first | new_stream
+        segment = np.cumsum(starts) - 1
+        head = np.flatnonzero(starts)
+        head_of_row = head[segment]
+
+        # Header size and payload length announced by each segment's head
+        low_nibble = (data[:, 0] & 0x0F).astype(np.int64)
+        byte1 = data[:, 1].astype(np.int64) if data.shape[1] > 1 else np.zeros(count, np.int64)
+        header = np.ones(count, dtype=np.int64)
+        expected = np.zeros(count, dtype=np.int64)
+
+        sf_escape = is_single & (low_nibble == 0)
+        header[is_single] = 1
+        header[sf_escape] = 2
+        expected[is_single] = np.where(sf_escape, byte1, low_nibble)[is_single]
+
+        ff_length = (low_nibble << 8) | byte1
+        ff_escape = is_first & (ff_length == 0)
+        header[is_first] = 2
+        expected[is_first] = ff_length[is_first]
+        if ff_escape.any():
+            escape_length = data[:, 2:6].astype(np.int64)
+            escape_length = ((escape_length[:, 0] << 24) | (escape_length[:, 1] << 16)
+                             | (escape_length[:, 2] << 8) | escape_length[:, 3])
+            header[ff_escape] = 6
+            expected[ff_escape] = escape_length[ff_escape]
+
+        segment_expected = expected[head]
+        segment_type = pci[head]
+
+        # Bytes each frame contributes and where they land in the payload
+        contribution = np.maximum(frames.lengths - header, 0)
+        contribution[is_single] = np.minimum(contribution, expected)[is_single]
+        cumulative = np.cumsum(contribution)
+        offset = cumulative - contribution - (cumulative[head] - contribution[head])[segment]
+        needed = offset < segment_expected[segment]
+
+        # Consecutive frames must count 1, 2, ..., 15, 0, 1, ... after the first frame
+        position = np.arange(count) - head_of_row
+        bad_sequence = is_consecutive & ((low_nibble != (position & 0x0F)) | (position == 0))
+        segment_bad = np.bincount(segment, weights=(bad_sequence & needed), minlength=len(head)) > 0
+        segment_bytes = np.bincount(segment, weights=contribution, minlength=len(head))
+
+        valid_head = ((segment_type == SINGLE_FRAME) | (segment_type == FIRST_FRAME)) & ~segment_bad
+        valid_head &= (segment_expected > 0) & (segment_expected <= self.max_payload)
+        complete = valid_head & (segment_bytes >= segment_expected)
+
+        # Carry the last, still incomplete, first-frame segment of each stream
+        last_of_stream = np.ones(len(head), dtype=bool)
+        last_of_stream[:-1] = key[head[1:]] != key[head[:-1]]
+        carry = valid_head & ~complete & last_of_stream & (segment_type == FIRST_FRAME)
+        self.stats["dropped_segments"] += int((~complete & ~carry).sum())
+        if carry.any():
+            self.pending = frames.take(np.flatnonzero(carry[segment]))
+
+        done = np.flatnonzero(complete)
+        if not len(done):
+            return _empty_result()
+
+        # Completion time is the frame that delivers the final byte
+        out_row = np.full(len(head), -1, dtype=np.int64)
+        out_row[done] = np.arange(len(done))
+        finishing = needed & (offset + contribution >= segment_expected[segment]) & complete[segment]
+        finish_rows = np.flatnonzero(finishing)
+        out_times = np.empty(len(done))
+        out_times[out_row[segment[finish_rows]]] = frames.timestamps[finish_rows]
+
+        lengths = segment_expected[done]
+        payloads = np.zeros((len(done), int(lengths.max())), dtype=np.uint8)
+        rows = np.flatnonzero(needed & complete[segment])
+        row_out = out_row[segment[rows]]
+        row_offset = offset[rows]
+        row_header = header[rows]
+        row_take = np.minimum(contribution[rows], segment_expected[segment[rows]] - row_offset)
+        for j in range(int(row_take.max()) if len(rows) else 0):
+            sel = row_take > j
+            payloads[row_out[sel], row_offset[sel] + j] = data[rows[sel], row_header[sel] + j]
+
+        self.stats["messages"] += len(done)
+        time_order = np.argsort(out_times, kind="stable")
+        return (out_times[time_order],
+                frames.can_ids[head[done]][time_order],
+                frames.bus[head[done]][time_order],
+                payloads[time_order],
+                lengths[time_order])
+
+
+class _Frames:
+    """Column arrays of a batch of raw CAN frames"""
+
+    def __init__(self, timestamps, can_ids, bus, data, lengths):
+        self.timestamps = timestamps
+        self.can_ids = can_ids
+        self.bus = bus
+        self.data = data
+        self.lengths = lengths
+        self.count = len(timestamps)
+
+    def take(self, index):
+        return _Frames(self.timestamps[index], self.can_ids[index], self.bus[index],
+                       self.data[index], self.lengths[index])
+
+    def concat(self, other):
+        width = max(self.data.shape[1], other.data.shape[1])
+        data = np.zeros((self.count + other.count, width), dtype=np.uint8)
+        data[:self.count, :self.data.shape[1]] = self.data
+        data[self.count:, :other.data.shape[1]] = other.data
+        return _Frames(
+            np.concatenate([self.timestamps, other.timestamps]),
+            np.concatenate([self.can_ids, other.can_ids]),
+            np.concatenate([self.bus, other.bus]),
+            data,
+            np.concatenate([self.lengths, other.lengths]),
+        )
+
+
+def _empty_result():
+    return (np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+            np.zeros((0, 0), dtype=np.uint8), np.zeros(0, dtype=np.int64))
+
+
+def reassemble(timestamps, can_ids, data_bytes, data_lengths=None, bus=None):
+    """One-shot reassembly of a whole log"""
+    return IsoTpReassembler().feed(timestamps, can_ids, data_bytes, data_lengths, bus)
@@ -0,0 +1,148 @@
+"""Live push of newly decoded samples to dashboards over Server-Sent Events.
+
+Ingest workers reduce every decoded chunk with live_samples() and emit it
+to the web process, where LiveFeed collects samples per vehicle and, every
+WINDOW_SECONDS, broadcasts one coalesced batch per vehicle. Each signal of
+a batch is serialized once and shared by all subscribers, so N dashboards
+cost one decode fan-out instead of N clients polling MongoDB.
+
+Every subscriber has a bounded queue of MAX_PENDING batches. A client that
+falls behind loses its oldest batches instead of holding up ingest or the
+other clients; its next event carries "dropped" so it can refetch the gap
+from /api/metrics/<vehicle_id>/series.
+"""
+import collections
+import json
+import threading
+import time
+
+import numpy as np
+
+from downsampling import m4
+
+WINDOW_SECONDS = 0.5
+MAX_POINTS = 500  # per signal and batch; M4-reduced beyond that
+MAX_PENDING = 32  # batches queued per subscriber
+KEEPALIVE_SECONDS = 15
+
+
+def live_samples(decoded, time_offset=0.0, max_points=MAX_POINTS):
+    """{signal: (epoch times, values)} of a decoded chunk, reduced to about max_points per signal"""
+    samples = {}
+    for name, (times, values) in decoded.items():
+        times, values = m4(np.asarray(times) + time_offset, values, max(1, max_points // 4))
+        if len(times):
+            samples[name] = (times, values)
+    return samples
+
+
+class Subscription:
+    def __init__(self, vehicle, signals=None, max_pending=MAX_PENDING):
+        self.vehicle = vehicle
+        self.signals = set(signals) if signals else None
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._batches = collections.deque()
+        self._ready = threading.Condition()
+
+    def put(self, batch):
+        with self._ready:
+            if len(self._batches) >= self.max_pending:
+                self._batches.popleft()
+                self.dropped += 1
+            self._batches.append(batch)
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        """(batch, batches dropped before it), or (None, 0) after `timeout` seconds"""
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._batches, timeout):
+                return None, 0
+            dropped, self.dropped = self.dropped, 0
+            return self._batches.popleft(), dropped
+
+
+class LiveFeed:
+    def __init__(self, window=WINDOW_SECONDS, max_points=MAX_POINTS, max_pending=MAX_PENDING):
+        self.window = window
+        self.max_points = max_points
+        self.max_pending = max_pending
+        self._pending = {}  # vehicle -> {signal: [(times, values)]}
+        self._subscribers = {}  # vehicle -> set of subscriptions
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def publish(self, vehicle, samples):
+        """Queue {signal: (times, values)} for the vehicle's next batch"""
+        with self._lock:
+            if vehicle not in self._subscribers:
+                return  # nobody listening
+            pending = self._pending.setdefault(vehicle, {})
+            for name, series in samples.items():
+                pending.setdefault(name, []).append(series)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, daemon=True)
+                self._flusher.start()
+
+    def subscribe(self, vehicle, signals=None):
+        subscription = Subscription(vehicle, signals, self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(vehicle, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.vehicle, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.vehicle, None)
+                self._pending.pop(subscription.vehicle, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        """Broadcast one coalesced batch per vehicle with pending samples"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for vehicle, signals in pending.items():
+            fragments = {}
+            for name, parts in signals.items():
+                times = np.concatenate([t for t, _ in parts])
+                values = np.concatenate([v for _, v in parts])
+                order = np.argsort(times, kind="stable")  # chunks of several groups interleave
+                times, values = m4(times[order], values[order], max(1, self.max_points // 4))
+                fragments[name] = (f"{json.dumps(name)}: "
+                                   f"{json.dumps({'times': times.tolist(), 'values': values.tolist()})}")
+            with self._lock:
+                self._sequence += 1
+                batch = (self._sequence, fragments)
+                subscribers = list(self._subscribers.get(vehicle, ()))
+            for subscription in subscribers:
+                subscription.put(batch)
+
+    def stream(self, subscription, keepalive=KEEPALIVE_SECONDS):
+        """SSE text for a subscription; unsubscribes when the client goes away"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                batch, dropped = subscription.get(timeout=keepalive)
+                if batch is None:
+                    yield ": keepalive\n\n"
+                    continue
+                sequence, fragments = batch
+                names = fragments if subscription.signals is None else subscription.signals & fragments.keys()
+                if not names and not dropped:
+                    continue
+                yield (f"id: {sequence}\nevent: samples\n"
+                       f"data: {{\"vehicle_id\": {json.dumps(subscription.vehicle)}, \"dropped\": {dropped}, "
+                       f"\"signals\": {{{', '.join(fragments[name] for name in names)}}}}}\n\n")
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,79 @@
+"""Metric catalog derived from a compiled DBC.
+
+Units, value ranges and multiplexer values come straight from the SG_
+definitions, and categories from CATEGORY_RULES matched by one compiled
+regex, so ingest looks metrics up instead of extracting signals or
+scanning keyword lists per column. Catalogs are cached per DBC content hash.
+"""
+import re
+
+import numpy as np
+
+# Keywords are matched anywhere in the lower-cased signal name
+CATEGORY_RULES = (
+    ("battery", ("battery", "soc", "charge", "bms")),
+    ("drivetrain", ("motor", "drive", "power", "torque", "rpm")),
+    ("temperature", ("temp", "temperature", "thermal")),
+    ("electrical", ("volt", "current", "amp", "electric")),
+    ("vehicle_status", ("speed", "velocity", "accel", "brake", "steer")),
+    ("hvac", ("hvac", "ac", "heat", "cool", "fan")),
+)
+DEFAULT_CATEGORY = "other"
+
+# One optional lookahead per category, all evaluated by a single match at
+# position 0, so a name can fall into several categories (e.g. "accel"
+# hits both vehicle_status and hvac, as the keyword scans did)
+CATEGORY_RE = re.compile("".join(
+    f"(?=.*?(?P<{category}>{'|'.join(re.escape(k) for k in keywords)}))?"
+    for category, keywords in CATEGORY_RULES
+), re.DOTALL)
+
+_catalogs = {}  # DBC content hash -> catalog
+
+
+def categorize(name):
+    match = CATEGORY_RE.match(name.lower())
+    categories = [category for category, _ in CATEGORY_RULES if match.group(category)]
+    return categories or [DEFAULT_CATEGORY]
+
+
+def build_catalog(db):
+    """{signal name: {"unit", "categories", "min", "max", "messages", "multiplexer", "mux_values"}}"""
+    catalog = {}
+    for msg_idx, message in enumerate(db.msg_names):
+        for s in db.message_signals(msg_idx):
+            if db.sig_ignored[s]:
+                continue
+            name = db.sig_names[s]
+            ranges = list(zip(db.mux_low[db.sig_mux_start[s]:db.sig_mux_start[s + 1]].tolist(),
+                              db.mux_high[db.sig_mux_start[s]:db.sig_mux_start[s + 1]].tolist()))
+            mux_values = sorted({v for low, high in ranges for v in range(low, high + 1)})
+            parent = int(db.sig_parent[s])
+            entry = catalog.get(name)
+            if entry is None:
+                catalog[name] = {
+                    "unit": db.sig_units[s],
+                    "categories": categorize(name),
+                    "min": float(db.sig_min[s]),
+                    "max": float(db.sig_max[s]),
+                    "messages": [message],
+                    "multiplexer": db.sig_names[parent] if parent >= 0 else None,
+                    "mux_values": mux_values,
+                }
+                continue
+            # The same signal defined in several messages: widen the range
+            entry["min"] = float(np.fmin(entry["min"], db.sig_min[s]))
+            entry["max"] = float(np.fmax(entry["max"], db.sig_max[s]))
+            if message not in entry["messages"]:
+                entry["messages"].append(message)
+            entry["mux_values"] = sorted(set(entry["mux_values"]) | set(mux_values))
+    return catalog
+
+
+def catalog_for(db):
+    """The catalog of a compiled DBC, built once per DBC content"""
+    key = db.content_hash or id(db)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        catalog = _catalogs[key] = build_catalog(db)
+    return catalog
@@ -1,68 +1,164 @@
+import argparse
 import os
 import subprocess
+import sys
 import pandas as pd
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def convert_mf4_to_csv(input_folder, dbc_path, output_folder, model_name):
-    print(f"Input folder: {input_folder}")
-    os.makedirs(output_folder, exist_ok=True)
-    temp_folder = os.path.join(output_folder, "temp")  # Temp spot for decoder output
-    
-    mf4_files = [f for f in os.listdir(input_folder) if f.lower().endswith(".mf4")]
-    print(f"Found {len(mf4_files)} MF4 files: {mf4_files}")
-    
-    if not mf4_files:
-        print("No MF4 files found—exiting!")
-        return
-    
-    for idx, mf4_file in enumerate(mf4_files, start=1):
-        input_path = os.path.join(input_folder, mf4_file)
-        output_csv = os.path.join(output_folder, f"{model_name}-decoded-{idx:03d}.csv")
-        os.makedirs(temp_folder, exist_ok=True)
-        
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # backend/ modules
+
+from ingestManifest import UNCHANGED, Manifest
+
+def decode_mf4_file(input_path, dbc_path, output_csv, scratch_folder):
+    """Decode one MF4 file into a combined CSV or Parquet file using its own scratch folder"""
+    started = time.perf_counter()
+    result = {"input": input_path, "output": output_csv, "rows": 0, "error": None}
+    os.makedirs(scratch_folder, exist_ok=True)
+    try:
         cmd = [
             "mdf2csv_decode.exe",
             "-i", input_path,
             f"--dbc-can1={dbc_path}",
-            "-O", temp_folder,
+            "-O", scratch_folder,
             "--verbosity", "4",
             "--no-append-root"
         ]
-        print(f"Converting {mf4_file} to {output_csv}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        print(result.stdout)
-        if result.stderr or result.returncode != 0:
-            print(f"Errors (code {result.returncode}): {result.stderr}")
+        completed = subprocess.run(cmd, capture_output=True, text=True)
+        if completed.returncode != 0:
+            result["error"] = f"decoder exited with code {completed.returncode}: {completed.stderr.strip()}"
+            return result
         
-        # Find all CSVs in temp subfolders
+        # Find all CSVs in scratch subfolders
         generated_files = []
-        for root, _, files in os.walk(temp_folder):
+        for root, _, files in os.walk(scratch_folder):
             for f in files:
                 if f.endswith(".csv"):
                     signal_group = os.path.basename(os.path.dirname(os.path.dirname(os.path.dirname(root))))  # e.g., CAN1_Battery_S_M62_R_M101
                     generated_files.append((os.path.join(root, f), signal_group))
         
-        if generated_files:
-            dfs = []
-            for csv_path, signal_group in generated_files:
-                df = pd.read_csv(csv_path)
-                df["signal_group"] = signal_group.split("CAN1_", 1)[-1] if "CAN1_" in signal_group else signal_group  # Clean up to Battery_S_M62_R_M101
-                dfs.append(df)
-            
-            # Merge all signal groups into one DF
-            combined_df = pd.concat(dfs, ignore_index=True)
-            combined_df.to_csv(output_csv, index=False)
-            print(f"Saved combined CSV: {output_csv}")
+        if not generated_files:
+            result["error"] = "decoder produced no CSV files"
+            return result
+        
+        dfs = []
+        for csv_path, signal_group in generated_files:
+            df = pd.read_csv(csv_path)
+            df["signal_group"] = signal_group.split("CAN1_", 1)[-1] if "CAN1_" in signal_group else signal_group  # Clean up to Battery_S_M62_R_M101
+            dfs.append(df)
         
-        # Clean up temp folder
-        shutil.rmtree(temp_folder, ignore_errors=True)
+        # Merge all signal groups into one DF, written under a temp name so an
+        # interrupted run never leaves a half-written output that looks up to date
+        combined_df = pd.concat(dfs, ignore_index=True)
+        if output_csv.endswith(".parquet"):
+            from columnarSignals import write_parquet
+            write_parquet(combined_df, output_csv)
+        else:
+            partial_csv = output_csv + ".partial"
+            combined_df.to_csv(partial_csv, index=False)
+            os.replace(partial_csv, output_csv)
+        result["rows"] = len(combined_df)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        shutil.rmtree(scratch_folder, ignore_errors=True)
+        result["seconds"] = time.perf_counter() - started
+    return result
+
+def convert_mf4_to_csv(input_folder, dbc_path, output_folder, model_name, workers=None, force=False,
+                       output_format="csv"):
+    """Convert every MF4 file in a folder, fanning the files out over a process pool.
+
+    Output names derive from the MF4 file name, so adding a file never
+    renames the others. With output_format="parquet" each log becomes a
+    partition of a Parquet dataset in `output_folder`
+    (vehicle=<model_name>/log=<file name>). A manifest in `output_folder`
+    records the size and hash of every converted file; unchanged files are
+    skipped unless `force` is set, and grown or rewritten ones are converted
+    again (the external decoder cannot resume a file).
+    Returns one result dict per converted file.
+    """
+    print(f"Input folder: {input_folder}")
+    os.makedirs(output_folder, exist_ok=True)
+    scratch_root = os.path.join(output_folder, "temp")  # One scratch folder per file below this
+    
+    mf4_files = sorted(f for f in os.listdir(input_folder) if f.lower().endswith(".mf4"))
+    print(f"Found {len(mf4_files)} MF4 files: {mf4_files}")
+    
+    if not mf4_files:
+        print("No MF4 files found—exiting!")
+        return []
+    
+    manifest = Manifest(os.path.join(output_folder, "manifest.json"))
+    jobs = []
+    for mf4_file in mf4_files:
+        input_path = os.path.join(input_folder, mf4_file)
+        if output_format == "parquet":
+            from columnarSignals import partition_path
+            output_csv = partition_path(output_folder, model_name, os.path.splitext(mf4_file)[0])
+        else:
+            output_csv = os.path.join(output_folder, f"{model_name}-decoded-{os.path.splitext(mf4_file)[0]}.csv")
+        status = manifest.status(mf4_file, input_path)
+        if not force and status == UNCHANGED and os.path.exists(output_csv):
+            print(f"Skipping {mf4_file}: {output_csv} is up to date")
+            continue
+        scratch_folder = os.path.join(scratch_root, os.path.splitext(mf4_file)[0])
+        jobs.append((input_path, dbc_path, output_csv, scratch_folder))
+    
+    workers = workers or os.cpu_count() or 1
+    print(f"Converting {len(jobs)} files with {workers} workers")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(decode_mf4_file, *job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            input_path, _, output_csv, _ = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # e.g. a worker process died
+                result = {"input": input_path, "output": output_csv, "rows": 0,
+                          "error": str(e), "seconds": 0.0}
+            results.append(result)
+            name = os.path.basename(input_path)
+            if result["error"]:
+                print(f"[{done}/{len(jobs)}] FAILED {name}: {result['error']}")
+            else:
+                manifest.update(name, input_path, output=os.path.basename(output_csv), rows=result["rows"])
+                print(f"[{done}/{len(jobs)}] {name} -> {os.path.basename(output_csv)} "
+                      f"({result['rows']} rows, {result['seconds']:.1f} s)")
+    
+    shutil.rmtree(scratch_root, ignore_errors=True)
+    failed = [r for r in results if r["error"]]
+    print(f"Converted {len(results) - len(failed)} files, {len(failed)} failed, "
+          f"{len(mf4_files) - len(jobs)} skipped")
+    return results
 
 input_folder = "C:/Users/Instruktor.P-02462/Coding/evhub/EV-dbc-App/backend/mf42csv/input"
 dbc_path = "C:/Users/Instruktor.P-02462/Coding/evhub/EV-dbc-App/backend/mf42csv/dbc_files/can1-hyundai-kia-uds-v2.4.dbc"
 output_folder = "C:/Users/Instruktor.P-02462/Coding/evhub/EV-dbc-App/backend/mf42csv/output"
 model_name = "hyundai-kona"
 
-convert_mf4_to_csv(input_folder, dbc_path, output_folder, model_name)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch convert MF4 logs to decoded CSV files")
+    parser.add_argument("--input", default=input_folder, help="Folder with MF4 files")
+    parser.add_argument("--dbc", default=dbc_path, help="DBC file for CAN1")
+    parser.add_argument("--output", default=output_folder, help="Folder for decoded CSV files")
+    parser.add_argument("--model", default=model_name, help="Prefix for output file names")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-convert files that are up to date")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output file format")
+    parser.add_argument("--watch", action="store_true", help="Keep polling the input folder for new files")
+    parser.add_argument("--interval", type=float, default=30, help="Seconds between polls with --watch")
+    args = parser.parse_args()
+    
+    convert_mf4_to_csv(args.input, args.dbc, args.output, args.model, args.workers, args.force, args.format)
+    while args.watch:
+        try:
+            time.sleep(args.interval)
+            convert_mf4_to_csv(args.input, args.dbc, args.output, args.model, args.workers,
+                               output_format=args.format)
+        except KeyboardInterrupt:
+            break
 
 # import os
 # import subprocess
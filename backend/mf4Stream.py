@@ -0,0 +1,126 @@
+"""Chunked, bounded-memory decoding of MF4 CAN logs.
+
+The CAN_DataFrame channels of a data group are read CHUNK_RECORDS records
+at a time and decoded chunk by chunk, with one ISO-TP reassembler carried
+across chunks so multi-frame responses that straddle a boundary are not
+lost. Each chunk yields {signal_name: (timestamps, values)}, so memory use
+is set by the chunk size rather than by the length of the log.
+"""
+import inspect
+import logging
+
+import numpy as np
+
+from dbcDecoder import CAN_ID_MASK, decode_frames
+from instrumentation import METRICS, stage, timed_iter
+from isotpReassembly import IsoTpReassembler
+
+log = logging.getLogger(__name__)
+
+CHUNK_RECORDS = 250_000
+_fallback_logged = set()
+
+
+def _load_data(mdf):
+    """asammdf's private fragment reader, or None when this asammdf does not have it.
+
+    Checked against asammdf 8.8.27: MDF._mdf is the MDF4 reader, whose
+    _load_data(group, record_offset=, record_count=) yields fragments that
+    the public MDF.get(data=...) accepts, starting at the data block that
+    holds record_offset.
+    """
+    load_data = getattr(getattr(mdf, "_mdf", None), "_load_data", None)
+    try:
+        parameters = inspect.signature(load_data).parameters
+    except (TypeError, ValueError):
+        parameters = {}
+    if "record_offset" in parameters:
+        return load_data
+    if mdf.version not in _fallback_logged:
+        _fallback_logged.add(mdf.version)
+        log.warning("asammdf has no _load_data(record_offset=); reading MDF %s channel by channel",
+                    mdf.version)
+    return None
+
+
+def iter_fragments(mdf, group, names, start_record=0, fragment_records=CHUNK_RECORDS):
+    """Yield [one Signal per name] for consecutive record ranges of a group, from `start_record` on.
+
+    Each fragment is read once for all channels, through asammdf's private
+    reader when it has one; otherwise every channel is read on its own with
+    the public MDF.get(record_offset=, record_count=), `fragment_records`
+    records at a time.
+    """
+    load_data = _load_data(mdf)
+    if load_data is not None:
+        for fragment in load_data(mdf.groups[group], record_offset=start_record):
+            yield [mdf.get(name, group=group, data=fragment) for name in names]
+        return
+    for offset in range(start_record, mdf.groups[group].channel_group.cycles_nr, fragment_records):
+        yield [mdf.get(name, group=group, record_offset=offset, record_count=fragment_records)
+               for name in names]
+
+
+def iter_can_chunks(mdf, group, chunk_records=CHUNK_RECORDS, progress=None, can_ids=None,
+                    start_record=0, position=None):
+    """Yield (timestamps, can_ids, data_bytes, data_lengths, bus) for each record chunk.
+
+    With `can_ids`, frames of other IDs are dropped before they are yielded.
+    Reading starts at `start_record` (e.g. after the records decoded by an
+    earlier run): data blocks before it are skipped by their offsets, not
+    read. `progress(fraction)` is called after each chunk with the share of
+    records read, and `position(record)` with the record to resume from once
+    the consumer is done with the chunk.
+    """
+    channel_group = mdf.groups[group].channel_group
+    record_size = channel_group.samples_byte_nr + channel_group.invalidation_bytes_nr
+    # Fragments are sized to the chunk
+    mdf.configure(read_fragment_size=max(chunk_records * record_size, 1 << 20))
+    names = ["CAN_DataFrame.DataBytes", "CAN_DataFrame.ID"]
+    # DataLength and BusChannel are missing from some loggers' files
+    optional = [name for name in ("CAN_DataFrame.DataLength", "CAN_DataFrame.BusChannel")
+                if any(g == group for g, _ in mdf.channels_db.get(name, []))]
+    # MDF.iter_get has no record offset and reads every fragment once per channel
+    fragments = iter_fragments(mdf, group, names + optional, start_record, chunk_records)
+    wanted = None if can_ids is None else np.unique(np.asarray(can_ids, dtype=np.uint32) & CAN_ID_MASK)
+    records_read = start_record
+    for data_signal, id_signal, *rest in fragments:
+        if not len(data_signal):
+            continue
+        records_read += len(data_signal)
+        METRICS.inc("ev_ingest_records_read_total", len(data_signal))
+        METRICS.inc("ev_ingest_bytes_read_total", len(data_signal) * record_size)
+        chunk = [data_signal.timestamps, id_signal.samples, data_signal.samples]
+        chunk += [signal.samples for signal in rest]
+        if wanted is not None:
+            keep = np.isin(chunk[1].astype(np.uint32) & np.uint32(CAN_ID_MASK), wanted)
+            chunk = [column[keep] for column in chunk]
+        METRICS.inc("ev_ingest_frames_total", len(chunk[0]))
+        columns = dict(zip(optional, chunk[3:]))
+        yield (chunk[0], chunk[1], chunk[2],
+               columns.get("CAN_DataFrame.DataLength"), columns.get("CAN_DataFrame.BusChannel"))
+        if progress is not None and channel_group.cycles_nr:
+            progress(min(records_read / channel_group.cycles_nr, 1.0))
+        if position is not None:
+            position(records_read)
+
+
+def iter_decoded(database, chunks):
+    """Decode an iterable of frame chunks, yielding one decoded dict per non-empty chunk"""
+    reassembler = IsoTpReassembler()
+    for timestamps, can_ids, data_bytes, data_lengths, bus in timed_iter(chunks, "read"):
+        with stage("decode"):
+            decoded = decode_frames(database, timestamps, can_ids, data_bytes, data_lengths,
+                                    bus=bus, reassembler=reassembler)
+        METRICS.inc("ev_ingest_samples_total", sum(len(times) for times, _ in decoded.values()))
+        if decoded:
+            yield decoded
+
+
+def iter_decoded_mf4(mdf, group, database, chunk_records=CHUNK_RECORDS, progress=None):
+    """Stream one MF4 CAN data group through the decoder chunk by chunk.
+
+    Frames of IDs the DBC does not define are dropped as they are read.
+    """
+    return iter_decoded(database, iter_can_chunks(mdf, group, chunk_records, progress,
+                                                  can_ids=database.msg_ids))
@@ -0,0 +1,185 @@
+"""Batched MongoDB persistence for decoded metrics.
+
+- The metrics catalog is upserted with one unordered bulk_write instead of
+  one update_one round trip per metric.
+- Time series are stored as bucketed documents holding up to
+  SAMPLES_PER_BUCKET samples of one metric each, written with insert_many.
+- ensure_indexes creates the indexes the API queries rely on.
+- get_client() opens one MongoClient per process on first use, so nothing
+  connects at import time and a forked worker never reuses its parent's
+  client (PyMongo clients are not fork-safe).
+"""
+import datetime
+import logging
+import os
+import threading
+
+import numpy as np
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from pymongo.errors import PyMongoError
+
+log = logging.getLogger(__name__)
+
+SAMPLES_PER_BUCKET = 1000
+INSERT_BATCH = 500  # bucket documents per insert_many call
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB = os.environ.get("MONGO_DB", "ev_data")
+# One connection per concurrent request thread of a web process; ingest
+# workers are single-threaded and only ever open one or two
+POOL_SIZE = int(os.environ.get("MONGO_POOL_SIZE", 8))
+TIMEOUT_MS = int(os.environ.get("MONGO_TIMEOUT_MS", 5000))
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """This process's MongoClient, created on first use (and again after a fork)"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(MONGO_URI, maxPoolSize=POOL_SIZE, maxIdleTimeMS=60000,
+                                  serverSelectionTimeoutMS=TIMEOUT_MS, connect=False)
+            _client_pid = os.getpid()
+        return _client
+
+
+def set_client(client):
+    """Use `client` in this process instead of connecting to MONGO_URI (e.g. mongomock)"""
+    global _client, _client_pid
+    with _client_lock:
+        _client, _client_pid = client, os.getpid()
+
+
+def get_database():
+    return get_client()[MONGO_DB]
+
+
+def metrics_collection():
+    return get_database()["vehicle_metrics"]
+
+
+def catalog_collection():
+    return get_database()["metrics_catalog"]
+
+
+def series_collection():
+    return get_database()["metric_series"]  # bucketed time series documents
+
+
+def ensure_indexes(metrics_collection, metrics_catalog_collection, series_collection):
+    """Create the indexes used by the metrics endpoints (no-op when they exist)"""
+    metrics_collection.create_index([("vehicle_id", ASCENDING), ("timestamp", DESCENDING)])
+    metrics_catalog_collection.create_index(
+        [("vehicle_id", ASCENDING), ("metric_name", ASCENDING)], unique=True)
+    series_collection.create_index(
+        [("vehicle_id", ASCENDING), ("metric_name", ASCENDING), ("start", ASCENDING)])
+
+
+def try_ensure_indexes(*collections):
+    """ensure_indexes at startup, without failing the app when MongoDB is down"""
+    try:
+        ensure_indexes(*(collections or (metrics_collection(), catalog_collection(), series_collection())))
+    except PyMongoError as e:
+        log.warning("Could not create MongoDB indexes: %s", e)
+
+
+def upsert_catalog(metrics_catalog_collection, vehicle_id, vehicle_info, metrics_catalog):
+    """Upsert every catalog entry of a run in a single unordered bulk_write.
+
+    Each entry's fields (unit, categories, last_seen, ...) are set as given.
+    """
+    if not metrics_catalog:
+        return None
+    operations = [
+        UpdateOne(
+            {"vehicle_id": vehicle_id, "metric_name": metric_name},
+            {"$set": dict(metric_info,
+                          vehicle_id=vehicle_id,
+                          make=vehicle_info["make"],
+                          model=vehicle_info["model"],
+                          metric_name=metric_name)},
+            upsert=True
+        )
+        for metric_name, metric_info in metrics_catalog.items()
+    ]
+    return metrics_catalog_collection.bulk_write(operations, ordered=False)
+
+
+def series_buckets(vehicle_id, metric_name, times, values, bucket_size=SAMPLES_PER_BUCKET):
+    """Split one metric's samples (epoch seconds) into bucket documents"""
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.isfinite(values)
+    if not keep.all():
+        times, values = times[keep], values[keep]
+    for first in range(0, len(times), bucket_size):
+        bucket_times = times[first:first + bucket_size]
+        yield {
+            "vehicle_id": vehicle_id,
+            "metric_name": metric_name,
+            "start": datetime.datetime.fromtimestamp(bucket_times[0], datetime.timezone.utc),
+            "end": datetime.datetime.fromtimestamp(bucket_times[-1], datetime.timezone.utc),
+            "count": len(bucket_times),
+            "times": bucket_times.tolist(),
+            "values": values[first:first + bucket_size].tolist(),
+        }
+
+
+def write_series(series_collection, vehicle_id, decoded, time_offset=0.0,
+                 bucket_size=SAMPLES_PER_BUCKET):
+    """Store every signal of a decoded {name: (times, values)} dict as bucket documents.
+
+    Returns the number of documents written.
+    """
+    written = 0
+    batch = []
+    for metric_name, (times, values) in decoded.items():
+        for bucket in series_buckets(vehicle_id, metric_name, np.asarray(times) + time_offset,
+                                     values, bucket_size):
+            batch.append(bucket)
+            if len(batch) >= INSERT_BATCH:
+                series_collection.insert_many(batch, ordered=False)
+                written += len(batch)
+                batch = []
+    if batch:
+        series_collection.insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+def delete_series(series_collection, vehicle_id, start, end):
+    """Delete the bucket documents of every metric lying within [start, end] (epoch seconds).
+
+    Returns the number of documents deleted.
+    """
+    result = series_collection.delete_many({
+        "vehicle_id": vehicle_id,
+        "start": {"$gte": datetime.datetime.fromtimestamp(start, datetime.timezone.utc)},
+        "end": {"$lte": datetime.datetime.fromtimestamp(end, datetime.timezone.utc)},
+    })
+    return result.deleted_count
+
+
+def read_series(series_collection, vehicle_id, metric_name, start=None, end=None):
+    """(times, values) of one metric from its bucket documents, bounded by epoch seconds"""
+    query = {"vehicle_id": vehicle_id, "metric_name": metric_name}
+    if start is not None:
+        query["end"] = {"$gte": datetime.datetime.fromtimestamp(start, datetime.timezone.utc)}
+    if end is not None:
+        query["start"] = {"$lte": datetime.datetime.fromtimestamp(end, datetime.timezone.utc)}
+    times, values = [], []
+    for bucket in series_collection.find(query, {"times": 1, "values": 1},
+                                         sort=[("start", ASCENDING)]):
+        times.extend(bucket["times"])
+        values.extend(bucket["values"])
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.ones(len(times), dtype=bool)
+    if start is not None:
+        keep &= times >= start
+    if end is not None:
+        keep &= times <= end
+    return times[keep], values[keep]
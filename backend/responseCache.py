@@ -0,0 +1,118 @@
+"""In-process cache of JSON responses that only change when a vehicle is ingested.
+
+Entries are keyed by endpoint, vehicle, the sorted query parameters (and
+any negotiated headers) and the vehicle's generation, a token read from
+shared state (the signal store's) that every ingest path renews when it
+is done, so nothing stale is ever served, whichever process ran the
+ingest, and nothing has to expire by time. invalidate(vehicle) only frees
+the entries of a vehicle early. The cache holds at most MAX_ENTRIES
+responses and MAX_BYTES of bodies, evicting the least recently used.
+
+The ETag is derived from the key alone, so every web worker gives the
+same one and a matching If-None-Match gets its 304 without running the
+view or touching MongoDB. Streamed responses (binary series) get an ETag
+but are not stored.
+"""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", 4096))
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 << 20))
+
+
+class ResponseCache:
+    def __init__(self, generation, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        """`generation(vehicle)` returns a token that changes whenever the vehicle's data does"""
+        self.generation = generation
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (etag, body, mimetype), least recently used first
+        self.size = 0
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def invalidate(self, vehicle):
+        """Drop a vehicle's cached responses, e.g. after an ingest; they would no longer match"""
+        with self._lock:
+            for key in [key for key in self.entries if key[1] == vehicle]:
+                self.size -= len(self.entries.pop(key)[1])
+
+    def key(self, endpoint, vehicle, params=(), headers=(), extra=None):
+        return endpoint, vehicle, self.generation(vehicle), tuple(sorted(params)), tuple(headers), extra
+
+    def etag(self, key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry
+
+    def put(self, key, etag, body, mimetype):
+        if len(body) > self.max_bytes or key[2] != self.generation(key[1]):
+            return  # too big, or ingested while the response was built
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self.entries[key] = (etag, body, mimetype)
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.counters["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.size)
+
+    def cached(self, headers=(), extra=None):
+        """Decorator for GET views taking vehicle_id: cache 200 responses, answer If-None-Match.
+
+        `headers` are request headers the response depends on (e.g. Accept);
+        `extra(vehicle_id)` adds a cheap fingerprint of state that changes
+        outside ingest.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(vehicle_id, **kwargs):
+                params = [(name, value) for name, values in request.args.lists()
+                          for value in values]
+                key = self.key(view.__name__, vehicle_id, params,
+                               [request.headers.get(header, "") for header in headers],
+                               extra(vehicle_id) if extra else None)
+                etag = self.etag(key)
+                if etag in request.if_none_match:
+                    with self._lock:
+                        self.counters["not_modified"] += 1
+                    return _tagged(Response(status=304), etag, headers)
+                entry = self.get(key)
+                if entry is not None:
+                    _, body, mimetype = entry
+                    return _tagged(Response(body, mimetype=mimetype), etag, headers)
+                response = view(vehicle_id, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response  # errors are tuples or other statuses: not cached
+                if not response.is_streamed:
+                    self.put(key, etag, response.get_data(), response.mimetype)
+                return _tagged(response, etag, headers)
+            return wrapper
+        return decorator
+
+
+def _tagged(response, etag, headers):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # always revalidate; a 304 is cheap
+    if headers:
+        response.vary.update(headers)
+    return response
@@ -0,0 +1,164 @@
+"""Multi-resolution rollups of stored signals.
+
+At ingest every signal is summarised per fixed-width time bucket (1 s,
+10 s, 1 min and 10 min by default) into min / max / sum / count / last
+records. Buckets are aligned to multiples of their width, so each level is
+built from the one below it rather than from the raw samples again. The
+files live next to the signal store:
+
+    <root>/<vehicle>/rollup-<width>s/<signal>.bin
+
+A query for a given resolution reads the coarsest level whose buckets are
+no wider than that resolution, so its cost depends on the time span and
+not on how many raw samples were logged. Updates hold the vehicle's
+signal store writer lock.
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from signalStore import _check_name
+
+LEVELS = (1, 10, 60, 600)  # bucket widths in seconds, each a multiple of the previous one
+ROLLUP_DTYPE = np.dtype([("t", "<f8"), ("min", "<f8"), ("max", "<f8"),
+                         ("sum", "<f8"), ("count", "<i8"), ("last", "<f8")])
+
+
+def rollup(times, values, width):
+    """Bucket raw samples into rollup records of `width` seconds"""
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.isfinite(values)
+    if not keep.all():
+        times, values = times[keep], values[keep]
+    if not len(times):
+        return np.zeros(0, dtype=ROLLUP_DTYPE)
+    bucket = np.floor(times / width) * width
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    records = np.empty(len(first), dtype=ROLLUP_DTYPE)
+    records["t"] = bucket[first]
+    records["min"] = np.minimum.reduceat(values, first)
+    records["max"] = np.maximum.reduceat(values, first)
+    records["sum"] = np.add.reduceat(values, first)
+    records["count"] = np.diff(np.r_[first, len(times)])
+    records["last"] = values[np.r_[first[1:], len(times)] - 1]
+    return records
+
+
+def merge_rollup(records, width):
+    """Combine finer rollup records into buckets of `width` seconds"""
+    if not len(records):
+        return np.zeros(0, dtype=ROLLUP_DTYPE)
+    bucket = np.floor(records["t"] / width) * width
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    merged = np.empty(len(first), dtype=ROLLUP_DTYPE)
+    merged["t"] = bucket[first]
+    merged["min"] = np.minimum.reduceat(records["min"], first)
+    merged["max"] = np.maximum.reduceat(records["max"], first)
+    merged["sum"] = np.add.reduceat(records["sum"], first)
+    merged["count"] = np.add.reduceat(records["count"], first)
+    merged["last"] = records["last"][np.r_[first[1:], len(records)] - 1]
+    return merged
+
+
+class RollupStore:
+    def __init__(self, signal_store, levels=LEVELS):
+        self.signal_store = signal_store
+        self.levels = tuple(sorted(levels))
+        self._maps = {}  # path -> ((inode, size), memmap)
+
+    def _path(self, vehicle, signal, width):
+        return os.path.join(self.signal_store.root, _check_name(vehicle), f"rollup-{width:g}s",
+                            _check_name(signal) + ".bin")
+
+    def level_for(self, resolution):
+        """Coarsest bucket width no wider than `resolution` seconds, or None for raw data"""
+        usable = [width for width in self.levels if width <= resolution]
+        return usable[-1] if usable else None
+
+    def _records(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return np.zeros(0, dtype=ROLLUP_DTYPE)
+        size = stat.st_size // ROLLUP_DTYPE.itemsize
+        cached = self._maps.get(path)
+        if cached is None or cached[0] != (stat.st_ino, size):
+            records = np.memmap(path, dtype=ROLLUP_DTYPE, mode="r", shape=(size,)) if size else \
+                np.zeros(0, dtype=ROLLUP_DTYPE)
+            cached = ((stat.st_ino, size), records)
+            self._maps[path] = cached
+        return cached[1]
+
+    def _splice(self, path, records, start, end):
+        """Replace the stored buckets in [start, end) with `records`.
+
+        The usual update only touches the last stored buckets: those are
+        overwritten in place (records have a fixed size) and the new ones
+        appended, so the cost follows the span and not the level's length.
+        Anything else (a backfill before or between stored buckets, or a
+        tail that shrinks) writes the level to a new file and renames it
+        over the old one, so readers that still map the old file keep
+        seeing whole, valid records.
+        """
+        existing = self._records(path)
+        lo = int(np.searchsorted(existing["t"], start, side="left"))
+        hi = int(np.searchsorted(existing["t"], end, side="left"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hi == len(existing) and len(records) >= hi - lo:
+            # Never shorter than before, so no mapped record disappears
+            with open(path, "r+b" if lo < hi else "ab") as f:
+                f.seek(lo * ROLLUP_DTYPE.itemsize)
+                f.write(records.tobytes())
+            return
+        merged = np.concatenate([existing[:lo], records, existing[hi:]])
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(merged.tobytes())
+        os.replace(tmp_path, path)
+        self._maps.pop(path, None)
+
+    def update(self, vehicle, signal, start, end):
+        """Recompute every level for the buckets touched by samples in [start, end]"""
+        # Whole coarsest buckets, so every level is rebuilt from complete inputs
+        coarsest = self.levels[-1]
+        span_start = np.floor(start / coarsest) * coarsest
+        span_end = np.floor(end / coarsest) * coarsest + coarsest
+        with self.signal_store.writer(vehicle):  # the store's single writer per vehicle
+            times, values = self.signal_store.read(vehicle, signal, span_start, span_end)
+            inside = times < span_end
+            records = rollup(times[inside], values[inside], self.levels[0])
+            self._splice(self._path(vehicle, signal, self.levels[0]), records, span_start, span_end)
+            for width in self.levels[1:]:
+                records = merge_rollup(records, width)
+                self._splice(self._path(vehicle, signal, width), records, span_start, span_end)
+
+    def update_decoded(self, vehicle, decoded, time_offset=0.0):
+        """Roll up every signal of a decoded {name: (times, values)} dict after it was stored"""
+        for signal, (times, values) in decoded.items():
+            if len(times):
+                self.update(vehicle, signal, times.min() + time_offset, times.max() + time_offset)
+
+    def read(self, vehicle, signal, width, start=None, end=None):
+        """Rollup records of one level overlapping [start, end]"""
+        records = self._records(self._path(vehicle, signal, width))
+        lo = 0 if start is None else int(np.searchsorted(records["t"], start - width, side="right"))
+        hi = len(records) if end is None else int(np.searchsorted(records["t"], end, side="right"))
+        return records[lo:hi]
+
+    def series(self, vehicle, signal, resolution, start=None, end=None):
+        """{"level", "times", "min", "max", "mean", "count", "last"} at the best level, or None"""
+        width = self.level_for(resolution)
+        if width is None:
+            return None
+        records = self.read(vehicle, signal, width, start, end)
+        return {
+            "level": width,
+            "times": records["t"],
+            "min": records["min"],
+            "max": records["max"],
+            "mean": records["sum"] / np.maximum(records["count"], 1),
+            "count": records["count"],
+            "last": records["last"],
+        }
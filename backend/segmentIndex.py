@@ -0,0 +1,234 @@
+"""Trips, charging sessions and idle periods of a vehicle.
+
+After each ingest, the stored state signals (Charging, RapidChargePort,
+NormalChargePort, VehicleSpeed, BMSMainRelay) are aligned on their common
+timestamps and every instant is classified in one vectorized pass:
+
+- dc_charge / ac_charge: Charging is on, with / without the rapid port;
+- trip: the main relay is closed (or, without it, the vehicle moves);
+- idle: anything else.
+
+Runs of one state become segments; runs shorter than MIN_SEGMENT_SECONDS
+are merged into the run before them, and no segment spans a gap in the
+data longer than GAP_SECONDS. Each segment is summarised (start/end SOC,
+kWh from the CEC_/CED_ counters, peak current, max temperature) and kept
+in a per-vehicle interval index next to the signal store:
+
+    <root>/<vehicle>/segments.json
+
+Segments are disjoint and sorted, so their ends are sorted too and a
+window or "last N of a kind" query is a binary search. Updates only
+reclassify from the start of the last (possibly still open) segment, or
+from the start of an older log that arrived late.
+"""
+import json
+import os
+
+import numpy as np
+
+from signalQuery import DEFAULT_TOLERANCE, resample
+from signalStore import _check_name, _write_json
+
+SEGMENT_VERSION = 1  # bump when classification or summaries change
+
+IDLE, TRIP, AC_CHARGE, DC_CHARGE = "idle", "trip", "ac_charge", "dc_charge"
+KINDS = (IDLE, TRIP, AC_CHARGE, DC_CHARGE)
+UNKNOWN = -1  # state code of instants without data; indexes into KINDS otherwise
+
+# Role -> DBC signal name (Hyundai/Kia UDS)
+SIGNALS = {
+    "charging": "Charging",
+    "rapid_port": "RapidChargePort",
+    "normal_port": "NormalChargePort",
+    "speed": "VehicleSpeed",
+    "relay": "BMSMainRelay",
+    "soc": "StateOfChargeBMS",
+    "charged": "CEC_CumulativeEnergyCharged",
+    "discharged": "CED_CumulativeEnergyDischarged",
+    "current": "BatteryCurrent",
+    "temperature": "BatteryMaxTemperature",
+}
+STATE_ROLES = ("charging", "rapid_port", "normal_port", "speed", "relay")
+
+MOVING_SPEED = 1.0  # km/h
+MIN_SEGMENT_SECONDS = 60
+GAP_SECONDS = DEFAULT_TOLERANCE
+
+
+def _runs(states, times, gap):
+    """(first index, last index) of each run of equal states not interrupted by a gap"""
+    breaks = np.flatnonzero((states[1:] != states[:-1]) | (np.diff(times) > gap)) + 1
+    return np.r_[0, breaks], np.r_[breaks, len(states)] - 1
+
+
+def classify(times, signals, gap=GAP_SECONDS, min_seconds=MIN_SEGMENT_SECONDS):
+    """Segments [(kind, start, end)] of aligned state signals ({role: values at `times`})"""
+    if not len(times):
+        return []
+    missing = np.full(len(times), np.nan)
+    charging, rapid, normal, speed, relay = (signals.get(role, missing) for role in STATE_ROLES)
+    with np.errstate(invalid="ignore"):
+        plugged = (charging > 0.5) if "charging" in signals else (rapid > 0.5) | (normal > 0.5)
+        ready = (relay > 0.5) if "relay" in signals else speed > MOVING_SPEED
+        states = np.where(plugged, np.where(rapid > 0.5, KINDS.index(DC_CHARGE), KINDS.index(AC_CHARGE)),
+                          np.where(ready | (speed > MOVING_SPEED), KINDS.index(TRIP), KINDS.index(IDLE)))
+    known = np.zeros(len(times), dtype=bool)
+    for values in signals.values():
+        known |= np.isfinite(values)
+    states[~known] = UNKNOWN
+
+    # Merge short runs (a stop at a light, a relay blip) into the run before them
+    firsts, lasts = _runs(states, times, gap)
+    short = (times[lasts] - times[firsts] < min_seconds) & (states[firsts] != UNKNOWN)
+    short[0] = False
+    contiguous = np.r_[False, times[firsts[1:]] - times[lasts[:-1]] <= gap]
+    for run in np.flatnonzero(short & contiguous & (states[np.maximum(firsts - 1, 0)] != UNKNOWN)):
+        states[firsts[run]:lasts[run] + 1] = states[firsts[run] - 1]
+
+    firsts, lasts = _runs(states, times, gap)
+    keep = (states[firsts] != UNKNOWN) & (times[lasts] - times[firsts] >= min_seconds)
+    return [(KINDS[states[first]], float(times[first]), float(times[last]))
+            for first, last in zip(firsts[keep], lasts[keep])]
+
+
+def _first_last_max(times, values, starts, ends):
+    """First, last and largest value of a signal within each [start, end]; NaN where empty"""
+    lo = np.searchsorted(times, starts, side="left")
+    hi = np.searchsorted(times, ends, side="right")
+    result = np.full((3, len(starts)), np.nan)
+    nonempty = lo < hi
+    if not nonempty.any():
+        return result
+    values = np.asarray(values, dtype=np.float64)
+    result[0, nonempty] = values[lo[nonempty]]
+    result[1, nonempty] = values[hi[nonempty] - 1]
+    # fmax over [lo, hi) of each segment; the odd reductions span the gaps between segments
+    bounds = np.column_stack([lo[nonempty], hi[nonempty]]).ravel()
+    result[2, nonempty] = np.fmax.reduceat(np.r_[values, np.nan], bounds)[::2]
+    return result
+
+
+def summarize(segments, read):
+    """Segment dicts with summaries; `read(name)` returns (times, values) covering the segments"""
+    if not segments:
+        return []
+    starts = np.array([start for _, start, _ in segments])
+    ends = np.array([end for _, _, end in segments])
+    stats = {}
+    for role in ("soc", "charged", "discharged", "current", "temperature"):
+        times, values = read(SIGNALS[role])
+        if role == "current":
+            values = np.abs(values)
+        stats[role] = _first_last_max(np.asarray(times), values, starts, ends)
+
+    def number(value, digits=3):
+        return None if value != value else round(float(value), digits)
+
+    result = []
+    for i, (kind, start, end) in enumerate(segments):
+        result.append({
+            "id": str(int(round(start * 1000))),
+            "kind": kind,
+            "start": start,
+            "end": end,
+            "duration": end - start,
+            "start_soc": number(stats["soc"][0, i]),
+            "end_soc": number(stats["soc"][1, i]),
+            "energy_charged_kwh": number(stats["charged"][1, i] - stats["charged"][0, i]),
+            "energy_discharged_kwh": number(stats["discharged"][1, i] - stats["discharged"][0, i]),
+            "peak_current": number(stats["current"][2, i]),
+            "max_temperature": number(stats["temperature"][2, i]),
+        })
+    return result
+
+
+class SegmentIndex:
+    def __init__(self, signal_store):
+        self.signal_store = signal_store
+        self._loaded = {}  # vehicle -> (mtime_ns, segments, {kind or None: (starts, ends, positions)})
+
+    def _path(self, vehicle):
+        return os.path.join(self.signal_store.root, _check_name(vehicle), "segments.json")
+
+    def _stored(self, vehicle):
+        try:
+            with open(self._path(vehicle)) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return []
+        return data["segments"] if data.get("version") == SEGMENT_VERSION else []
+
+    def update(self, vehicle, since=None):
+        """Reclassify from the last stored segment (or `since`, if earlier) onwards"""
+        segments = self._stored(vehicle)
+        redo = segments[-1]["start"] if segments else None
+        if since is not None and redo is not None and since < redo:
+            # A late older log: also redo the segments it may touch
+            redo = min([since] + [s["start"] for s in segments if s["end"] >= since - GAP_SECONDS])
+        kept = [s for s in segments if redo is None or s["start"] < redo]
+
+        stored = set(self.signal_store.signals(vehicle))
+        data = {role: self.signal_store.read(vehicle, SIGNALS[role], redo)
+                for role in STATE_ROLES if SIGNALS[role] in stored}
+        if not data:
+            return kept
+        grid = np.unique(np.concatenate([np.asarray(t) for t, _ in data.values()]))
+        aligned = {role: resample(t, v, grid, "previous", GAP_SECONDS) for role, (t, v) in data.items()}
+        found = classify(grid, aligned)
+
+        def read(name):
+            if name not in stored:
+                empty = np.zeros(0)
+                return empty, empty
+            return self.signal_store.read(vehicle, name, found[0][1], found[-1][2])
+
+        segments = kept + summarize(found, read)
+        os.makedirs(os.path.dirname(self._path(vehicle)), exist_ok=True)
+        _write_json(self._path(vehicle), {"version": SEGMENT_VERSION, "segments": segments})
+        return segments
+
+    def _index(self, vehicle):
+        """Segments plus (starts, ends, positions) arrays per kind, reloaded when the file changes"""
+        try:
+            mtime = os.stat(self._path(vehicle)).st_mtime_ns
+        except FileNotFoundError:
+            return [], {}
+        cached = self._loaded.get(vehicle)
+        if cached is None or cached[0] != mtime:
+            segments = self._stored(vehicle)
+            by_kind = {}
+            for kind in (None,) + KINDS:
+                positions = np.array([i for i, s in enumerate(segments) if kind in (None, s["kind"])], dtype=int)
+                by_kind[kind] = (np.array([segments[i]["start"] for i in positions], dtype=float),
+                                 np.array([segments[i]["end"] for i in positions], dtype=float), positions)
+            cached = self._loaded[vehicle] = (mtime, segments, by_kind)
+        return cached[1], cached[2]
+
+    def query(self, vehicle, kind=None, start=None, end=None, last=None):
+        """Segments (of a kind) overlapping [start, end], oldest first; `last` keeps the newest N"""
+        if kind is not None and kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        segments, by_kind = self._index(vehicle)
+        if not segments:
+            return []
+        starts, ends, positions = by_kind[kind]
+        lo = 0 if start is None else int(np.searchsorted(ends, start, side="left"))
+        hi = len(starts) if end is None else int(np.searchsorted(starts, end, side="right"))
+        if last is not None:
+            lo = max(lo, hi - last)
+        return [segments[i] for i in positions[lo:hi]]
+
+    def get(self, vehicle, segment_id):
+        """The segment with this ID, or None"""
+        try:
+            start = int(segment_id) / 1000
+        except ValueError:
+            return None
+        segments, by_kind = self._index(vehicle)
+        if not segments:
+            return None
+        starts, _, positions = by_kind[None]
+        i = int(np.searchsorted(starts, start - 0.0005))
+        if i < len(starts) and segments[positions[i]]["id"] == segment_id:
+            return segments[positions[i]]
+        return None
@@ -0,0 +1,226 @@
+"""Binary response formats for the metrics API.
+
+JSON stays the default. Clients that ask for it get one of:
+
+- "arrow": an Arrow IPC stream (application/vnd.apache.arrow.stream) in long
+  format, one row per sample with columns metric (dictionary encoded), t,
+  values and, for rolled-up series, min/max/mean/last/count.
+- "packed": typed arrays a browser can wrap without parsing
+  (application/x-ev-series). The stream starts with MAGIC, followed by
+  blocks of: uint32 length of the JSON header that follows (space padded to
+  an 8 byte boundary), then the header's fields back to back as little-endian arrays.
+  The first block only carries the response metadata ({"meta": {...}}),
+  every other one a chunk of one metric ({"name", "count", "fields":
+  [[field, dtype], ...]}, plus scalar details such as raw_count on the
+  metric's first chunk). Chunks of the same metric are concatenated.
+
+The format is chosen with ?format= or the Accept header. Values are
+float64 unless ?dtype=float32; times are always float64. Series are
+streamed in chunks of CHUNK_SAMPLES and compressed with zstd or gzip
+according to Accept-Encoding (zstd needs the zstandard package).
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+from flask import Response
+
+FORMATS = ("json", "arrow", "packed")
+MIMETYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "packed": "application/x-ev-series",
+}
+DTYPES = ("float32", "float64")
+MAGIC = b"EVS1"
+CHUNK_SAMPLES = 65536
+GZIP_LEVEL = 1  # higher levels barely shrink float arrays but cost several times the CPU
+ZSTD_LEVEL = 3
+TIME_FIELD = "times"
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def negotiate_format(request):
+    """Requested response format; raises ValueError for an unknown ?format="""
+    fmt = request.args.get("format")
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return fmt
+    best = request.accept_mimetypes.best_match(
+        ["application/json"] + list(MIMETYPES.values()), default="application/json")
+    for name, mimetype in MIMETYPES.items():
+        if best == mimetype:
+            return name
+    return "json"
+
+
+def negotiate_encoding(request):
+    """'zstd', 'gzip' or None, from the Accept-Encoding header"""
+    accepted = request.accept_encodings
+    if zstandard is not None and accepted.quality("zstd") > 0:
+        return "zstd"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def value_dtype(request):
+    dtype = request.args.get("dtype", "float64")
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+    return np.dtype(dtype)
+
+
+def json_ready(series):
+    """The series dict with arrays turned into lists, for jsonify"""
+    return {name: {field: data.tolist() if hasattr(data, "tolist") else data
+                   for field, data in fields.items()}
+            for name, fields in series.items()}
+
+
+def _split(fields):
+    """(array fields, scalar details) of one metric"""
+    count = len(fields[TIME_FIELD])
+    arrays, details = {}, {}
+    for field, data in fields.items():
+        if isinstance(data, (list, np.ndarray)) and len(data) == count:
+            arrays[field] = np.asarray(data)
+        else:
+            details[field] = data
+    return arrays, details
+
+
+def _field_dtype(field, data, dtype):
+    if field == TIME_FIELD:
+        return np.dtype("<f8")
+    if data.dtype.kind in "iub":
+        return np.dtype("<i4")
+    return dtype.newbyteorder("<")
+
+
+def iter_packed(series, meta, dtype=np.dtype("float64")):
+    """Yield the packed encoding of a {metric: {field: array}} dict"""
+    offset = 0
+
+    def block(header, arrays=()):
+        # Pad the header so the arrays start 8-byte aligned within the stream
+        nonlocal offset
+        raw = json.dumps(header).encode()
+        padding = -(offset + 4 + len(raw)) % 8
+        parts = [struct.pack("<I", len(raw) + padding), raw, b" " * padding]
+        parts.extend(array.tobytes() for array in arrays)
+        data = b"".join(parts)
+        offset += len(data)
+        return data
+
+    yield MAGIC
+    offset = len(MAGIC)
+    yield block({"meta": meta})
+    for name, fields in series.items():
+        arrays, details = _split(fields)
+        dtypes = {field: _field_dtype(field, data, dtype) for field, data in arrays.items()}
+        # 8-byte fields first, so every array stays aligned to its own item size
+        arrays = dict(sorted(arrays.items(), key=lambda item: -dtypes[item[0]].itemsize))
+        count = len(arrays[TIME_FIELD])
+        for first in range(0, max(count, 1), CHUNK_SAMPLES):
+            chunk = [arrays[field][first:first + CHUNK_SAMPLES].astype(dtypes[field], copy=False)
+                     for field in arrays]
+            header = {"name": name, "count": len(chunk[0]),
+                      "fields": [[field, dtypes[field].str[1:]] for field in arrays]}
+            if first == 0:
+                header.update(details)
+            yield block(header, chunk)
+
+
+class _Sink:
+    """File-like object collecting what the Arrow writer produces"""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_arrow(series, meta, dtype=np.dtype("float64")):
+    """Yield an Arrow IPC stream of a {metric: {field: array}} dict in long format"""
+    import pyarrow as pa
+
+    names = list(series)
+    split = {name: _split(fields) for name, fields in series.items()}
+    columns = {}
+    for arrays, _ in split.values():
+        for field, data in arrays.items():
+            if field not in columns:
+                columns[field] = pa.from_numpy_dtype(_field_dtype(field, data, dtype))
+    columns.pop(TIME_FIELD, None)
+    metric_type = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema(
+        [pa.field("metric", metric_type), pa.field("t", pa.float64())]
+        + [pa.field(field, arrow_type) for field, arrow_type in columns.items()],
+        metadata={"meta": json.dumps(meta),
+                  "details": json.dumps({name: details for name, (_, details) in split.items()})})
+    dictionary = pa.array(names, pa.string())
+
+    sink = _Sink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for index, name in enumerate(names):
+            arrays, _ = split[name]
+            count = len(arrays[TIME_FIELD])
+            for first in range(0, count, CHUNK_SAMPLES):
+                rows = min(CHUNK_SAMPLES, count - first)
+                batch = [pa.DictionaryArray.from_arrays(np.full(rows, index, dtype=np.int32), dictionary),
+                         pa.array(arrays[TIME_FIELD][first:first + rows].astype(np.float64, copy=False))]
+                for field, arrow_type in columns.items():
+                    if field in arrays:
+                        data = arrays[field][first:first + rows]
+                        batch.append(pa.array(data.astype(arrow_type.to_pandas_dtype(), copy=False)))
+                    else:
+                        batch.append(pa.nulls(rows, arrow_type))
+                writer.write_batch(pa.RecordBatch.from_arrays(batch, schema=schema))
+                yield sink.drain()
+    yield sink.drain()
+
+
+def iter_compressed(chunks, encoding):
+    """Compress a stream of byte chunks with zstd or gzip as they are produced"""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def series_response(series, meta, fmt, encoding=None, dtype=np.dtype("float64")):
+    """Streamed Flask response with `series` in a binary format ("arrow" or "packed")"""
+    chunks = iter_arrow(series, meta, dtype) if fmt == "arrow" else iter_packed(series, meta, dtype)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(iter_compressed(chunks, encoding), mimetype=MIMETYPES[fmt], headers=headers)
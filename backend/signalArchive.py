@@ -0,0 +1,164 @@
+"""Compressed, append-only archive of decoded signals.
+
+The archive keeps the same (vehicle, signal) series as SignalStore, but as
+signalCodec blocks: raw DBC integers plus delta-of-delta timestamps instead
+of 16-byte float64 records. A JSON index lists each block's time range,
+byte offset and length, so a time-windowed read seeks straight to the
+blocks it needs and decodes only those:
+
+    <root>/<vehicle>/<signal>.sgc
+    <root>/<vehicle>/<signal>.sgc.json
+
+Reads return (times, values) like SignalStore.read. archive_vehicle copies
+what a SignalStore holds beyond the archive's end, taking each signal's
+scale and offset from the DBC.
+
+Usage: python signalArchive.py --vehicle ioniq5 \
+           --dbc mf42csv/dbc_files/can1-hyundai-kia-uds-v2.4.dbc [--resolution 0.001]
+"""
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+
+from signalCodec import BLOCK_SAMPLES, decode_block, encode
+from signalStore import SignalStore, _check_name, _write_json
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.environ.get(
+    "SIGNAL_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "signal_archive")
+)
+
+
+def dbc_scales(database):
+    """{signal name: (scale, offset)} for signals defined with one scale and offset"""
+    scales = {}
+    for s, name in enumerate(database.sig_names):
+        pair = (float(database.sig_scale[s]), float(database.sig_offset[s]))
+        scales[name] = pair if scales.get(name, pair) == pair else None
+    return {name: pair for name, pair in scales.items() if pair is not None}
+
+
+class SignalArchive:
+    def __init__(self, root=ARCHIVE_DIR, block_samples=BLOCK_SAMPLES):
+        self.root = root
+        self.block_samples = block_samples
+
+    def _paths(self, vehicle, signal):
+        base = os.path.join(self.root, _check_name(vehicle), _check_name(signal))
+        return base + ".sgc", base + ".sgc.json"
+
+    def index(self, vehicle, signal):
+        """Blocks of a signal: [{"start", "end", "count", "offset", "length"}, ...]"""
+        _, index_path = self._paths(vehicle, signal)
+        try:
+            with open(index_path) as f:
+                return json.load(f)["blocks"]
+        except FileNotFoundError:
+            return []
+
+    def append(self, vehicle, signal, times, values, scale=None, offset=0.0, resolution=None):
+        """Append samples after the archived end (the archive is append-only)"""
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if not len(times):
+            return
+        if np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+        data_path, index_path = self._paths(vehicle, signal)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        blocks = self.index(vehicle, signal)
+        if blocks and times[0] < blocks[-1]["end"]:
+            raise ValueError(f"{signal}: samples before the archived end {blocks[-1]['end']}")
+        stored = blocks[-1]["offset"] + blocks[-1]["length"] if blocks else 0
+        with open(data_path, "ab") as f:
+            # The index is authoritative: drop bytes of an interrupted append
+            f.truncate(stored)
+            f.seek(0, os.SEEK_END)
+            for start, end, count, data in encode(times, values, scale, offset, resolution,
+                                                  self.block_samples):
+                f.write(data)
+                blocks.append({"start": start, "end": end, "count": count,
+                               "offset": stored, "length": len(data)})
+                stored += len(data)
+        _write_json(index_path, {"blocks": blocks})
+
+    def read(self, vehicle, signal, start=None, end=None):
+        """Return (times, values) for samples with start <= t <= end"""
+        data_path, _ = self._paths(vehicle, signal)
+        blocks = self.index(vehicle, signal)
+        wanted = [b for b in blocks
+                  if (start is None or b["end"] >= start) and (end is None or b["start"] <= end)]
+        if not wanted:
+            empty = np.zeros(0)
+            return empty, empty
+        parts = []
+        with open(data_path, "rb") as f:
+            for block in wanted:
+                f.seek(block["offset"])
+                parts.append(decode_block(f.read(block["length"])))
+        times = np.concatenate([t for t, _ in parts])
+        values = np.concatenate([v for _, v in parts])
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+        return times[lo:hi], values[lo:hi]
+
+    def signals(self, vehicle):
+        directory = os.path.join(self.root, _check_name(vehicle))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f[:-len(".sgc.json")] for f in os.listdir(directory) if f.endswith(".sgc.json"))
+
+    def time_range(self, vehicle, signal):
+        blocks = self.index(vehicle, signal)
+        if not blocks:
+            return None
+        return blocks[0]["start"], blocks[-1]["end"]
+
+    def size(self, vehicle, signal):
+        blocks = self.index(vehicle, signal)
+        return blocks[-1]["offset"] + blocks[-1]["length"] if blocks else 0
+
+
+def archive_vehicle(signal_store, archive, vehicle, database, resolution=None):
+    """Append whatever the signal store holds after each signal's archived end.
+
+    Returns {"samples", "store_bytes", "archive_bytes"} for the appended data.
+    """
+    scales = dbc_scales(database)
+    samples = archive_bytes = 0
+    for signal in signal_store.signals(vehicle):
+        time_range = archive.time_range(vehicle, signal)
+        times, values = signal_store.read(vehicle, signal)
+        if time_range is not None:
+            first = int(np.searchsorted(times, time_range[1], side="right"))
+            times, values = times[first:], values[first:]
+        if not len(times):
+            continue
+        before = archive.size(vehicle, signal)
+        scale, offset = scales.get(signal, (None, 0.0))
+        archive.append(vehicle, signal, times, values, scale, offset, resolution)
+        samples += len(times)
+        archive_bytes += archive.size(vehicle, signal) - before
+    store_bytes = samples * 16  # SignalStore keeps (t, v) float64 records
+    log.info("Archived %d samples of %s: %d bytes instead of %d (%.1fx)", samples, vehicle,
+             archive_bytes, store_bytes, store_bytes / archive_bytes if archive_bytes else 0)
+    return {"samples": samples, "store_bytes": store_bytes, "archive_bytes": archive_bytes}
+
+
+if __name__ == "__main__":
+    from dbcCache import load_database
+    from instrumentation import configure_logging
+
+    parser = argparse.ArgumentParser(description="Copy a vehicle's decoded signals into the compressed archive")
+    parser.add_argument("--vehicle", required=True, help="Vehicle ID in the signal store")
+    parser.add_argument("--dbc", required=True, help="DBC the signals were decoded with")
+    parser.add_argument("--resolution", type=float, default=None,
+                        help="Store timestamps as ticks of this many seconds (default: lossless)")
+    args = parser.parse_args()
+    configure_logging()
+    archive_vehicle(SignalStore(), SignalArchive(), args.vehicle, load_database(args.dbc), args.resolution)
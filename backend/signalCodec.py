@@ -0,0 +1,158 @@
+"""Compact block encoding of one signal's (times, values).
+
+A block holds up to BLOCK_SAMPLES samples and is encoded and decoded with
+whole-array NumPy operations:
+
+- Times: delta-of-delta of the float64 bit patterns (lossless; regular
+  sampling gives tiny second differences), or of integer ticks of
+  `resolution` seconds when a resolution is given (lossy within half a tick).
+- Values: when every value is exactly raw * scale + offset for the DBC
+  scale and offset, the raw integers are stored, either relative to the
+  block minimum or as deltas, whichever is narrower. Anything else is
+  stored Gorilla-style as the XOR of consecutive float64 bit patterns,
+  with the block's common trailing zero bits dropped.
+
+Every integer stream is zigzag-encoded where signed and bit-packed at the
+narrowest width that holds the block's largest value, so an 8-bit DBC
+signal takes at most 8 bits per sample, and usually far less.
+"""
+import struct
+
+import numpy as np
+
+BLOCK_SAMPLES = 4096
+
+TIME_BITS, TIME_TICKS = 0, 1
+VALUE_FOR, VALUE_DELTA, VALUE_XOR = 0, 1, 2
+
+# count, time mode, time width, value mode, value width, value shift,
+# first time, first time delta, value base, time bytes, value bytes,
+# resolution, scale, offset
+HEADER = struct.Struct("<IBBBBBqqqIIddd")
+
+
+def zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values):
+    values = values.view(np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -((values & np.uint64(1)).view(np.int64))
+
+
+def _width(values):
+    return int(values.max()).bit_length() if len(values) else 0
+
+
+def bitpack(values, width):
+    """Pack unsigned integers into `width` bits each"""
+    if width == 0 or not len(values):
+        return b""
+    bits = (values[:, None] >> np.arange(width, dtype=np.uint64)) & np.uint64(1)
+    return np.packbits(bits.astype(np.uint8).ravel(), bitorder="little").tobytes()
+
+
+def bitunpack(data, count, width):
+    if width == 0 or count == 0:
+        return np.zeros(count, dtype=np.uint64)
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count * width, bitorder="little")
+    bits = bits.reshape(count, width).astype(np.uint64) << np.arange(width, dtype=np.uint64)
+    return np.bitwise_or.reduce(bits, axis=1)
+
+
+def _raw_integers(values, scale, offset):
+    """int64 raw values if value == raw * scale + offset exactly for every sample, else None"""
+    if not scale:
+        return None
+    with np.errstate(all="ignore"):
+        raw = np.round((values - offset) / scale)
+    if not np.isfinite(raw).all() or (len(raw) and np.abs(raw).max() >= 2 ** 52):
+        return None
+    if not np.array_equal((raw * scale + offset).view(np.uint64), values.view(np.uint64)):
+        return None
+    return raw.astype(np.int64)
+
+
+def encode_block(times, values, scale=None, offset=0.0, resolution=None):
+    """Encode time-sorted float64 arrays (one block) to bytes"""
+    times = np.ascontiguousarray(times, dtype=np.float64)
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    count = len(times)
+
+    if resolution:
+        time_mode, ints = TIME_TICKS, np.round(times / resolution).astype(np.int64)
+    else:
+        time_mode, ints = TIME_BITS, times.view(np.int64)
+    deltas = np.diff(ints)
+    first_delta = int(deltas[0]) if len(deltas) else 0
+    time_stream = zigzag(np.diff(deltas))
+    time_width = _width(time_stream)
+
+    raw = _raw_integers(values, scale, offset)
+    shift = 0
+    if raw is not None:
+        relative = (raw - raw.min()).view(np.uint64) if count else raw.view(np.uint64)
+        delta = zigzag(np.diff(raw))
+        if _width(delta) < _width(relative):
+            value_mode, value_stream, base = VALUE_DELTA, delta, int(raw[0])
+        else:
+            value_mode, value_stream, base = VALUE_FOR, relative, int(raw.min()) if count else 0
+    else:
+        bits = values.view(np.uint64)
+        value_stream = bits[1:] ^ bits[:-1]
+        common = int(np.bitwise_or.reduce(value_stream)) if len(value_stream) else 0
+        shift = (common & -common).bit_length() - 1 if common else 0
+        value_stream = value_stream >> np.uint64(shift)
+        value_mode, base = VALUE_XOR, int(bits[0].view(np.int64)) if count else 0
+    value_width = _width(value_stream)
+
+    time_bytes = bitpack(time_stream, time_width)
+    value_bytes = bitpack(value_stream, value_width)
+    header = HEADER.pack(count, time_mode, time_width, value_mode, value_width, shift,
+                         int(ints[0]) if count else 0, first_delta, base,
+                         len(time_bytes), len(value_bytes),
+                         resolution or 0.0, scale or 0.0, offset or 0.0)
+    return header + time_bytes + value_bytes
+
+
+def decode_block(data):
+    """(times, values) float64 arrays of an encoded block"""
+    (count, time_mode, time_width, value_mode, value_width, shift, first_time, first_delta, base,
+     time_length, value_length, resolution, scale, offset) = HEADER.unpack_from(data)
+    position = HEADER.size
+    time_stream = bitunpack(data[position:position + time_length], max(count - 2, 0), time_width)
+    position += time_length
+    value_count = count if value_mode == VALUE_FOR else max(count - 1, 0)
+    value_stream = bitunpack(data[position:position + value_length], value_count, value_width)
+
+    ints = np.empty(count, dtype=np.int64)
+    if count:
+        ints[0] = first_time
+    if count > 1:
+        deltas = np.cumsum(np.r_[np.int64(first_delta), unzigzag(time_stream)])
+        ints[1:] = first_time + np.cumsum(deltas)
+    times = ints * resolution if time_mode == TIME_TICKS else ints.view(np.float64)
+
+    if value_mode == VALUE_XOR:
+        bits = np.empty(count, dtype=np.uint64)
+        if count:
+            bits[0] = np.int64(base).view(np.uint64)
+            bits[1:] = value_stream << np.uint64(shift)
+        values = np.bitwise_xor.accumulate(bits).view(np.float64)
+    else:
+        if value_mode == VALUE_DELTA:
+            raw = np.cumsum(np.r_[np.int64(base), unzigzag(value_stream)]) if count else np.zeros(0, np.int64)
+        else:
+            raw = value_stream.view(np.int64) + base
+        values = raw * scale + offset
+    return times, values
+
+
+def encode(times, values, scale=None, offset=0.0, resolution=None, block_samples=BLOCK_SAMPLES):
+    """Yield (first time, last time, count, encoded bytes) per block"""
+    for first in range(0, len(times), block_samples):
+        block_times = times[first:first + block_samples]
+        block_values = values[first:first + block_samples]
+        yield (float(block_times[0]), float(block_times[-1]), len(block_times),
+               encode_block(block_times, block_values, scale, offset, resolution))
@@ -0,0 +1,126 @@
+"""Time-aligned queries over the signal store.
+
+query() slices every requested signal to a time window and samples it on
+one shared time grid, so signals from different UDS responses (e.g. m257
+and m261 of the same request ID) come back as columns of one frame. The
+grid is either a fixed rate, the timestamps of one signal (merge-asof onto
+it), or the union of all timestamps. Every step is a vectorized
+searchsorted over the sorted per-signal arrays.
+
+Fill policies, for a grid time g:
+- "previous": last sample at or before g (sample and hold)
+- "nearest": closest sample on either side
+- "linear": linear interpolation between the samples around g
+- "mean": mean of the samples in [g, g + step); needs a rate
+Samples further than `tolerance` seconds from g (or gaps wider than it,
+for linear) give NaN.
+"""
+import numpy as np
+
+FILLS = ("previous", "nearest", "linear", "mean")
+DEFAULT_TOLERANCE = 60.0  # seconds
+MAX_ROWS = 2_000_000
+
+
+def _asof_index(times, grid):
+    """Index of the last sample at or before each grid time (-1 if none)"""
+    return np.searchsorted(times, grid, side="right") - 1
+
+
+def resample(times, values, grid, fill="previous", tolerance=DEFAULT_TOLERANCE, step=None):
+    """Values of one time-sorted signal at the times of `grid`"""
+    if fill not in FILLS:
+        raise ValueError(f"fill must be one of {', '.join(FILLS)}")
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(grid), np.nan)
+    if not len(times) or not len(grid):
+        return result
+    tolerance = np.inf if tolerance is None else tolerance
+
+    if fill == "mean":
+        if not step:
+            raise ValueError("fill=mean needs a rate")
+        edges = np.searchsorted(times, np.r_[grid, grid[-1] + step], side="left")
+        counts = np.diff(edges)
+        cumulative = np.r_[0.0, np.cumsum(values)]
+        sums = cumulative[edges[1:]] - cumulative[edges[:-1]]
+        filled = counts > 0
+        result[filled] = sums[filled] / counts[filled]
+        return result
+
+    before = _asof_index(times, grid)
+    if fill == "previous":
+        found = before >= 0
+        found[found] &= grid[found] - times[before[found]] <= tolerance
+        result[found] = values[before[found]]
+        return result
+
+    after = np.minimum(before + 1, len(times) - 1)
+    clipped = np.maximum(before, 0)
+    if fill == "nearest":
+        use_after = (before < 0) | (np.abs(times[after] - grid) < np.abs(grid - times[clipped]))
+        index = np.where(use_after, after, clipped)
+        found = np.abs(times[index] - grid) <= tolerance
+        result[found] = values[index[found]]
+        return result
+
+    # linear: only between two samples at most `tolerance` apart, or on an exact hit
+    exact = (before >= 0) & (times[clipped] == grid)
+    inside = (before >= 0) & (before < len(times) - 1) & (times[after] - times[clipped] <= tolerance)
+    result[inside] = np.interp(grid[inside], times, values)
+    result[exact] = values[clipped[exact]]
+    return result
+
+
+def time_grid(start, end, rate):
+    """Grid times start, start + 1/rate, ... up to end"""
+    step = 1.0 / rate
+    count = int(np.floor((end - start) / step)) + 1
+    if count > MAX_ROWS:
+        raise ValueError(f"Query would return {count:,} rows (limit {MAX_ROWS:,}); lower the rate")
+    return start + np.arange(max(count, 0)) * step
+
+
+def query(signal_store, vehicle, signals, start=None, end=None, rate=None, on=None,
+          fill="previous", tolerance=DEFAULT_TOLERANCE):
+    """Aligned frame {"t": grid, signal: values, ...} of several signals.
+
+    The grid is `rate` samples per second over [start, end], else the
+    timestamps of signal `on`, else the union of all timestamps. A missing
+    start/end defaults to the span covered by the signals.
+    """
+    if fill not in FILLS:
+        raise ValueError(f"fill must be one of {', '.join(FILLS)}")
+    if rate is not None and rate <= 0:
+        raise ValueError("rate must be positive")
+    if fill == "mean" and rate is None:
+        raise ValueError("fill=mean needs a rate")
+    if start is None or end is None:
+        ranges = [r for r in (signal_store.time_range(vehicle, name) for name in signals) if r]
+        if not ranges:
+            return {"t": np.zeros(0), **{name: np.zeros(0) for name in signals}}
+        start = min(r[0] for r in ranges) if start is None else start
+        end = max(r[1] for r in ranges) if end is None else end
+
+    # Read a tolerance beyond the window so edge grid points can see their neighbours
+    read_start = None if tolerance is None else start - tolerance
+    read_end = None if tolerance is None else end + tolerance
+    data = {name: signal_store.read(vehicle, name, read_start, read_end) for name in signals}
+
+    if rate is not None:
+        grid = time_grid(start, end, rate)
+    elif on is not None:
+        times = data[on][0] if on in data else signal_store.read(vehicle, on, start, end)[0]
+        grid = np.asarray(times[(times >= start) & (times <= end)], dtype=np.float64)
+    else:
+        grid = np.unique(np.concatenate(
+            [times[(times >= start) & (times <= end)] for times, _ in data.values()] or [np.zeros(0)]))
+    if len(grid) > MAX_ROWS:
+        raise ValueError(f"Query would return {len(grid):,} rows (limit {MAX_ROWS:,}); set a rate")
+
+    step = 1.0 / rate if rate else None
+    frame = {"t": grid}
+    for name, (times, values) in data.items():
+        frame[name] = resample(times, values, grid, fill, tolerance, step)
+    return frame
@@ -0,0 +1,406 @@
+"""Memory-mapped time-series store for decoded signals.
+
+Every (vehicle, signal) pair is one file of (t, v) float64 records, plus a
+small JSON index listing the time range and row offset of each appended
+segment:
+
+    <root>/<vehicle>/<signal>.bin
+    <root>/<vehicle>/<signal>.idx.json
+
+Each append writes one new segment, sorted by time and holding one sample
+per timestamp, at the end of the file; nothing stored is rewritten. Segments
+may arrive out of time order (a backfilled older log) or overlap (channel
+groups decoded one after the other, a log stored twice). Reads copy across
+the former and merge the latter, the sample appended last winning where
+timestamps repeat; compact() merges overlapping segments for good, once
+per log rather than per chunk.
+
+Reads return NumPy views of the memory-mapped file and binary-search the
+timestamps, so a time-windowed query only touches the pages it needs.
+Rewrites (removal, or compaction once most records are dead) go to a new
+data file that the index then points to, so a reader never sees its
+mapped file change underneath it.
+
+logs.json records the logs stored for a vehicle with their time range, so
+a log is stored once and can be replaced as a whole. <vehicle>/generation
+holds a token that ingest renews when it is done with a vehicle, so every
+process can tell when derived responses went stale.
+
+Writes to a vehicle hold its writer lock, an flock on <root>/<vehicle>/.lock,
+so ingest jobs, incremental and fleet ingest never interleave their writes,
+whichever process or node they run in. Ingest holds it across a whole log
+(writer() is reentrant within a thread); reads never take it.
+"""
+import contextlib
+import functools
+import json
+import os
+import re
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("v", "<f8")])
+NAME_RE = re.compile(r"^[\w.-]+$")
+
+STORE_DIR = os.environ.get(
+    "SIGNAL_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "signal_store")
+)
+
+
+def _check_name(name):
+    if not NAME_RE.match(name) or name.startswith("."):
+        raise ValueError(f"Invalid name: {name}")
+    return name
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(json.dumps(data))  # json.dump would use the pure-Python encoder
+    os.replace(tmp_path, path)
+
+
+def _unique_times(records):
+    """Sorted records with one sample per timestamp; the last one of each run of equal times wins"""
+    keep = np.r_[records["t"][1:] != records["t"][:-1], True]
+    return records if keep.all() else records[keep]
+
+
+def _merge(parts):
+    """Sorted, de-duplicated records of several sorted parts; later parts win on equal times"""
+    merged = np.concatenate(parts) if len(parts) > 1 else parts[0]
+    return _unique_times(merged[np.argsort(merged["t"], kind="stable")])
+
+
+def _stored_count(segments):
+    """Records in the data file, including any left behind by compaction"""
+    return max((s["offset"] + s["count"] for s in segments), default=0)
+
+
+def _disjoint(segments):
+    """True if the segments, ordered by start time, do not overlap"""
+    ordered = sorted(segments, key=lambda s: s["start"])
+    return all(b["start"] > a["end"] for a, b in zip(ordered, ordered[1:]))
+
+
+def _coalesce(segments):
+    """Join time-ordered segments that also follow each other in the file into one"""
+    joined = []
+    for s in segments:
+        previous = joined[-1] if joined else None
+        if previous and s["offset"] == previous["offset"] + previous["count"] and s["start"] > previous["end"]:
+            joined[-1] = dict(previous, end=s["end"], count=previous["count"] + s["count"])
+        else:
+            joined.append(s)
+    return joined
+
+
+def _window(records, segment, start=None, end=None):
+    """Records of one segment with start <= t <= end"""
+    part = records[segment["offset"]:segment["offset"] + segment["count"]]
+    lo = 0 if start is None else int(np.searchsorted(part["t"], start, side="left"))
+    hi = len(part) if end is None else int(np.searchsorted(part["t"], end, side="right"))
+    return part[lo:hi]
+
+
+def _writes(method):
+    """Run a SignalStore method taking (vehicle, ...) under the vehicle's writer lock"""
+    @functools.wraps(method)
+    def locked(self, vehicle, *args, **kwargs):
+        with self.writer(vehicle):
+            return method(self, vehicle, *args, **kwargs)
+    return locked
+
+
+class SignalStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._maps = {}  # data path -> (size, memmap)
+        self._held = threading.local()  # vehicle -> lock file held by this thread
+
+    @contextlib.contextmanager
+    def writer(self, vehicle):
+        """Hold a vehicle's writer lock; see the module docstring"""
+        held = self._held.__dict__.setdefault("locks", {})
+        if vehicle in held or fcntl is None:
+            yield
+            return
+        directory = os.path.join(self.root, _check_name(vehicle))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+            held[vehicle] = lock_file
+            try:
+                yield
+            finally:
+                del held[vehicle]
+
+    def _paths(self, vehicle, signal):
+        base = os.path.join(self.root, _check_name(vehicle), _check_name(signal))
+        return base + ".bin", base + ".idx.json"
+
+    def _load_index(self, vehicle, signal):
+        """(data path, segments); the data file is <signal>.bin unless a rewrite renamed it"""
+        data_path, index_path = self._paths(vehicle, signal)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return data_path, []
+        if "data" in index:
+            data_path = os.path.join(os.path.dirname(data_path), index["data"])
+        return data_path, index["segments"]
+
+    def index(self, vehicle, signal):
+        """Segments of a signal: [{"start", "end", "offset", "count"}, ...] in file order"""
+        return self._load_index(vehicle, signal)[1]
+
+    def layout(self, vehicle, signal):
+        """(data file name, segments) of a signal; the name changes whenever the file is rewritten"""
+        data_path, segments = self._load_index(vehicle, signal)
+        return os.path.basename(data_path), segments
+
+    def _write_index(self, index_path, segments, data_path):
+        _write_json(index_path, {"segments": segments, "data": os.path.basename(data_path)})
+
+    @_writes
+    def append(self, vehicle, signal, times, values):
+        """Append samples as a new segment; see the module docstring for out-of-order data"""
+        times = np.asarray(times, dtype=np.float64)
+        if not len(times):
+            return
+        records = np.empty(len(times), dtype=RECORD_DTYPE)
+        records["t"] = times
+        records["v"] = values
+        if np.any(times[1:] < times[:-1]):
+            records = records[np.argsort(times, kind="stable")]
+        records = _unique_times(records)
+
+        data_path, segments = self._load_index(vehicle, signal)
+        _, index_path = self._paths(vehicle, signal)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        segments += self._append_parts(data_path, _stored_count(segments), [records])
+        self._write_index(index_path, segments, data_path)
+
+    def _append_parts(self, data_path, stored, parts):
+        """Write sorted parts after the first `stored` records; returns their segments"""
+        segments = []
+        with open(data_path, "ab") as f:
+            # The index is authoritative: drop bytes of an interrupted append
+            f.truncate(stored * RECORD_DTYPE.itemsize)
+            f.seek(0, os.SEEK_END)
+            for part in parts:
+                f.write(part.tobytes())
+                segments.append(self._segment(part, stored))
+                stored += len(part)
+        return segments
+
+    @staticmethod
+    def _segment(records, offset):
+        return {"start": float(records["t"][0]), "end": float(records["t"][-1]),
+                "offset": int(offset), "count": len(records)}
+
+    def _rewrite(self, vehicle, signal, parts, old_path):
+        """Replace a signal's data with the given sorted parts, one segment each, in a new file"""
+        _, index_path = self._paths(vehicle, signal)
+        data_path = os.path.join(os.path.dirname(index_path), f"{signal}.{uuid.uuid4().hex[:12]}.bin")
+        segments = self._append_parts(data_path, 0, [part for part in parts if len(part)])
+        self._write_index(index_path, segments, data_path)
+        # Readers that already opened or mapped the old file keep it until they are done
+        self._maps.pop(old_path, None)
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+
+    @_writes
+    def compact(self, vehicle, signals=None):
+        """Merge the segments that overlap in time; returns the signals that changed.
+
+        Only overlapping segments are merged (the later appended sample
+        winning on equal timestamps) and the result is appended as a new
+        segment, so the cost is that of the overlapping data, not of the
+        whole series. Segments that are merely out of order, like the
+        chunks of a backfilled older log, are just sorted in the index, and
+        segments that follow each other in file and time become one.
+        The file is rewritten once the records left behind outnumber the
+        live ones. Ingest calls this after each log.
+        """
+        changed = []
+        for signal in self.signals(vehicle) if signals is None else signals:
+            records, segments, data_path = self._records(vehicle, signal)
+            if records is None:
+                continue
+            position = {id(s): i for i, s in enumerate(segments)}
+            clusters = []
+            for s in sorted(segments, key=lambda s: s["start"]):
+                if clusters and s["start"] <= clusters[-1][0]:
+                    clusters[-1][0] = max(clusters[-1][0], s["end"])
+                    clusters[-1][1].append(s)
+                else:
+                    clusters.append([s["end"], [s]])
+            merged = [_merge([_window(records, s) for s in sorted(members, key=lambda s: position[id(s)])])
+                      for _, members in clusters if len(members) > 1]
+            kept = [members[0] for _, members in clusters if len(members) == 1]
+            merged_count = sum(len(part) for part in merged)
+            live = sum(s["count"] for s in kept) + merged_count
+            if _stored_count(segments) + merged_count - live > live:
+                # Mostly dead records: write the live ones to a new file in time order
+                parts = sorted([_window(records, s) for s in kept] + merged, key=lambda part: part["t"][0])
+                self._rewrite(vehicle, signal, parts, data_path)
+                changed.append(signal)
+                continue
+            if merged:
+                kept += self._append_parts(data_path, _stored_count(segments), merged)
+            compacted = _coalesce(sorted(kept, key=lambda s: s["start"]))
+            if compacted != segments:
+                self._write_index(self._paths(vehicle, signal)[1], compacted, data_path)
+                changed.append(signal)
+        return changed
+
+    @_writes
+    def remove(self, vehicle, start, end, signals=None):
+        """Delete every sample with start <= t <= end; returns the signals that lost samples"""
+        changed = []
+        for signal in self.signals(vehicle) if signals is None else signals:
+            records, segments, data_path = self._records(vehicle, signal)
+            if records is None or not any(s["end"] >= start and s["start"] <= end for s in segments):
+                continue
+            parts = []
+            for s in segments:
+                part = _window(records, s)
+                lo = int(np.searchsorted(part["t"], start, side="left"))
+                hi = int(np.searchsorted(part["t"], end, side="right"))
+                parts.append(np.concatenate([part[:lo], part[hi:]]) if lo < hi else part)
+            if sum(len(part) for part in parts) == sum(s["count"] for s in segments):
+                continue
+            self._rewrite(vehicle, signal, parts, data_path)
+            changed.append(signal)
+        return changed
+
+    @_writes
+    def append_decoded(self, vehicle, decoded, time_offset=0.0):
+        """Append every signal of a decoded {name: (times, values)} dict.
+
+        `time_offset` turns log-relative timestamps into absolute ones.
+        """
+        for signal, (times, values) in decoded.items():
+            self.append(vehicle, signal, times + time_offset, values)
+
+    def _records(self, vehicle, signal):
+        """(memory-mapped records, segments, data path); records is None for an unknown signal"""
+        for _ in range(2):
+            data_path, segments = self._load_index(vehicle, signal)
+            if not segments:
+                return None, segments, data_path
+            count = _stored_count(segments)
+            cached = self._maps.get(data_path)
+            if cached is not None and cached[0] == count:
+                return cached[1], segments, data_path
+            try:
+                records = np.memmap(data_path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+            except FileNotFoundError:
+                continue  # rewritten since the index was read
+            self._maps[data_path] = (count, records)
+            return records, segments, data_path
+        raise FileNotFoundError(data_path)
+
+    def read(self, vehicle, signal, start=None, end=None):
+        """Return (times, values) for samples with start <= t <= end.
+
+        Views of the mapped file when the window lies in consecutive
+        segments; copies when it spans segments stored out of order, merged
+        ones when they overlap (not compacted yet).
+        """
+        records, segments, _ = self._records(vehicle, signal)
+        if records is None:
+            empty = np.zeros(0)
+            return empty, empty
+        # Narrow to the segments that overlap, then binary-search inside them
+        overlapping = [s for s in segments
+                       if (start is None or s["end"] >= start) and (end is None or s["start"] <= end)]
+        if not overlapping:
+            return records["t"][:0], records["v"][:0]
+        if not _disjoint(overlapping):
+            merged = _merge([_window(records, s, start, end) for s in overlapping])
+            return merged["t"], merged["v"]
+        overlapping.sort(key=lambda s: s["start"])
+        if any(b["offset"] != a["offset"] + a["count"] for a, b in zip(overlapping, overlapping[1:])):
+            window = np.concatenate([_window(records, s, start, end) for s in overlapping])
+            return window["t"], window["v"]
+        first = overlapping[0]["offset"]
+        last = overlapping[-1]["offset"] + overlapping[-1]["count"]
+        times = records["t"][first:last]
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side="right"))
+        window = records[first + lo:first + hi]
+        return window["t"], window["v"]
+
+    def _logs_path(self, vehicle):
+        return os.path.join(self.root, _check_name(vehicle), "logs.json")
+
+    def logs(self, vehicle):
+        """{log ID: info} of the logs whose samples are stored for a vehicle"""
+        try:
+            with open(self._logs_path(vehicle)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @_writes
+    def mark_log(self, vehicle, key, info):
+        """Record a stored log; `info` holds at least its absolute "start" and "end" time"""
+        logs = self.logs(vehicle)
+        logs[key] = info
+        os.makedirs(os.path.dirname(self._logs_path(vehicle)), exist_ok=True)
+        _write_json(self._logs_path(vehicle), logs)
+
+    @_writes
+    def remove_log(self, vehicle, key):
+        """Delete a log's samples (everything in its [start, end]) and forget the log.
+
+        A vehicle's logs do not overlap in time, so the range is the log's.
+        Returns the signals that lost samples.
+        """
+        logs = self.logs(vehicle)
+        info = logs.pop(key, None)
+        if info is None:
+            return []
+        changed = []
+        if info.get("start") is not None:
+            changed = self.remove(vehicle, info["start"], info["end"])
+        _write_json(self._logs_path(vehicle), logs)
+        return changed
+
+    def touch(self, vehicle):
+        """Renew the vehicle's generation token: its data changed"""
+        os.makedirs(os.path.join(self.root, _check_name(vehicle)), exist_ok=True)
+        _write_json(os.path.join(self.root, _check_name(vehicle), "generation"), uuid.uuid4().hex)
+
+    def generation(self, vehicle):
+        """The vehicle's generation token, or None before its first ingest"""
+        try:
+            with open(os.path.join(self.root, _check_name(vehicle), "generation")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def signals(self, vehicle):
+        directory = os.path.join(self.root, _check_name(vehicle))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f[:-len(".idx.json")] for f in os.listdir(directory) if f.endswith(".idx.json"))
+
+    def time_range(self, vehicle, signal):
+        segments = self.index(vehicle, signal)
+        if not segments:
+            return None
+        return min(s["start"] for s in segments), max(s["end"] for s in segments)
@@ -0,0 +1,5 @@
+"""Puts backend/ on sys.path, as the benchmarks' synthetic module does"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
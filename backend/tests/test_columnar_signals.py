@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from columnarSignals import partition_path, read_signals, write_decoded
+
+
+def write_logs(root):
+    # Integral Speed values in log1 (once narrowed to int8), fractional in log2;
+    # SOC only appears in log2
+    write_decoded(pd.DataFrame({"t": [0.0, 1.0], "Speed": [1, 2], "signal_group": ["a", "b"]}),
+                  root, "v", "log1")
+    write_decoded(pd.DataFrame({"t": [2.0, 3.0], "Speed": [1.5, 2.5], "SOC": [50.0, 51.0],
+                                "signal_group": ["a", "a"]}), root, "v", "log2")
+
+
+def test_logs_with_different_value_types_read_as_one_dataset(tmp_path):
+    write_logs(str(tmp_path))
+    df = read_signals(str(tmp_path), ["Speed", "SOC"], vehicle="v")
+    assert df["t"].tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert df["Speed"].tolist() == [1.0, 2.0, 1.5, 2.5]
+    assert df["SOC"].isna().tolist() == [True, True, False, False]
+
+    df = read_signals(str(tmp_path), ["Speed", "SOC"], log="log2")
+    assert df["Speed"].tolist() == [1.5, 2.5]
+    assert df["SOC"].tolist() == [50.0, 51.0]
+
+
+def test_previously_narrowed_log_is_promoted(tmp_path):
+    root = str(tmp_path)
+    write_logs(root)
+    path = partition_path(root, "v", "log0")
+    os.makedirs(os.path.dirname(path))
+    pq.write_table(pa.table({"t": [-1.0], "Speed": pa.array([3], pa.int8())}), path)
+    df = read_signals(root, ["Speed"], vehicle="v")
+    assert df["Speed"].tolist() == [3.0, 1.0, 2.0, 1.5, 2.5]
+    assert df["Speed"].dtype == np.float32
+
+
+def test_missing_column_is_reported(tmp_path):
+    write_logs(str(tmp_path))
+    with pytest.raises(ValueError, match="Nope"):
+        read_signals(str(tmp_path), ["Speed", "Nope"])
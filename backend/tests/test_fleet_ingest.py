@@ -0,0 +1,57 @@
+import datetime
+import os
+
+import numpy as np
+
+import fleetIngest
+from benchmarks.synthetic import HYUNDAI_DBC, synthetic_frames, write_mf4
+from fleetIngest import FleetQueue, scan, work
+from incrementalIngest import manifest_path, pending_files
+from ingestManifest import NEW, Manifest
+from signalStore import SignalStore
+
+
+def write_session(folder, day, seed):
+    os.makedirs(folder)
+    timestamps, can_ids, data = synthetic_frames(2000, seed=seed)
+    start = datetime.datetime(2024, 1, day, tzinfo=datetime.timezone.utc)
+    write_mf4(os.path.join(folder, "00000001.mf4"), timestamps, can_ids, data, start_time=start)
+    return start.timestamp()
+
+
+def test_same_file_name_in_two_folders(tmp_path, monkeypatch):
+    # A CANedge numbers the files of every session from 00000001
+    first = write_session(str(tmp_path / "logs" / "session1"), 1, seed=0)
+    second = write_session(str(tmp_path / "logs" / "session2"), 2, seed=1)
+    root = str(tmp_path / "store")
+    monkeypatch.setattr(fleetIngest, "SignalStore", lambda: SignalStore(root))
+    monkeypatch.setattr(fleetIngest, "dbc_path", lambda info: HYUNDAI_DBC)
+    queue_path = str(tmp_path / "queue.sqlite")
+    vehicles = {"v": {"log_folders": [str(tmp_path / "logs" / "session1"),
+                                      str(tmp_path / "logs" / "session2")]}}
+
+    queue = FleetQueue(queue_path)
+    assert scan(queue, vehicles) == 2
+    assert work(queue_path) == 2
+    assert scan(queue, vehicles) == 0  # both recorded, neither mistaken for the other
+    queue.close()
+
+    store = SignalStore(root)
+    signal = next(iter(store.signals("v")))
+    times, _ = store.read("v", signal)
+    assert np.any((times >= first) & (times < second))
+    assert np.any(times >= second)
+    entries = Manifest(manifest_path(store, "v")).entries
+    assert sorted(os.path.basename(os.path.dirname(name)) for name in entries) == ["session1", "session2"]
+
+
+def test_entry_under_bare_file_name_is_adopted_only_by_its_file(tmp_path):
+    write_session(str(tmp_path / "session1"), 1, seed=0)
+    write_session(str(tmp_path / "session2"), 2, seed=1)
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    manifest.update("00000001.mf4", str(tmp_path / "session2" / "00000001.mf4"), start=0.0, end=1.0)
+
+    pending = pending_files(str(tmp_path / "session1"), manifest, prefix="session1")
+    assert [(name, status) for name, _, status in pending] == [("session1/00000001.mf4", NEW)]
+    assert pending_files(str(tmp_path / "session2"), manifest, prefix="session2") == []
+    assert sorted(manifest.entries) == ["session2/00000001.mf4"]
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+import mf4Stream
+from benchmarks.synthetic import synthetic_frames, write_mf4
+from canIndex import build_index
+from mf4Stream import iter_can_chunks
+
+
+@pytest.fixture
+def mdf(tmp_path):
+    from asammdf import MDF
+    timestamps, can_ids, data = synthetic_frames(20_000, noise_ids=5)
+    mdf = MDF(write_mf4(os.path.join(tmp_path, "log.mf4"), timestamps, can_ids, data, chunk=3000))
+    yield mdf
+    mdf.close()
+
+
+def read_all(mdf, start_record):
+    positions = []
+    chunks = list(iter_can_chunks(mdf, 0, chunk_records=4000, start_record=start_record,
+                                  position=positions.append))
+    return [np.concatenate(column) for column in zip(*chunks)][:3], positions[-1]
+
+
+@pytest.mark.parametrize("start_record", [0, 7000])
+def test_public_reader_matches_private_one(mdf, monkeypatch, start_record):
+    private, private_end = read_all(mdf, start_record)
+    private_index = build_index(mdf)
+    monkeypatch.setattr(mf4Stream, "_load_data", lambda mdf: None)
+    public, public_end = read_all(mdf, start_record)
+
+    assert private_end == public_end == 20_000
+    assert len(public[0]) == 20_000 - start_record
+    for private_column, public_column in zip(private, public):
+        assert np.array_equal(private_column, public_column)
+    assert build_index(mdf) == private_index
+
+
+def test_private_reader_is_present(mdf):
+    # Checked against asammdf 8.8.27; the public fallback reads every channel separately
+    assert mf4Stream._load_data(mdf) is not None
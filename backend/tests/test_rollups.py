@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+
+from rollups import RollupStore, merge_rollup, rollup
+from signalStore import SignalStore
+
+
+def expected_levels(store, levels):
+    times, values = store.read("v", "Speed")
+    records = rollup(times, values, levels[0])
+    yield levels[0], records
+    for width in levels[1:]:
+        records = merge_rollup(records, width)
+        yield width, records
+
+
+def test_update_inside_last_bucket_rewrites_the_tail_in_place(tmp_path):
+    store = SignalStore(str(tmp_path))
+    rollups = RollupStore(store)
+    times = np.arange(0, 3 * 3600 - 300, 1.0)  # ends in the middle of a 10 min bucket
+    store.append("v", "Speed", times, np.sin(times))
+    rollups.update("v", "Speed", times[0], times[-1])
+    inodes = {width: os.stat(rollups._path("v", "Speed", width)).st_ino for width in rollups.levels}
+
+    chunk = times[-1] + 1 + np.arange(0, 30, 0.5)
+    store.append("v", "Speed", chunk, np.cos(chunk))
+    rollups.update("v", "Speed", chunk[0], chunk[-1])
+
+    for width, records in expected_levels(store, rollups.levels):
+        assert os.stat(rollups._path("v", "Speed", width)).st_ino == inodes[width]
+        assert np.array_equal(rollups.read("v", "Speed", width), records)
+
+
+def test_backfill_before_stored_buckets(tmp_path):
+    store = SignalStore(str(tmp_path))
+    rollups = RollupStore(store)
+    later = np.arange(7200, 10800, 1.0)
+    store.append("v", "Speed", later, np.ones(len(later)))
+    rollups.update("v", "Speed", later[0], later[-1])
+
+    earlier = np.arange(0, 3600, 1.0)
+    store.append("v", "Speed", earlier, np.zeros(len(earlier)))
+    rollups.update("v", "Speed", earlier[0], earlier[-1])
+
+    for width, records in expected_levels(store, rollups.levels):
+        assert np.array_equal(rollups.read("v", "Speed", width), records)
@@ -0,0 +1,53 @@
+"""Registry of the vehicles we ingest.
+
+vehicles.json (or the file named by VEHICLE_REGISTRY) maps a vehicle ID to
+its make, model, year, DBC protocol (a key of DBC_FILES), the MF4 file the
+/api/process endpoint decodes and the folders its logger uploads to:
+
+    {"ioniq5": {"make": "Hyundai", "model": "Ioniq 5", "year": "",
+                "dbc_protocol": "hyundai-kia-uds",
+                "mf4_file": "mf4_files/hyundai-ioniq5.mf4",
+                "log_folders": ["mf4_files/ioniq5"]}}
+
+Relative paths are relative to the backend directory.
+"""
+import json
+import os
+
+from signalStore import _check_name
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_PATH = os.environ.get("VEHICLE_REGISTRY", os.path.join(BACKEND_DIR, "vehicles.json"))
+
+# DBC files organized by protocol/manufacturer
+DBC_FILES = {
+    "hyundai-kia-uds": "dbc_files/can1-hyundai-kia-uds-v2.4.dbc",
+    "nissan-leaf-uds": "dbc_files/can1-nissan-leaf-uds-v2.4.dbc",
+    "renault-zoe": "dbc_files/can1-renault-zoe.dbc",
+    "vw-skoda-audi-uds": "dbc_files/can1-vw-skoda-audi-uds-v2.5.dbc",
+    "tesla": "dbc_files/tesla_model_3.dbc",
+}
+
+
+def load_registry(path=REGISTRY_PATH):
+    """{vehicle ID: vehicle info}; raises ValueError for invalid entries"""
+    with open(path) as f:
+        vehicles = json.load(f)
+    for vehicle_id, info in vehicles.items():
+        _check_name(vehicle_id)
+        missing = {"make", "model", "dbc_protocol"} - set(info)
+        if missing:
+            raise ValueError(f"Vehicle {vehicle_id} is missing {', '.join(sorted(missing))}")
+        if info["dbc_protocol"] not in DBC_FILES:
+            raise ValueError(f"Vehicle {vehicle_id}: unknown DBC protocol {info['dbc_protocol']}")
+        info.setdefault("year", "")
+        info.setdefault("log_folders", [])
+    return vehicles
+
+
+def resolve(path):
+    return os.path.join(BACKEND_DIR, path)
+
+
+def dbc_path(vehicle_info):
+    return resolve(DBC_FILES[vehicle_info["dbc_protocol"]])
@@ -0,0 +1,20 @@
+// src/types/LiveFeed.ts
+// Client for the backend's live sample push (GET /api/live/<vehicle_id>).
+
+export interface LiveBatch {
+  vehicle_id: string;
+  dropped: number; // batches missed by a slow client; refetch via /series
+  signals: Record<string, { times: number[]; values: number[] }>;
+}
+
+// Returns a function that closes the stream
+export const subscribeLiveFeed = (
+  vehicleId: string, metrics: string[], onBatch: (batch: LiveBatch) => void
+): (() => void) => {
+  const query = metrics.length ? `?metrics=${encodeURIComponent(metrics.join(','))}` : '';
+  const source = new EventSource(`/api/live/${encodeURIComponent(vehicleId)}${query}`);
+  source.addEventListener('samples', (event) => {
+    onBatch(JSON.parse((event as MessageEvent).data));
+  });
+  return () => source.close();
+};
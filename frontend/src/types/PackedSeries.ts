@@ -0,0 +1,90 @@
+// src/types/PackedSeries.ts
+// Reader for the backend's packed series format (?format=packed, see
+// backend/seriesEncoding.py). Arrays are views on the response buffer,
+// so large series are usable without any JSON parsing.
+
+export type TypedArray = Float64Array | Float32Array | Int32Array;
+
+export interface PackedSeries {
+  meta: Record<string, unknown>;
+  series: Record<string, Record<string, TypedArray | unknown>>;
+}
+
+const ARRAY_TYPES: Record<string, Float64ArrayConstructor | Float32ArrayConstructor | Int32ArrayConstructor> = {
+  f8: Float64Array,
+  f4: Float32Array,
+  i4: Int32Array,
+};
+
+const concat = (parts: TypedArray[]): TypedArray => {
+  if (parts.length === 1) return parts[0];
+  const ArrayType = parts[0].constructor as Float64ArrayConstructor;
+  const joined = new ArrayType(parts.reduce((total, part) => total + part.length, 0));
+  let offset = 0;
+  for (const part of parts) {
+    joined.set(part as Float64Array, offset);
+    offset += part.length;
+  }
+  return joined;
+};
+
+export const decodePackedSeries = (buffer: ArrayBuffer): PackedSeries => {
+  const view = new DataView(buffer);
+  const text = new TextDecoder();
+  if (text.decode(new Uint8Array(buffer, 0, 4)) !== 'EVS1') {
+    throw new Error('Not a packed series response');
+  }
+  let offset = 4;
+  let meta: Record<string, unknown> = {};
+  const chunks: Record<string, Record<string, TypedArray[]>> = {};
+  const details: Record<string, Record<string, unknown>> = {};
+
+  while (offset < buffer.byteLength) {
+    const headerLength = view.getUint32(offset, true);
+    const header = JSON.parse(text.decode(new Uint8Array(buffer, offset + 4, headerLength)));
+    offset += 4 + headerLength;
+    if (header.meta) {
+      meta = header.meta;
+      continue;
+    }
+    const { name, count, fields, ...rest } = header;
+    chunks[name] = chunks[name] || {};
+    details[name] = { ...details[name], ...rest };
+    for (const [field, dtype] of fields as [string, string][]) {
+      const ArrayType = ARRAY_TYPES[dtype];
+      const array = new ArrayType(buffer, offset, count);
+      (chunks[name][field] = chunks[name][field] || []).push(array);
+      offset += array.byteLength;
+    }
+  }
+
+  const series: PackedSeries['series'] = {};
+  for (const name of Object.keys(chunks)) {
+    series[name] = { ...details[name] };
+    for (const field of Object.keys(chunks[name])) {
+      series[name][field] = concat(chunks[name][field]);
+    }
+  }
+  return { meta, series };
+};
+
+export const fetchPackedSeries = async (url: string): Promise<PackedSeries> => {
+  const response = await fetch(url, { headers: { Accept: 'application/x-ev-series' } });
+  if (!response.ok) {
+    throw new Error(`Failed to fetch series: ${response.status}`);
+  }
+  return decodePackedSeries(await response.arrayBuffer());
+};
+
+// Rows in the shape LineChart expects, e.g. toChartRows(series.SOC, 'SOC')
+export const toChartRows = (
+  fields: Record<string, TypedArray | unknown>, yKey: string, xKey = 'TimeStamp'
+): Record<string, number>[] => {
+  const times = fields.times as TypedArray;
+  const values = fields.values as TypedArray;
+  const rows = new Array(times.length);
+  for (let i = 0; i < times.length; i++) {
+    rows[i] = { [xKey]: times[i] * 1000, [yKey]: values[i] };
+  }
+  return rows;
+};